@@ -0,0 +1,355 @@
+"""
+Command Line Interface
+Runs the parts of the program that do not need a window. Usage:
+
+    main.py export <sheet.png | directory> [...]
+    main.py benchmark <sheet.png | directory> [...]
+    main.py serve [--port PORT]
+    main.py usage <sheet.png | episode folder> [...]
+    main.py remap <sheet.png> [...] [--dry-run]
+
+Directories are searched for tileset images that have a .tileset.json file. tkinter is never imported.
+"""
+import argparse
+import os
+import sys
+
+from daemon import DEFAULT_PORT, ExportDaemon, send_request
+from episode import describe_usage, get_level_usage, remap_levels
+from exporter import ExportError, benchmark_profiles, dry_run_sheet, export_sheet, export_target_presets, find_sheets, \
+    format_size, resolve_worker_count, load_tileset, get_episode_path, get_held_id, check_tileset, get_episode_ids, \
+    reassign_tileset_ids, save_assigned_ids, get_pending_remap, set_pending_remap
+from tiledata import png_profiles, upscalers
+
+
+def _export(args):
+    """Export each tileset named on the command line. Returns the exit status."""
+    sheets = find_sheets(args.paths)
+    if len(sheets) == 0:
+        print('No tilesets found.', file=sys.stderr)
+        return 1
+
+    workers = resolve_worker_count(args.workers)
+    overrides = {}
+    if args.zip:
+        overrides['export_zip'] = True
+    if args.profile is not None:
+        overrides['png_profile'] = args.profile
+    if args.upscaler is not None:
+        overrides['upscaler'] = args.upscaler
+    if args.scales is not None:
+        overrides['export_scales'] = args.scales
+    if args.gif:
+        overrides['export_gif'] = True
+    if args.variants:
+        overrides['export_variants'] = True
+
+    failures = 0
+    for sheet in sheets:
+        if args.dry_run:
+            failures += _dry_run(sheet, workers, overrides, args.targets)
+            continue
+        if args.daemon is not None:
+            failures += _export_with_daemon(sheet, args.daemon, args.full, overrides, args.targets)
+            continue
+        try:
+            report = export_sheet(sheet, workers=workers, full=args.full, overrides=overrides,
+                                  target_names=args.targets)
+        except (ExportError, OSError) as e:
+            print(f'{sheet}: {e}', file=sys.stderr)
+            failures += 1
+            continue
+        print(f'{sheet}: {report.summary()}')
+        for message in report.warnings:
+            print(f'{sheet}: Warning: {message}', file=sys.stderr)
+        for (name, message) in report.errors:
+            print(f'{sheet}: {name}: {message}', file=sys.stderr)
+        if len(report.errors) > 0:
+            failures += 1
+
+    return 1 if failures > 0 else 0
+
+
+def _export_with_daemon(sheet, port, full, overrides, target_names):
+    """Have a running export daemon export a tileset. Returns 1 if it could not be exported cleanly, 0 otherwise."""
+    request = {'command': 'export', 'sheet': os.path.abspath(sheet), 'full': full, 'overrides': overrides,
+               'targets': target_names}
+    try:
+        reply = send_request(request, port)
+    except (OSError, ValueError) as e:
+        print(f'{sheet}: Cannot reach the export daemon on port {port}: {e}', file=sys.stderr)
+        return 1
+    if not reply['ok']:
+        print(f'{sheet}: {reply["error"]}', file=sys.stderr)
+        return 1
+    print(f'{sheet}: {reply["summary"]}')
+    for message in reply.get('warnings', []):
+        print(f'{sheet}: Warning: {message}', file=sys.stderr)
+    for (name, message) in reply['errors']:
+        print(f'{sheet}: {name}: {message}', file=sys.stderr)
+    return 1 if len(reply['errors']) > 0 else 0
+
+
+def _dry_run(sheet, workers, overrides, target_names):
+    """Print what exporting a tileset would change. Returns 1 if it cannot be exported cleanly, 0 otherwise."""
+    try:
+        dry_run = dry_run_sheet(sheet, workers=workers, overrides=overrides, target_names=target_names)
+    except (ExportError, OSError) as e:
+        print(f'{sheet}: {e}', file=sys.stderr)
+        return 1
+
+    print(f'{sheet}: {dry_run.summary()}')
+    for (mark, names) in (('+', dry_run.added), ('~', dry_run.changed), ('-', dry_run.removed)):
+        for name in names:
+            size = f' ({format_size(dry_run.files[name])})' if name in dry_run.files else ''
+            print(f'  {mark} {name}{size}')
+    for name in dry_run.new_ids:
+        print(f'  {name} would be assigned ID {dry_run.ids[name]}')
+    for diff in dry_run.diffs.values():
+        sys.stdout.writelines(diff)
+    for message in dry_run.report.warnings:
+        print(f'{sheet}: Warning: {message}', file=sys.stderr)
+    for (name, message) in dry_run.report.errors:
+        print(f'{sheet}: {name}: {message}', file=sys.stderr)
+    return 1 if len(dry_run.report.errors) > 0 else 0
+
+
+def _benchmark(args):
+    """Compare the PNG profiles on each tileset named on the command line. Returns the exit status."""
+    sheets = find_sheets(args.paths)
+    if len(sheets) == 0:
+        print('No tilesets found.', file=sys.stderr)
+        return 1
+
+    workers = resolve_worker_count(args.workers)
+    failures = 0
+    for sheet in sheets:
+        try:
+            reports = benchmark_profiles(sheet, workers)
+        except (ExportError, OSError) as e:
+            print(f'{sheet}: {e}', file=sys.stderr)
+            failures += 1
+            continue
+        print(f'{sheet}: {reports[0].images_encoded} images')
+        for r in reports:
+            print(f'  {r.png_profile:<10}{format_size(r.png_bytes):>12}{r.encode_time:>10.2f} s')
+
+    return 1 if failures > 0 else 0
+
+
+def _serve(args):
+    """Run the export daemon until it is asked to shut down. Returns the exit status."""
+    try:
+        ExportDaemon(args.port, args.cache_mb * 1024 * 1024, resolve_worker_count(args.workers)).serve()
+    except OSError as e:
+        print(f'Cannot start the export daemon: {e}', file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _usage(args):
+    """
+    Print how many times each tile of a tileset is placed in the levels of its episode folder, or each block and BGO ID
+    in the levels of a folder. Returns the exit status.
+    """
+    workers = resolve_worker_count(args.workers)
+    failures = 0
+    for path in args.paths:
+        try:
+            if os.path.isdir(path):
+                (folder, tiles) = (path, None)
+            else:
+                (settings, tiles, _) = load_tileset(path)
+                folder = get_episode_path(path, settings)
+                if folder is None:
+                    raise ExportError('The tileset has no episode folder. Set one in the editor first.')
+            usage = get_level_usage(folder, workers)
+        except (ExportError, OSError) as e:
+            print(f'{path}: {e}', file=sys.stderr)
+            failures += 1
+            continue
+
+        if tiles is None:
+            rows = [(tile_type, tile_id) for tile_type in ('Block', 'BGO')
+                    for tile_id in sorted(usage.usage[tile_type])]
+        else:
+            rows = [(t.data['tile_type'], tile_id) for t in tiles if (tile_id := get_held_id(t)) not in (None, '')]
+        print(f'{path}: {len(usage.levels)} levels in {folder}')
+        for (tile_type, tile_id) in rows:
+            levels = usage.usage[tile_type].get(tile_id, {})
+            name = f'{"block" if tile_type == "Block" else "background"}-{tile_id}'
+            print(f'  {name}: {describe_usage(levels)}')
+            if args.levels:
+                for (level, count) in levels.items():
+                    print(f'    {level}: {count}')
+        for (level, error) in usage.errors.items():
+            print(f'{path}: Warning: {level} could not be read: {error}', file=sys.stderr)
+
+    return 1 if failures > 0 else 0
+
+
+def _remap(args):
+    """
+    Give every tile of each tileset named on the command line a new ID, then change the levels in its episode folder
+    that place the old IDs. Returns the exit status.
+    """
+    sheets = find_sheets(args.paths)
+    if len(sheets) == 0:
+        print('No tilesets found.', file=sys.stderr)
+        return 1
+
+    workers = resolve_worker_count(args.workers)
+    failures = 0
+    for sheet in sheets:
+        try:
+            (settings, tiles, file_data) = load_tileset(sheet)
+            check_tileset(settings, tiles)
+            folder = get_episode_path(sheet, settings)
+            if folder is None:
+                raise ExportError('The tileset has no episode folder. Set one in the editor first.')
+            # If some levels could not be changed last time, the tiles keep their IDs and only those levels are
+            # changed. Giving the tiles new IDs again would leave them placing IDs that nothing maps any more.
+            pending = get_pending_remap(file_data)
+            if pending is not None:
+                (mapping, levels) = pending
+                report = remap_levels(folder, mapping, workers, args.dry_run, levels=levels)
+            else:
+                (_, _, mapping) = reassign_tileset_ids(tiles, settings, get_episode_ids(sheet, settings))
+                report = remap_levels(folder, mapping, workers, args.dry_run)
+        except (ExportError, OSError) as e:
+            print(f'{sheet}: {e}', file=sys.stderr)
+            failures += 1
+            continue
+        if not args.dry_run:
+            save_assigned_ids(sheet, tiles, file_data, force=set_pending_remap(file_data, mapping, report.errors))
+
+        moved = sum(len(m) for m in mapping.values())
+        if pending is not None:
+            print(f'{sheet}: {"Would retry" if args.dry_run else "Retried"} the {len(pending[1])} levels that could '
+                  f'not be changed last time. {report.summary()}')
+        else:
+            print(f'{sheet}: {moved} tiles {"would be" if args.dry_run else "were"} given new IDs. '
+                  f'{report.summary()}')
+        for (tile_type, type_mapping) in mapping.items():
+            prefix = 'block' if tile_type == 'Block' else 'background'
+            for (old_id, new_id) in sorted(type_mapping.items()):
+                print(f'  {prefix}-{old_id} -> {prefix}-{new_id}')
+        for diff in report.diffs.values():
+            sys.stdout.writelines(diff)
+        for message in report.warnings:
+            print(f'{sheet}: Warning: {message}', file=sys.stderr)
+        for level in report.skipped:
+            print(f'{sheet}: Warning: {level} uses the old IDs, but legacy .lvl levels cannot be changed. Change them '
+                  f'by hand, or save it as .lvlx before running this next time.', file=sys.stderr)
+        for (level, error) in report.errors.items():
+            print(f'{sheet}: {level}: {error}', file=sys.stderr)
+        if len(report.errors) > 0:
+            failures += 1
+            if not args.dry_run:
+                print(f'{sheet}: Run this again to retry the levels that could not be changed. The tiles keep their '
+                      f'new IDs until then.', file=sys.stderr)
+        if pending is None and moved > 0 and not args.dry_run:
+            print(f'{sheet}: Export the tileset again to write its files with the new IDs.')
+
+    return 1 if failures > 0 else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='main.py', description='SMBX2 Tileset Importer. Run without arguments to '
+                                                                 'open the editor.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Export tilesets without opening the editor.')
+    export_parser.add_argument('paths', nargs='+', metavar='sheet',
+                               help='A tileset image, or a directory of tileset images, to export.')
+    export_parser.add_argument('-j', '--workers', type=int, default=0,
+                               help='The number of processes used to encode tile images. Defaults to one per CPU '
+                                    'core.')
+    export_parser.add_argument('--full', action='store_true',
+                               help='Write every file, even those that have not changed since the last export.')
+    export_parser.add_argument('--zip', action='store_true',
+                               help='Export into a .zip archive named after each tileset image, even if the tileset '
+                                    'is set to export to a directory.')
+    export_parser.add_argument('--profile', choices=png_profiles,
+                               help='The PNG profile to encode tile images with, instead of the one the tileset is set '
+                                    'to use.')
+    export_parser.add_argument('--upscaler', choices=upscalers,
+                               help='How to scale tile images up to the pixel scale, instead of the way the tileset is '
+                                    'set to use.')
+    export_parser.add_argument('--scales', metavar='SCALES',
+                               help='Pixel scales to export at, separated by semicolons (e.g. "1;2"), instead of the '
+                                    'ones the tileset is set to use. Each scale is exported into its own subdirectory '
+                                    'or .zip archive.')
+    export_parser.add_argument('--gif', action='store_true',
+                               help='Export tile images as legacy GIFs with separate masks (block-1.gif and '
+                                    'block-1m.gif) instead of PNGs.')
+    export_parser.add_argument('--variants', action='store_true',
+                               help='Also export the palette variants listed in the .variants.json file next to each '
+                                    'tileset image.')
+    export_parser.add_argument('--target', action='append', dest='targets', metavar='NAME',
+                               help=f'Export for this game ({", ".join(export_target_presets)}), or to this target '
+                                    f'from the export_targets list of the .tileset.json file. Can be given more than '
+                                    f'once to export for several in one pass; the first is exported to the usual '
+                                    f'place, and the others next to it with their name added, unless they have a '
+                                    f'path. Defaults to every configured target, or the targets chosen in the editor.')
+    export_parser.add_argument('--dry-run', action='store_true',
+                               help='Export into memory and print what would change, without writing anything. IDs '
+                                    'are not saved either.')
+    export_parser.add_argument('--daemon', type=int, nargs='?', const=DEFAULT_PORT, metavar='PORT',
+                               help=f'Have the export daemon listening on PORT (default {DEFAULT_PORT}) do the export, '
+                                    f'instead of exporting in this process. See "main.py serve".')
+    export_parser.set_defaults(func=_export)
+
+    benchmark_parser = subparsers.add_parser('benchmark', help='Compare the size and encode time of each PNG profile '
+                                                               'without exporting anything.')
+    benchmark_parser.add_argument('paths', nargs='+', metavar='sheet',
+                                  help='A tileset image, or a directory of tileset images, to encode.')
+    benchmark_parser.add_argument('-j', '--workers', type=int, default=0,
+                                  help='The number of processes used to encode tile images. Defaults to one per CPU '
+                                       'core.')
+    benchmark_parser.set_defaults(func=_benchmark)
+
+    serve_parser = subparsers.add_parser('serve', help='Run an export daemon that keeps tileset images, tile images '
+                                                       'and worker processes loaded between exports. There is no '
+                                                       'authentication: any local process can use it to export any '
+                                                       'tileset this user can read, to any path.')
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                              help=f'The port to listen on, on 127.0.0.1 only. Defaults to {DEFAULT_PORT}.')
+    serve_parser.add_argument('--cache-mb', type=int, default=256,
+                              help='The most memory, in megabytes, the cached images may take up. Defaults to 256.')
+    serve_parser.add_argument('-j', '--workers', type=int, default=0,
+                              help='The number of processes used to encode tile images. Defaults to one per CPU '
+                                   'core.')
+    serve_parser.set_defaults(func=_serve)
+
+    usage_parser = subparsers.add_parser('usage', help='Count how many times each block and BGO ID is placed in the '
+                                                       'levels (.lvlx and .lvl) of an episode.')
+    usage_parser.add_argument('paths', nargs='+', metavar='path',
+                              help='A tileset image, to count its tiles in the levels of its episode folder, or a '
+                                   'folder, to count every ID in its levels.')
+    usage_parser.add_argument('--levels', action='store_true',
+                              help='Also list the levels each ID is placed in.')
+    usage_parser.add_argument('-j', '--workers', type=int, default=0,
+                              help='The number of processes used to read levels. Defaults to one per CPU core.')
+    usage_parser.set_defaults(func=_usage)
+
+    remap_parser = subparsers.add_parser('remap', help='Give every tile of a tileset a new ID from its ID pools, as '
+                                                       'Clear Auto-Assigned IDs would, and change the levels (.lvlx) '
+                                                       'in its episode folder to match.')
+    remap_parser.add_argument('paths', nargs='+', metavar='sheet',
+                              help='A tileset image, or a directory of tileset images, to give new IDs.')
+    remap_parser.add_argument('--dry-run', action='store_true',
+                              help='Print the new IDs and a diff of each level that would change, without writing '
+                                   'anything.')
+    remap_parser.add_argument('-j', '--workers', type=int, default=0,
+                              help='The number of processes used to change levels. Defaults to one per CPU core.')
+    remap_parser.set_defaults(func=_remap)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
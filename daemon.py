@@ -0,0 +1,234 @@
+"""
+Export Daemon
+Keeps tileset images, tile images and encoding processes warm between exports, so build scripts and file watchers can
+re-export a tileset without paying for the start-up, decoding and cropping each time. Usage:
+
+    main.py serve [--port PORT] [--cache-mb MB] [-j WORKERS]
+
+The daemon listens on 127.0.0.1 only. Each request is one line of JSON, and each reply is one line of JSON:
+
+    {"command": "export", "sheet": "/abs/path/tiles.png", "full": false, "overrides": {}, "targets": null}
+    {"command": "stats"}
+    {"command": "ping"}
+    {"command": "shutdown"}
+
+Each connection is served on its own thread, so a client that keeps its connection open, such as a file watcher, does
+not hold up the others. Exports are still run one at a time. Nothing here depends on tkinter.
+
+There is no authentication: any process on the same computer can connect, and export any tileset the daemon's user can
+read, with any settings overridden, writing wherever those settings point. Only run it on a computer you trust.
+"""
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from exporter import ExportError, export_sheet
+from tiledata import read_sheet
+
+DEFAULT_PORT = 47470
+
+
+def get_image_size(image):
+    """Estimate the memory an image takes up, in bytes."""
+    return image.width * image.height * len(image.getbands())
+
+
+class ExportCache:
+    """
+    Tileset images and tile images kept between exports. Entries are evicted least recently used first once they take
+    up more than the memory limit. Tile images are keyed by the tileset image they were cut from, including its
+    modification time, so editing the tileset image makes all of them stale at once.
+    """
+
+    def open_sheet(self, path, color_key=''):
+        """
+        Load a tileset image, from the cache if it has not changed.
+        :param path: The path of the tileset image.
+        :param color_key: The color to make transparent, as #rrggbb. Blank for none.
+        :return: (sheet, crop), where crop is called with a tile to cut its image out of the sheet. See export_tiles.
+        :raises OSError: If the image cannot be read.
+        """
+        stat = os.stat(path)
+        sheet_key = ('sheet', os.path.abspath(path), stat.st_mtime_ns, stat.st_size, color_key)
+        sheet = self.get(sheet_key)
+        if sheet is None:
+            sheet = read_sheet(path, color_key)  # Not load_sheet, which would keep evicted images in its own cache
+            self.put(sheet_key, sheet, get_image_size(sheet))
+
+        def crop(tile):
+            key = (sheet_key, tuple(tile.get_bbox()), tuple(tile.data['grid_size']), tile.data['grid_padding'],
+                   tile.scale)
+            image = self.get(key)
+            if image is None:
+                image = tile.get_source_image(sheet)
+                self.put(key, image, get_image_size(image))
+            return image
+
+        return sheet, crop
+
+    def get(self, key):
+        """Get a cached value and mark it as recently used. Returns None if it is not cached."""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, size):
+        """Cache a value, evicting the least recently used values until everything fits in the memory limit."""
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        if size > self.max_bytes:
+            return  # It would push everything else out and still not fit.
+        self.entries[key] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            (_, (_, evicted_size)) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def stats(self):
+        """Describe the cache as a dict that can be sent as JSON."""
+        return {'entries': len(self.entries), 'bytes': self.size, 'max_bytes': self.max_bytes, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+    def __init__(self, max_bytes):
+        """
+        CONSTRUCTOR
+        :param max_bytes: The most memory the cached images may take up.
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, size), least recently used first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Answers each line of JSON sent over a connection with a line of JSON."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                reply = self.server.export_daemon.handle_request(json.loads(line))
+            except (ValueError, TypeError, KeyError) as e:
+                reply = {'ok': False, 'error': f'Bad request: {e}'}
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+            self.wfile.flush()
+            if not self.server.export_daemon.running:
+                return
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    # Lets the daemon be restarted straight away. Windows would let two daemons share the port instead.
+    allow_reuse_address = os.name != 'nt'
+    # Connections that are still open when the daemon shuts down are dropped, not waited for.
+    daemon_threads = True
+    block_on_close = False
+    timeout = 0.5  # How often serve checks whether a shutdown was requested
+
+
+class ExportDaemon:
+    """Serves export requests from a warm cache and process pool. See the module docstring for the protocol."""
+
+    def handle_request(self, request):
+        """
+        Carry out one request. Called on the thread of the connection it came from; exports and shutdown wait for any
+        running export to finish.
+        :param request: The decoded JSON request.
+        :return: The reply, to be sent back as JSON.
+        """
+        command = request['command']
+        if command == 'ping':
+            return {'ok': True}
+        if command == 'stats':
+            return {'ok': True, 'exports': self.exports, 'cache': self.cache.stats()}
+        if command == 'shutdown':
+            with self.lock:
+                self.running = False
+            return {'ok': True}
+        if command == 'export':
+            with self.lock:  # The cache and process pool are shared by every connection.
+                if not self.running:
+                    return {'ok': False, 'error': 'The export daemon is shutting down.'}
+                return self.export(request['sheet'], bool(request.get('full', False)),
+                                   request.get('overrides') or {}, request.get('targets'))
+        return {'ok': False, 'error': f"Unknown command '{command}'."}
+
+    def export(self, sheet, full=False, overrides=None, target_names=None):
+        """
+        Export a tileset, reusing whatever is cached from earlier exports. See exporter.export_sheet.
+        :return: The reply to the export request.
+        """
+        start = time.perf_counter()
+        try:
+            report = export_sheet(sheet, workers=self.workers, full=full, overrides=overrides,
+                                  target_names=target_names, cache=self.cache, pool=self.pool)
+        except (ExportError, OSError) as e:
+            print(f'{sheet}: {e}', file=sys.stderr)
+            return {'ok': False, 'error': str(e)}
+        except Exception as e:  # One bad request must not take down the daemon.
+            traceback.print_exc()
+            return {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+        self.exports += 1
+        print(f'{sheet}: {report.summary()}', flush=True)
+        return {'ok': True, 'summary': report.summary(), 'errors': report.errors, 'warnings': report.warnings,
+                'seconds': round(time.perf_counter() - start, 3)}
+
+    def serve(self):
+        """Handle requests until a shutdown request is received."""
+        with _Server(('127.0.0.1', self.port), _RequestHandler) as server:
+            server.export_daemon = self
+            self.port = server.server_address[1]
+            print(f'Listening on 127.0.0.1:{self.port}', flush=True)
+            try:
+                while self.running:
+                    server.handle_request()
+            finally:
+                if self.pool is not None:
+                    self.pool.shutdown(cancel_futures=True)
+
+    def __init__(self, port=DEFAULT_PORT, cache_bytes=256 * 1024 * 1024, workers=1):
+        """
+        CONSTRUCTOR
+        :param port: The port to listen on. 0 picks a free one.
+        :param cache_bytes: The most memory the cached images may take up.
+        :param workers: The number of processes to encode images with. They are started once and reused.
+        """
+        self.port = port
+        self.cache = ExportCache(cache_bytes)
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(workers) if workers > 1 else None
+        self.exports = 0
+        self.running = True
+        self.lock = threading.Lock()  # Held while an export runs
+
+
+def send_request(request, port=DEFAULT_PORT, timeout=None):
+    """
+    Send one request to a running export daemon and wait for the reply.
+    :param request: The request, as a dict.
+    :param port: The port the daemon listens on.
+    :param timeout: How long to wait, in seconds. None waits for as long as the export takes.
+    :return: The decoded reply.
+    :raises OSError: If the daemon cannot be reached.
+    """
+    with socket.create_connection(('127.0.0.1', port), timeout=timeout) as connection:
+        connection.sendall(json.dumps(request).encode() + b'\n')
+        with connection.makefile('rb') as reply:
+            line = reply.readline()
+    if not line:
+        raise ConnectionError('The export daemon closed the connection without replying.')
+    return json.loads(line)
@@ -0,0 +1,532 @@
+"""
+Episode Scanning
+Finds the block and BGO IDs that are already used in an episode folder, so a tileset exported into it does not overwrite
+the files of another tileset. An ID is used if there is a tile file for it (e.g. block-12.png or background-3.txt), or
+if another tileset in the folder has a tile with that ID.
+
+Folders are indexed once, then only the parts that changed are scanned again: the tile files are only listed again when
+the folder's modification time changes, which happens whenever a file is added, removed or renamed, and each tileset is
+only read again when its own modification time or size changes.
+
+The levels of an episode can also be scanned, to find how many times each block and BGO ID is placed in them. Level
+files are read a line at a time, and several are read at once, in separate processes. The IDs placed in PGE-X levels
+can be changed in the same way, such as after a tileset's tiles were given new IDs. Nothing here depends on tkinter.
+"""
+import json
+import os
+import shutil
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import regex
+
+from tiledata import good_tile_id
+
+# Matches the files SMBX2 loads for a tile, such as block-12.png, block-12m.gif and background-3.txt.
+tile_file_pattern = regex.compile(r'^(block|background)-([0-9]+)m?\.(?:png|gif|txt|ini)$', regex.IGNORECASE)
+_file_tile_types = {'block': 'Block', 'background': 'BGO'}
+
+TILESET_EXT = '.tileset.json'
+
+
+def read_tileset_ids(json_path):
+    """
+    Read the IDs of the tiles of a tileset: the ID assigned by its last export, or else the tile ID set by the user.
+    Tiles whose ID is not a number are skipped.
+    :param json_path: The path of the .tileset.json file.
+    :return: (ids, error): a dict of the set of IDs for each tile type, and a message saying why the file, or some of
+    its tiles, could not be read, or None.
+    """
+    ids = {'Block': set(), 'BGO': set()}
+    try:
+        with open(json_path, 'r') as f:
+            file_data = json.load(f)
+    except (OSError, ValueError) as e:
+        return ids, f'Could not be read: {e}.'
+    if not isinstance(file_data, dict) or not isinstance(file_data.get('tiles', []), list):
+        return ids, 'Not a tileset file.'
+
+    bad_count = 0
+    for td in file_data.get('tiles', []):
+        try:
+            tile_type = td.get('tile_type', 'Block')
+            if tile_type not in ids:
+                continue
+            if 'assigned_id' in td:
+                ids[tile_type].add(int(td['assigned_id']))
+            elif td.get('tile_id', '') != '' and good_tile_id(td['tile_id'], tile_type):
+                ids[tile_type].add(int(td['tile_id']))
+        except (AttributeError, TypeError, ValueError):  # A tile that is not a dict, or an ID that is not a number
+            bad_count += 1
+    return ids, f'{bad_count} tiles could not be read.' if bad_count > 0 else None
+
+
+class FolderIndex:
+    """The IDs used by the tile files and tilesets in one folder. Subfolders are not included."""
+
+    def refresh(self):
+        """
+        Bring the index up to date with the folder, scanning only what changed since the last refresh.
+        :raises OSError: If the folder cannot be read.
+        """
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self.mtime:
+            files = {'Block': {}, 'BGO': {}}
+            tileset_names = []
+            with os.scandir(self.path) as entries:
+                for e in entries:
+                    if (m := tile_file_pattern.match(e.name)) is not None:
+                        files[_file_tile_types[m[1].lower()]].setdefault(int(m[2]), e.name)
+                    elif e.name.endswith(TILESET_EXT) and e.is_file():
+                        tileset_names.append(e.name)
+            self.files = files
+            self.tilesets = {name: self.tilesets.get(name) for name in tileset_names}
+            self.mtime = mtime
+
+        # Saving a tileset replaces its contents without changing the folder, so each one is checked on its own.
+        for (name, entry) in self.tilesets.items():
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:  # Deleted since the folder was listed
+                self.tilesets[name] = (None, {'Block': set(), 'BGO': set()}, None)
+                continue
+            key = (stat.st_mtime_ns, stat.st_size)
+            if entry is None or entry[0] != key:
+                self.tilesets[name] = (key, *read_tileset_ids(os.path.join(self.path, name)))
+
+    def __init__(self, path):
+        """
+        CONSTRUCTOR
+        Call refresh before using the index.
+        :param path: The folder to index.
+        """
+        self.path = path
+        self.mtime = None  # The folder's modification time when its files were last listed
+        self.files = {'Block': {}, 'BGO': {}}  # ID -> the name of a tile file for that ID
+        # name -> ((mtime, size), the IDs the tileset uses, why it could not be read or None), or None if not read yet
+        self.tilesets = {}
+
+
+# The index of every folder scanned so far, by absolute path. They are kept for as long as the program runs, so the
+# editor and the export daemon only scan what changed since their last export.
+_folder_indexes = {}
+
+
+def get_folder_index(path):
+    """
+    Get the up-to-date index of a folder.
+    :rtype: FolderIndex
+    :raises OSError: If the folder cannot be read.
+    """
+    path = os.path.abspath(path)
+    index = _folder_indexes.get(path)
+    if index is None:
+        index = _folder_indexes[path] = FolderIndex(path)
+    index.refresh()
+    return index
+
+
+class EpisodeIDs:
+    """The IDs used in the folders of an episode, and the tile files and tilesets that use each of them."""
+
+    def get_ids(self, tile_type):
+        """Get the IDs used for a tile type, as a set."""
+        return self.files[tile_type].keys() | self.tilesets[tile_type].keys()
+
+    def get_users(self, tile_type, tile_id, files=True):
+        """
+        Get the names of what uses an ID.
+        :param files: If False, only tilesets are included, not tile files.
+        :return: A list of the names of the tile files and .tileset.json files.
+        """
+        return (self.files[tile_type].get(tile_id, []) if files else []) + self.tilesets[tile_type].get(tile_id, [])
+
+    def release(self, tile_type, tile_id):
+        """Forget the tile files for an ID, because they are the files of the tileset being exported."""
+        self.files[tile_type].pop(tile_id, None)
+
+    def __init__(self, folders, exclude=()):
+        """
+        CONSTRUCTOR
+        :param folders: The folders to scan. Missing folders are skipped.
+        :param exclude: The .tileset.json files to leave out, such as the one being exported.
+        :raises OSError: If a folder cannot be read.
+        """
+        exclude = {os.path.abspath(p) for p in exclude}
+        self.files = {'Block': {}, 'BGO': {}}  # ID -> the names of the tile files for it
+        self.tilesets = {'Block': {}, 'BGO': {}}  # ID -> the names of the tilesets that use it
+        self.errors = {}  # name -> why the tileset, or some of its tiles, could not be read
+        for folder in dict.fromkeys(os.path.abspath(f) for f in folders):
+            if not os.path.isdir(folder):
+                continue
+            index = get_folder_index(folder)
+            for (tile_type, files) in index.files.items():
+                for (tile_id, name) in files.items():
+                    self.files[tile_type].setdefault(tile_id, []).append(name)
+            for (name, (_, ids, error)) in index.tilesets.items():
+                if os.path.join(folder, name) in exclude:
+                    continue
+                if error is not None:
+                    self.errors[name] = error
+                for (tile_type, tileset_ids) in ids.items():
+                    for tile_id in tileset_ids:
+                        self.tilesets[tile_type].setdefault(tile_id, []).append(name)
+
+
+# -------------------------------
+# Level Scanning
+# -------------------------------
+
+level_extensions = ('.lvlx', '.lvl')
+
+# The ID of a block or BGO in a PGE-X level (.lvlx). Only the part of the line before the first string is searched, so
+# text in layer and event names is never mistaken for an ID.
+_lvlx_id_pattern = regex.compile(rb'(?:^|;)ID:([0-9]+);')
+_lvlx_sections = {b'BLOCK': 'Block', b'BGO': 'BGO'}
+
+
+class LevelFormatError(ValueError):
+    """Raised when a level file is not in a format that can be read."""
+
+
+def scan_lvlx(f):
+    """
+    Count the blocks and BGOs of each ID in a PGE-X level (.lvlx).
+    :param f: The level file, opened in binary mode. It is read a line at a time.
+    :return: A Counter of the IDs for each tile type.
+    """
+    counts = {'Block': Counter(), 'BGO': Counter()}
+    section = None
+    for line in f:
+        stripped = line.strip()
+        if section is None:
+            section = _lvlx_sections.get(stripped)
+        elif stripped == b'BLOCK_END' or stripped == b'BGO_END':
+            section = None
+        elif (span := _find_lvlx_id(line)) is not None:
+            counts[section][int(line[span[0]:span[1]])] += 1
+    return counts
+
+
+def _find_lvlx_id(line):
+    """
+    Find the ID in a line of the BLOCK or BGO section of a PGE-X level.
+    :return: (start, end) of the ID's digits in <line>, or None if it has no ID.
+    """
+    if line.startswith(b'ID:') and (end := line.find(b';')) > 3 and line[3:end].isdigit():
+        return 3, end  # Editors write the ID first, so this is almost always enough.
+    if (m := _lvlx_id_pattern.search(line.split(b'"', 1)[0])) is not None:
+        return m.span(1)
+    return None
+
+
+def _lvl_lines(f, count):
+    """Read <count> lines of a level, without the line endings."""
+    lines = []
+    for _ in range(count):
+        line = f.readline()
+        if line == b'':
+            raise LevelFormatError('The level ends too early.')
+        lines.append(line.strip())
+    return lines
+
+
+def _lvl_records(f, record_length, id_index):
+    """
+    Read the records of one section of a legacy level, up to the "next" line that ends the section.
+    :return: A generator of the ID of each record.
+    """
+    while (line := f.readline().strip()) != b'"next"':
+        record = [line] + _lvl_lines(f, record_length - 1)
+        try:
+            for v in record[:id_index + 1]:  # Every field up to the ID is a number.
+                int(v)
+        except ValueError:
+            raise LevelFormatError('The level is not in a format that can be read.')
+        yield int(record[id_index])
+
+
+def scan_lvl(f):
+    """
+    Count the blocks and BGOs of each ID in a legacy SMBX level (.lvl). The number of fields of each record depends on
+    the format version, on the first line.
+    :param f: The level file, opened in binary mode. It is read a line at a time.
+    :return: A Counter of the IDs for each tile type.
+    :raises LevelFormatError: If the level cannot be read.
+    """
+    try:
+        version = int(f.readline().strip())
+    except ValueError:
+        raise LevelFormatError('The level is not in a format that can be read.')
+
+    # Skip the header, the sections and the player start points.
+    section_length = 9 + (version >= 1) + (version >= 30) + (version >= 2)
+    _lvl_lines(f, (version >= 17) + (version >= 60) + (21 if version >= 8 else 6) * section_length + 2 * 4)
+
+    # X, Y, height, width, ID, contents, invisible, slippery, layer, then 3 events
+    block_length = 7 + (version >= 61) + (version >= 10) + 3 * (version >= 14)
+    blocks = Counter(_lvl_records(f, block_length, 4))
+    # X, Y, ID, layer
+    bgos = Counter(_lvl_records(f, 3 + (version >= 10), 2))
+    return {'Block': blocks, 'BGO': bgos}
+
+
+def scan_level(path):
+    """
+    Count the blocks and BGOs of each ID in a level.
+    :param path: The path of a .lvlx or .lvl file.
+    :return: (counts, error): a dict of the Counter of IDs for each tile type, or None and a message saying why the
+    level could not be read.
+    """
+    try:
+        with open(path, 'rb') as f:
+            counts = scan_lvlx(f) if path.lower().endswith('.lvlx') else scan_lvl(f)
+    except (OSError, LevelFormatError) as e:
+        return None, str(e)
+    return {k: dict(v) for (k, v) in counts.items()}, None
+
+
+class LevelUsage:
+    """
+    How many times each block and BGO ID is placed in the levels of one folder. Subfolders are not included. Levels
+    are only scanned again when their modification time or size changes.
+    """
+
+    def refresh(self, workers=1):
+        """
+        Bring the index up to date with the levels in the folder.
+        :param workers: The number of processes to read levels with. Worth more than 1 once there are a few levels to
+        read, since reading a level takes much longer than starting the processes.
+        :raises OSError: If the folder cannot be read.
+        """
+        stats = {}
+        with os.scandir(self.path) as entries:
+            for e in entries:
+                if e.name.lower().endswith(level_extensions) and e.is_file():
+                    stat = e.stat()
+                    stats[e.name] = (stat.st_mtime_ns, stat.st_size)
+
+        changed = [name for (name, key) in stats.items() if name not in self.levels or self.levels[name][0] != key]
+        self.scanned = len(changed)
+        if len(changed) == 0 and len(stats) == len(self.levels):
+            return  # No level was added, changed or removed.
+        paths = [os.path.join(self.path, name) for name in changed]
+        if workers > 1 and len(paths) > 1:
+            with ProcessPoolExecutor(min(workers, len(paths))) as pool:
+                results = list(pool.map(scan_level, paths, chunksize=max(1, len(paths) // (workers * 4))))
+        else:
+            results = [scan_level(p) for p in paths]
+
+        self.levels = {name: self.levels[name] for name in stats if name not in changed}
+        self.errors = {name: error for (name, error) in self.errors.items() if name in self.levels}
+        for (name, (counts, error)) in zip(changed, results):
+            if counts is None:
+                self.errors[name] = error
+                counts = {'Block': {}, 'BGO': {}}
+            self.levels[name] = (stats[name], counts)
+
+        # Rebuilding the usage of each ID is cheap next to reading the levels. A new dict is made, not changed in
+        # place, so a thread can keep using the last one while another refresh runs.
+        usage = {'Block': {}, 'BGO': {}}
+        for (name, (_, counts)) in sorted(self.levels.items()):
+            for (tile_type, type_counts) in counts.items():
+                for (tile_id, count) in type_counts.items():
+                    usage[tile_type].setdefault(tile_id, {})[name] = count
+        self.usage = usage
+
+    def forget(self, names):
+        """
+        Make the next refresh read some levels again, even if their modification time and size did not change. Used
+        after rewriting them, since the old and new files can have the same size, and some file systems only keep
+        modification times to the nearest second or two.
+        """
+        for name in names:
+            self.levels.pop(name, None)
+
+    def __init__(self, path):
+        """
+        CONSTRUCTOR
+        Call refresh before using the index.
+        :param path: The folder the levels are in.
+        """
+        self.path = path
+        self.levels = {}  # name -> ((mtime, size), the Counter of IDs for each tile type)
+        self.errors = {}  # name -> why the level could not be read
+        self.usage = {'Block': {}, 'BGO': {}}  # ID -> {level name: the number of times it is placed in the level}
+        self.scanned = 0  # The number of levels read by the last refresh
+
+
+# The level usage of every folder scanned so far, by absolute path. See _folder_indexes.
+_level_usages = {}
+
+
+def get_level_usage(path, workers=1):
+    """
+    Get the up-to-date level usage of a folder. Only one thread may call this at a time.
+    :param workers: The number of processes to read levels with.
+    :rtype: LevelUsage
+    :raises OSError: If the folder cannot be read.
+    """
+    path = os.path.abspath(path)
+    usage = _level_usages.get(path)
+    if usage is None:
+        usage = _level_usages[path] = LevelUsage(path)
+    usage.refresh(workers)
+    return usage
+
+
+def describe_usage(levels):
+    """
+    Describe where an ID is placed.
+    :param levels: The number of times it is placed in each level, by level name. See LevelUsage.usage.
+    """
+    if not levels:
+        return 'Not placed in any level'
+    total = sum(levels.values())
+    return f'Placed {total} time{"s" if total != 1 else ""} in {len(levels)} level{"s" if len(levels) != 1 else ""}'
+
+
+# -------------------------------
+# Remapping IDs
+# -------------------------------
+
+def remap_lvlx(src, dst, mapping, diff=None):
+    """
+    Copy a PGE-X level (.lvlx), changing the IDs of its blocks and BGOs. Everything else is copied byte for byte.
+    :param src: The level, opened in binary mode. It is read a line at a time.
+    :param dst: The file to write the changed level to, opened in binary mode, or None to write nothing.
+    :param mapping: The new ID of each old ID, by tile type: {'Block': {old: new}, 'BGO': {old: new}}.
+    :param diff: If not None, a unified diff of the changed lines is added to this list, as str lines.
+    :return: The number of blocks and BGOs changed.
+    """
+    changed = 0
+    section = None
+    for (n, line) in enumerate(src, 1):
+        stripped = line.strip()
+        if section is None:
+            section = _lvlx_sections.get(stripped)
+        elif stripped == b'BLOCK_END' or stripped == b'BGO_END':
+            section = None
+        elif (span := _find_lvlx_id(line)) is not None and \
+                (new_id := mapping[section].get(int(line[span[0]:span[1]]))) is not None:
+            new_line = line[:span[0]] + str(new_id).encode() + line[span[1]:]
+            if diff is not None:
+                diff += [f'@@ -{n} +{n} @@\n', f'-{line.decode(errors="replace").rstrip()}\n',
+                         f'+{new_line.decode(errors="replace").rstrip()}\n']
+            line = new_line
+            changed += 1
+        if dst is not None:
+            dst.write(line)
+    return changed
+
+
+def remap_level(path, mapping, dry_run=False):
+    """
+    Change the IDs of the blocks and BGOs in a PGE-X level. The level is written under a temporary name, which then
+    replaces it, so it is never left half written.
+    :param path: The path of the .lvlx file.
+    :param mapping: See remap_lvlx.
+    :param dry_run: If True, nothing is written, and a diff of the changes is made instead.
+    :return: (changed, diff, error): the number of blocks and BGOs changed, the diff as a list of lines (empty unless
+    <dry_run> is True), and a message saying why the level could not be changed, or None.
+    """
+    diff = []
+    temp_path = path + '.tmp'
+    try:
+        with open(path, 'rb') as src:
+            if dry_run:
+                changed = remap_lvlx(src, None, mapping, diff)
+            else:
+                with open(temp_path, 'wb') as dst:
+                    changed = remap_lvlx(src, dst, mapping)
+        if dry_run:
+            pass
+        elif changed > 0:
+            shutil.copymode(path, temp_path)
+            os.replace(temp_path, path)
+        else:
+            os.remove(temp_path)
+    except OSError as e:
+        if not dry_run and os.path.isfile(temp_path):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass  # The level itself is untouched, which is what matters.
+        return 0, [], str(e)
+
+    if diff:
+        name = os.path.basename(path)
+        diff[:0] = [f'--- {name}\n', f'+++ {name}\n']
+    return changed, diff, None
+
+
+class RemapReport:
+    """A summary of the levels changed by remap_levels"""
+
+    def summary(self):
+        """Describe the remap in a sentence or two."""
+        changed = sum(self.levels.values())
+        text = f'{"Would change" if self.dry_run else "Changed"} {changed} blocks and BGOs in {len(self.levels)} ' \
+               f'levels.'
+        if len(self.skipped) > 0:
+            text += f' {len(self.skipped)} legacy .lvl levels use the old IDs, but cannot be changed.'
+        if len(self.errors) > 0:
+            text += f' {len(self.errors)} levels could not be changed.'
+        return text
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.levels = {}  # The number of blocks and BGOs changed in each level, by name
+        self.diffs = {}  # A unified diff of each changed level, by name, for dry runs
+        self.skipped = []  # The .lvl levels that use an old ID. Only .lvlx levels can be changed.
+        self.errors = {}  # name -> why the level could not be changed
+        self.warnings = []  # A message for each new ID that is already placed in the levels
+
+
+def remap_levels(folder, mapping, workers=1, dry_run=False, levels=None):
+    """
+    Change the IDs of the blocks and BGOs placed in the levels of a folder, such as after a tileset's tiles were given
+    new IDs. Only the levels that place an old ID are read again, one pass each, several at once.
+    :param folder: The folder the levels are in.
+    :param mapping: See remap_lvlx.
+    :param workers: The number of processes to change levels with.
+    :param dry_run: If True, nothing is written, and a diff of each level is made instead.
+    :param levels: The names of the levels to change, such as the ones that could not be changed last time, or None for
+    every level. A level that was already changed must not be changed again, since an ID that was swapped would be
+    swapped back.
+    :rtype: RemapReport
+    :raises OSError: If the folder cannot be read.
+    """
+    report = RemapReport(dry_run)
+    level_usage = get_level_usage(folder, workers)
+    usage = level_usage.usage
+    affected = set()
+    for (tile_type, type_mapping) in mapping.items():
+        for (old_id, new_id) in type_mapping.items():
+            affected.update(name for name in usage[tile_type].get(old_id, ()) if levels is None or name in levels)
+            # Placed blocks or BGOs with the new ID will look like the remapped tile once it is exported.
+            placed = [name for name in usage[tile_type].get(new_id, ()) if levels is None or name in levels]
+            if new_id not in type_mapping and len(placed) > 0:
+                report.warnings.append(f'{"block" if tile_type == "Block" else "background"}-{new_id} is already '
+                                       f'placed in {len(placed)} levels.')
+    names = sorted(name for name in affected if name.lower().endswith('.lvlx'))
+    report.skipped = sorted(name for name in affected if not name.lower().endswith('.lvlx'))
+
+    paths = [os.path.join(level_usage.path, name) for name in names]
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(min(workers, len(paths))) as pool:
+            results = list(pool.map(remap_level, paths, repeat(mapping), repeat(dry_run)))
+    else:
+        results = [remap_level(p, mapping, dry_run) for p in paths]
+
+    for (name, (changed, diff, error)) in zip(names, results):
+        if error is not None:
+            report.errors[name] = error
+        elif changed > 0:
+            report.levels[name] = changed
+            if diff:
+                report.diffs[name] = diff
+    if not dry_run:
+        level_usage.forget(report.levels)
+    return report
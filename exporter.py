@@ -0,0 +1,2169 @@
+"""
+Exporter
+Exports tilesets as SMBX2 resources. Nothing here depends on tkinter, so tilesets can be exported without a window.
+"""
+import difflib
+import hashlib
+import io
+import json
+import os
+import queue
+import threading
+import time
+import zipfile
+from array import array
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import groupby, repeat
+
+import regex
+from PIL import Image, ImageChops
+from pathvalidate import sanitize_filename
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional. Slower fallbacks are used without it.
+    numpy = None
+
+from episode import EpisodeIDs
+from intervalset import IntervalSet
+from tiledata import TileData, data_defaults, light_settings, png_profiles, parse_id_list, parse_grid_size, \
+    parse_scale_list, parse_color, find_bad_tileset_fields, find_bad_tile_fields, good_tile_id, load_sheet
+
+# The options Image.save() is called with for each PNG profile. Balanced uses Pillow's defaults.
+png_save_options = {
+    'Fast': {'compress_level': 1},
+    'Balanced': {},
+    'Smallest': {'optimize': True},
+}
+
+
+class ExportError(Exception):
+    """Raised when a tileset cannot be exported. The message is meant to be shown to the user."""
+
+
+class ExportCancelled(ExportError):
+    """Raised when an export is cancelled before it finishes."""
+
+
+def resolve_worker_count(workers):
+    """Convert a worker count setting into a number of processes. 0 means one per CPU core."""
+    workers = int(workers)
+    return workers if workers > 0 else os.cpu_count() or 1
+
+
+def get_json_path(sheet_path):
+    """Get the path of the .tileset.json file that goes with a tileset image."""
+    return sheet_path.replace('.png', '.tileset.json')
+
+
+def get_export_path(sheet_path):
+    """Get the directory a tileset image is exported to. This has the same name as the image, minus the extension."""
+    # This little bit of sorcery replaces the last instance of '.png' with ''.
+    # Source:
+    # https://stackoverflow.com/questions/2556108/rreplace-how-to-replace-the-last-occurrence-of-an-expression-in
+    # -a-string
+    return ''.join(sheet_path.rsplit('.png', 1))
+
+
+def find_sheets(paths):
+    """
+    Expand a list of tileset images and directories into a list of tileset images. Only the images in a directory that
+    have a .tileset.json file are included, since the others have no tiles to export.
+    :param paths: Paths to tileset images and/or directories containing them.
+    :return: A list of paths to tileset images.
+    """
+    sheets = []
+    for p in paths:
+        if os.path.isdir(p):
+            for name in sorted(os.listdir(p)):
+                sheet = os.path.join(p, name)
+                if name.lower().endswith('.png') and os.path.exists(get_json_path(sheet)):
+                    sheets.append(sheet)
+        else:
+            sheets.append(p)
+    return sheets
+
+
+def load_tileset(sheet_path):
+    """
+    Load a tileset's settings and tiles from its .tileset.json file.
+    :param sheet_path: The path of the tileset image.
+    :return: (settings, tiles, file_data), where file_data is the raw contents of the .tileset.json file.
+    """
+    json_path = get_json_path(sheet_path)
+    if not os.path.exists(json_path):
+        raise ExportError(f"No tileset data found. Open '{sheet_path}' in the editor and save it first.")
+    with open(json_path, 'r') as f:
+        file_data = json.load(f)
+
+    settings = {k: file_data.get(k, v) for k, v in data_defaults.items()}
+    settings['export_targets'] = file_data.get('export_targets')
+    scale = int(settings['pixel_scale'])
+    tiles = [TileData(scale=scale, **td) for td in file_data.get('tiles', [])]
+
+    return settings, tiles, file_data
+
+
+def save_assigned_ids(sheet_path, tiles, file_data, force=False):
+    """
+    Write the IDs assigned to <tiles> back to the tileset's .tileset.json file, so they stay the same in later exports.
+    :param tiles: The tiles loaded from <file_data>, in the same order.
+    :param file_data: The raw contents of the .tileset.json file.
+    :param force: If True, write the file even if no ID changed, because something else in <file_data> did.
+    :return: True if the file was written, False if no ID changed.
+    """
+    changed = force
+    for td, t in zip(file_data.get('tiles', []), tiles):
+        if 'assigned_id' in t.data and td.get('assigned_id') != t.data['assigned_id']:
+            td['assigned_id'] = t.data['assigned_id']
+            changed = True
+    if not changed:
+        return False  # Rewriting the file would only change its modification time.
+    with open(get_json_path(sheet_path), 'w') as f:
+        json.dump(file_data, f)
+    return True
+
+
+def get_pending_remap(file_data):
+    """
+    Get the level update that is still owed from an earlier remap, because some levels could not be changed.
+    :param file_data: The raw contents of the .tileset.json file.
+    :return: (mapping, levels): the mapping, as for episode.remap_levels, and the names of the levels it still has to
+    be applied to. None if no update is owed.
+    """
+    pending = file_data.get('pending_remap')
+    if not isinstance(pending, dict):
+        return None
+    try:
+        mapping = {tile_type: {int(old): int(new) for (old, new) in pending.get(tile_type, [])}
+                   for tile_type in ('Block', 'BGO')}
+        levels = {str(name) for name in pending['levels']}
+    except (KeyError, TypeError, ValueError):
+        return None
+    return mapping, levels
+
+
+def set_pending_remap(file_data, mapping, levels):
+    """
+    Record the levels a remap could not change, so the next remap applies the same mapping to just those levels. The
+    record is removed if there are none.
+    :param file_data: The raw contents of the .tileset.json file.
+    :param mapping: The mapping that was applied. See episode.remap_levels.
+    :param levels: The names of the levels that could not be changed.
+    :return: True if <file_data> changed.
+    """
+    pending = {'levels': sorted(levels), **{tile_type: sorted([old, new] for (old, new) in type_mapping.items())
+                                            for (tile_type, type_mapping) in mapping.items()}} if levels else None
+    if file_data.get('pending_remap') == pending:
+        return False
+    if pending is None:
+        del file_data['pending_remap']
+    else:
+        file_data['pending_remap'] = pending
+    return True
+
+
+def check_tileset(settings, tiles):
+    """
+    Check a tileset for bad setting values.
+    :raises ExportError: If there are any bad values.
+    """
+    bad_tileset_field_count = len(find_bad_tileset_fields(settings))
+    bad_tile_count = sum(1 for t in tiles if find_bad_tile_fields(t.data))
+    duplicate_count = len(find_duplicate_ids(tiles))
+    if bad_tileset_field_count > 0 or bad_tile_count > 0 or duplicate_count > 0:
+        error_msg = "Cannot export this tileset due to the following error(s):\n"
+        if bad_tileset_field_count > 0:
+            error_msg += f"\n- {bad_tileset_field_count} invalid tileset settings."
+        if bad_tile_count > 0:
+            error_msg += f"\n- {bad_tile_count} tiles with invalid settings."
+        if duplicate_count > 0:
+            error_msg += f"\n- {duplicate_count} tiles with the same ID as another tile."
+        raise ExportError(error_msg)
+
+
+class IDAllocator:
+    """
+    Hands out IDs from an ID pool in contiguous runs. The pool's runs are also indexed by length, so the run that best
+    fits a group of tiles is found with a binary search instead of a scan of the pool.
+    """
+
+    def take(self, count, best_fit=False):
+        """
+        Take IDs out of the pool.
+        :param count: The number of IDs to take. The pool must hold at least this many.
+        :param best_fit: If True, take them from the smallest run of consecutive IDs that holds all of them, if there is
+        one. Otherwise, and if no run is big enough, they are taken from the end of the pool, like ids.pop().
+        :return: The IDs, in the order they are to be assigned.
+        """
+        if best_fit and (run := self._best_fit(count)) is not None:
+            return self._take_from_run(*run, count)
+        taken = []
+        while len(taken) < count:
+            (lo, hi) = self.ids.end_range(self.start_high)
+            taken += self._take_from_run(lo, hi, min(count - len(taken), hi - lo + 1))
+        return taken
+
+    def _best_fit(self, count):
+        """Find the smallest run that holds <count> IDs, as (lo, hi). Returns None if no run is big enough."""
+        i = bisect_left(self.by_length, (count,))
+        if i == len(self.by_length):
+            return None
+        if self.start_high:
+            # Of the runs that fit equally well, use the highest one.
+            i = bisect_left(self.by_length, (self.by_length[i][0] + 1,)) - 1
+        (length, lo) = self.by_length[i]
+        return lo, lo + length - 1
+
+    def _take_from_run(self, lo, hi, count):
+        """Take <count> IDs from the low end of the run [<lo>, <hi>], or from its high end if start_high is set."""
+        del self.by_length[bisect_left(self.by_length, (hi - lo + 1, lo))]
+        if self.start_high:
+            (taken, lo, hi) = (range(hi, hi - count, -1), lo, hi - count)
+        else:
+            (taken, lo, hi) = (range(lo, lo + count), lo + count, hi)
+        if lo <= hi:
+            insort(self.by_length, (hi - lo + 1, lo))
+        for v in taken:
+            self.ids.discard(v)
+        return list(taken)
+
+    def __init__(self, ids, start_high):
+        """
+        CONSTRUCTOR
+        :param ids: The ID pool. IDs are removed from it as they are taken.
+        :type ids: IntervalSet
+        :param start_high: If True, take IDs from the high end of the pool instead of the low end.
+        """
+        self.ids = ids
+        self.start_high = start_high
+        self.by_length = sorted((hi - lo + 1, lo) for (lo, hi) in ids.ranges())  # (length, lo) for each run
+
+
+def assign_ids(tiles, ids, start_high, allocation='In Order', row_of=None):
+    """
+    Assign IDs from <ids> to each Tile in <tiles> that does not have an ID assigned. The IDs tiles already have, set by
+    the user or assigned by an earlier export, are taken out of the pool first, so they are never given to another tile.
+    :param tiles: The tiles to which IDs are to be assigned.
+    :type tiles: deque
+    :param ids: The ID pool to use.
+    :type ids: IntervalSet
+    :param start_high: If True, take IDs from the high end of the pool instead of the low end.
+    :param allocation: How to choose the IDs. One of id_allocations. In Order takes them from the end of the pool, in
+    the order of <tiles>. Contiguous Rows gives the new tiles in each row of the tileset image the smallest run of
+    consecutive IDs that fits all of them, and Contiguous Tileset does the same for all the new tiles at once. Tiles
+    that do not fit in any run get their IDs in order instead.
+    :param row_of: Called with a tile to get the row of the tileset image it is in. Needed by the contiguous
+    allocations, which assign IDs row by row, left to right.
+    :return: True if there were enough IDs for all tiles, False otherwise. No IDs are assigned if there were not.
+    """
+    new_tiles = []
+    for t in tiles:
+        if 'assigned_id' in t.data or t.data['tile_id'] != '':
+            ids.discard(t.assign_id(None))  # Has no effect if the ID is not in the ID pool.
+        else:
+            new_tiles.append(t)
+    if len(new_tiles) > len(ids):
+        return False
+
+    for (t, new_id) in allocate_ids(new_tiles, ids, start_high, allocation, row_of):
+        t.assign_id(new_id)
+    return True
+
+
+def allocate_ids(new_tiles, ids, start_high, allocation='In Order', row_of=None):
+    """
+    Choose the IDs of tiles that do not have one, without assigning them. See assign_ids.
+    :param new_tiles: The tiles that need IDs, in order.
+    :param ids: The ID pool, without the IDs tiles already have. It must hold an ID for every tile.
+    :type ids: IntervalSet
+    :return: A list of (tile, id).
+    """
+    if allocation == 'In Order':
+        groups = [new_tiles]
+    else:
+        new_tiles = sorted(new_tiles, key=lambda t: (row_of(t), t.get_bbox()[0]))
+        if allocation == 'Contiguous Rows':
+            groups = [list(row) for (_, row) in groupby(new_tiles, row_of)]
+        else:
+            groups = [new_tiles]
+
+    allocator = IDAllocator(ids, start_high)
+    return [(t, new_id) for group in groups
+            for (t, new_id) in zip(group, allocator.take(len(group), best_fit=allocation != 'In Order'))]
+
+
+def get_row_getter(settings):
+    """Make a function that gets the row of the tileset image a tile is in, for the contiguous ID allocations."""
+    row_height = parse_grid_size(settings['grid_size'])[1] * int(settings['pixel_scale'])
+    return lambda tile: int(tile.get_bbox()[1] // row_height)
+
+
+def get_id_pool(settings, tile_type, episode_ids=None):
+    """
+    Get the IDs that can be assigned to new tiles of a type.
+    :param settings: The tileset settings.
+    :param tile_type: Block or BGO.
+    :param episode_ids: The IDs used elsewhere in the episode, which are left out. See get_episode_ids.
+    :type episode_ids: EpisodeIDs
+    :rtype: IntervalSet
+    """
+    pool = parse_id_list(settings['block_ids' if tile_type == 'Block' else 'bgo_ids'], tile_type)[1]
+    if episode_ids is not None:
+        for v in episode_ids.get_ids(tile_type):
+            pool.discard(v)
+    return pool
+
+
+def assign_tileset_ids(tiles, settings, episode_ids=None):
+    """
+    Sort the tiles by type, then assign IDs to every tile that does not have one yet.
+    :param tiles: All the tiles in the tileset.
+    :param settings: The tileset settings.
+    :param episode_ids: The IDs used elsewhere in the episode. They are taken out of the ID pools. See get_episode_ids.
+    :type episode_ids: EpisodeIDs
+    :return: (blocks, bgos)
+    :raises ExportError: If an ID pool does not contain enough IDs.
+    """
+    blocks = deque()
+    bgos = deque()
+    for v in tiles:
+        if v.data['tile_type'] == 'Block':
+            if v.data['tile_id'] != '':
+                # Tiles with user-assigned IDs should be processed before those without. This ensures that, if a
+                # user-assigned ID is also in the IDs pool, it is consumed before it is automatically assigned to
+                # another tile.
+                blocks.appendleft(v)
+            else:
+                blocks.append(v)
+        else:
+            if v.data['tile_id'] != '':
+                bgos.appendleft(v)
+            else:
+                bgos.append(v)
+
+    start_high = settings['start_high']
+    allocation = settings['id_allocation']
+    row_of = get_row_getter(settings)
+    if not assign_ids(blocks, get_id_pool(settings, 'Block', episode_ids), start_high, allocation, row_of):
+        raise ExportError('Cannot export: Not enough IDs to assign to blocks. Please add more IDs to the Block IDs '
+                          'pool, then try again.')
+    if not assign_ids(bgos, get_id_pool(settings, 'BGO', episode_ids), start_high, allocation, row_of):
+        raise ExportError('Cannot export: Not enough IDs to assign to BGOs. Please add more IDs to the BGO IDs pool, '
+                          'then try again.')
+
+    return blocks, bgos
+
+
+def get_id_mapping(old_ids):
+    """
+    Find the tiles whose ID changed, so the levels that place them can be updated. See episode.remap_levels.
+    :param old_ids: (tile, tile_type, old_id) for each tile, from before its ID was changed.
+    :return: The new ID of each old ID, by tile type: {'Block': {old: new}, 'BGO': {old: new}}.
+    """
+    mapping = {'Block': {}, 'BGO': {}}
+    for (t, tile_type, old_id) in old_ids:
+        new_id = t.data.get('assigned_id')
+        if new_id is not None and new_id != old_id and t.data['tile_type'] == tile_type:
+            mapping[tile_type][old_id] = new_id
+    return mapping
+
+
+def reassign_tileset_ids(tiles, settings, episode_ids=None):
+    """
+    Give every tile a new ID, as Clear Auto-Assigned IDs followed by an export would. Tiles with a Tile ID get it
+    again; the rest get IDs from the pools. Tile files in the episode folder for the tiles' old IDs are taken to be the
+    tileset's own, so they do not keep those IDs out of the pools.
+    :param tiles: All the tiles in the tileset.
+    :param settings: The tileset settings.
+    :param episode_ids: The IDs used elsewhere in the episode. See get_episode_ids.
+    :type episode_ids: EpisodeIDs
+    :return: (blocks, bgos, mapping). See assign_tileset_ids and get_id_mapping.
+    :raises ExportError: If an ID pool does not contain enough IDs. The tiles keep their old IDs.
+    """
+    old_ids = [(t, t.data['tile_type'], t.data['assigned_id']) for t in tiles if 'assigned_id' in t.data]
+    if episode_ids is not None:
+        for (_, tile_type, old_id) in old_ids:
+            episode_ids.release(tile_type, old_id)
+    for t in tiles:
+        t.clear_assigned_id()
+    try:
+        (blocks, bgos) = assign_tileset_ids(tiles, settings, episode_ids)
+    except ExportError:
+        for t in tiles:
+            t.clear_assigned_id()
+        for (t, _, old_id) in old_ids:
+            t.data['assigned_id'] = old_id
+        raise
+    return blocks, bgos, get_id_mapping(old_ids)
+
+
+def get_held_id(tile, tile_type=None, tile_id=None):
+    """
+    Get the ID a tile already has, before IDs are assigned: the ID assigned by an earlier export, or the user's tile ID.
+    :param tile_type: The tile's type, if it is not the one in its data yet.
+    :param tile_id: The tile's tile ID, if it is not the one in its data yet.
+    :return: The ID, '' if the tile ID is not valid, or None if the tile is waiting for an ID from the pool.
+    """
+    if 'assigned_id' in tile.data:
+        return int(tile.data['assigned_id'])
+    tile_id = tile.data['tile_id'] if tile_id is None else tile_id
+    if tile_id == '':
+        return None
+    return int(tile_id) if good_tile_id(tile_id, tile_type or tile.data['tile_type']) else ''
+
+
+def find_duplicate_ids(tiles):
+    """
+    Find the tiles that have the same ID as another tile of the same type. Their files would overwrite each other.
+    :return: A list of the tiles, grouped by ID.
+    """
+    holders = {}
+    for t in tiles:
+        if (held_id := get_held_id(t)) not in (None, ''):
+            holders.setdefault((t.data['tile_type'], held_id), []).append(t)
+    return [t for group in holders.values() if len(group) > 1 for t in group]
+
+
+def get_episode_path(sheet_path, settings):
+    """
+    Get the absolute path of a tileset's episode folder.
+    :param sheet_path: The path of the tileset image. The episode folder setting is relative to its folder.
+    :param settings: The tileset settings.
+    :return: The path, or None if the tileset has no episode folder.
+    :raises ExportError: If the episode folder does not exist.
+    """
+    if settings['episode_path'] == '':
+        return None
+    episode_path = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(sheet_path)),
+                                                 settings['episode_path']))
+    if not os.path.isdir(episode_path):
+        raise ExportError(f"The episode folder '{settings['episode_path']}' does not exist.")
+    return episode_path
+
+
+def get_episode_ids(sheet_path, settings):
+    """
+    Find the IDs used in the tileset's episode folder: by tile files such as block-12.png, and by the other tilesets
+    there and next to the tileset image. See episode.EpisodeIDs.
+    :param sheet_path: The path of the tileset image.
+    :param settings: The tileset settings.
+    :return: The IDs, or None if the tileset has no episode folder.
+    :rtype: EpisodeIDs
+    :raises ExportError: If the episode folder cannot be read.
+    """
+    episode_path = get_episode_path(sheet_path, settings)
+    if episode_path is None:
+        return None
+    try:
+        return EpisodeIDs([episode_path, os.path.dirname(os.path.abspath(sheet_path))],
+                          exclude=[get_json_path(sheet_path)])
+    except OSError as e:
+        raise ExportError(f'Cannot export: The episode folder could not be read. {e}')
+
+
+def find_episode_collisions(tiles, episode_ids):
+    """
+    Find the tiles whose ID is already used elsewhere in the episode. A tile file with the ID a tile was assigned by an
+    earlier export is taken to be that tile's own file, so only other tilesets count for those tiles.
+    :param tiles: The tiles of the tileset, before IDs are assigned.
+    :param episode_ids: See get_episode_ids.
+    :type episode_ids: EpisodeIDs
+    :return: A message describing each collision.
+    """
+    messages = []
+    for t in tiles:
+        held_id = get_held_id(t)
+        if held_id in (None, ''):
+            continue
+        tile_type = t.data['tile_type']
+        users = episode_ids.get_users(tile_type, held_id, files='assigned_id' not in t.data)
+        if users:
+            messages.append(f'{"block" if tile_type == "Block" else "background"}-{held_id} is also used by '
+                            f'{", ".join(users)}.')
+    return messages
+
+
+def get_unread_tilesets(episode_ids):
+    """
+    Describe the tilesets in the episode that could not be read, or only partly, so their IDs might be assigned again.
+    :type episode_ids: EpisodeIDs
+    :return: A message for each of them.
+    """
+    return [f'{name}: {error} Its IDs might be assigned again.' for (name, error) in episode_ids.errors.items()]
+
+
+class IDPreview:
+    """
+    The IDs an export would assign, kept up to date while the tileset is edited. Each change to a tile only updates the
+    tile itself: the IDs of the tiles waiting for one are worked out when they are looked up, from the tile's place in
+    the queue of waiting tiles and the pool of free IDs. With the In Order allocation, the k-th waiting tile gets the
+    k-th free ID, so looking one up is a pair of binary searches. The contiguous allocations depend on every waiting
+    tile, so their IDs are allocated on the first lookup after a change.
+
+    The tiles that already have an ID are indexed by it, so tiles that share an ID are found as soon as one of them is
+    changed, without comparing every pair of tiles.
+    """
+
+    def configure(self, settings, episode_ids=None):
+        """
+        Apply the tileset settings that affect ID assignment. The ID pools are only parsed again if they changed, and
+        bad ID lists are ignored, so the last good pool is kept while one is being typed.
+        :param settings: A dict with at least block_ids, bgo_ids, start_high, id_allocation, grid_size and pixel_scale.
+        :param episode_ids: The IDs used elsewhere in the episode, which are left out of the pools. See get_episode_ids.
+        :type episode_ids: EpisodeIDs
+        """
+        for (tile_type, key) in (('Block', 'block_ids'), ('BGO', 'bgo_ids')):
+            changed = False
+            if settings[key] != self.pool_lists.get(tile_type):
+                (good, pool) = parse_id_list(settings[key], tile_type)
+                if good:
+                    self.pool_lists[tile_type] = settings[key]
+                    self.parsed_pools[tile_type] = pool
+                    changed = True
+            excluded = episode_ids.get_ids(tile_type) if episode_ids is not None else set()
+            if changed or excluded != self.excluded[tile_type]:
+                self.excluded[tile_type] = excluded
+                pool = self.parsed_pools[tile_type].copy()
+                for v in excluded:
+                    pool.discard(v)
+                self._set_pool(tile_type, pool)
+        self.start_high = settings['start_high']
+        self.allocation = settings['id_allocation']
+        if parse_grid_size(settings['grid_size']) != () and int(settings['pixel_scale']) > 0:
+            self.row_of = get_row_getter(settings)
+        self.allocated = None
+
+    def reset(self, tiles):
+        """
+        Forget every tile, then add <tiles>, in order. The duplicate callback is only called for tiles in <tiles> whose
+        state changed.
+        """
+        old_duplicates = self.duplicates
+        callback = self.duplicate_callback
+        self.duplicate_callback = None
+        try:
+            self.tiles = {}
+            self.holders = {'Block': {}, 'BGO': {}}
+            self.waiting = {'Block': [], 'BGO': []}
+            self.duplicates = set()
+            self.next_order = 0
+            for tile_type in ('Block', 'BGO'):
+                self._set_pool(tile_type, self.pools[tile_type])
+            for t in tiles:
+                self.update(t)
+        finally:
+            self.duplicate_callback = callback
+        if callback is not None:
+            for t in tiles:
+                if (t in self.duplicates) != (t in old_duplicates):
+                    callback(t, t in self.duplicates)
+
+    def update(self, tile, tile_type=None, tile_id=None):
+        """
+        Add a tile after the others. If it was already added, apply changes to its type, tile ID or assigned ID.
+        :param tile_type: The tile's type, if it is still being edited and is not in its data yet.
+        :param tile_id: The tile's tile ID, if it is still being edited and is not in its data yet.
+        """
+        order = self.next_order
+        if tile in self.tiles:
+            order = self.tiles[tile][1]
+            self.remove(tile)
+        else:
+            self.next_order += 1
+
+        tile_type = tile_type or tile.data['tile_type']
+        held_id = get_held_id(tile, tile_type, tile_id)
+        if held_id is None:
+            insort(self.waiting[tile_type], (order, tile))
+        elif held_id != '':
+            holders = self.holders[tile_type].setdefault(held_id, set())
+            holders.add(tile)
+            self.free[tile_type].discard(held_id)
+            if len(holders) == 2:
+                for t in holders:
+                    self._set_duplicate(t, True)
+            elif len(holders) > 2:
+                self._set_duplicate(tile, True)
+        self.tiles[tile] = (tile_type, order, held_id)
+        self.allocated = None
+
+    def remove(self, tile):
+        """Forget a tile that was deleted. Has no effect if the tile was never added."""
+        if tile not in self.tiles:
+            return
+        (tile_type, order, held_id) = self.tiles.pop(tile)
+        if held_id is None:
+            waiting = self.waiting[tile_type]
+            del waiting[bisect_left(waiting, (order,))]
+        elif held_id != '':
+            holders = self.holders[tile_type][held_id]
+            holders.discard(tile)
+            self._set_duplicate(tile, False)
+            if len(holders) == 1:
+                self._set_duplicate(next(iter(holders)), False)
+            elif len(holders) == 0:  # No other tile holds the ID, so it is free again.
+                del self.holders[tile_type][held_id]
+                if held_id in self.pools[tile_type]:
+                    self.free[tile_type].add(held_id)
+        self.allocated = None
+
+    def get_id(self, tile):
+        """
+        Get the ID a tile has or would be assigned.
+        :return: The ID, '' if the tile's ID is not valid, or None if the pool would run out before the tile.
+        """
+        (tile_type, order, held_id) = self.tiles[tile]
+        if held_id is not None:
+            return held_id
+        if self.allocation != 'In Order':
+            if self.allocated is None:
+                self.allocated = {}
+                for (pool_type, waiting) in self.waiting.items():
+                    if len(waiting) <= len(self.free[pool_type]):
+                        self.allocated.update(allocate_ids([t for (_, t) in waiting], self.free[pool_type].copy(),
+                                                           self.start_high, self.allocation, self.row_of))
+            return self.allocated.get(tile)
+
+        rank = bisect_left(self.waiting[tile_type], (order,))
+        if rank >= len(self.free[tile_type]):
+            return None
+        return self.free[tile_type].select(rank, self.start_high)
+
+    def get_remaining(self, tile_type):
+        """Get the number of IDs left in a pool after every tile waiting for one gets one. Negative if it is short."""
+        return len(self.free[tile_type]) - len(self.waiting[tile_type])
+
+    def _set_duplicate(self, tile, duplicate):
+        """Record whether a tile shares its ID with another tile, and call the duplicate callback if that changed."""
+        if (tile in self.duplicates) == duplicate:
+            return
+        if duplicate:
+            self.duplicates.add(tile)
+        else:
+            self.duplicates.discard(tile)
+        if self.duplicate_callback is not None:
+            self.duplicate_callback(tile, duplicate)
+
+    def _set_pool(self, tile_type, pool):
+        """Replace a pool. The free IDs are the pool minus the IDs tiles already have."""
+        self.pools[tile_type] = pool
+        free = pool.copy()
+        for v in self.holders.get(tile_type, ()):
+            free.discard(v)
+        self.free[tile_type] = free
+
+    def __init__(self, duplicate_callback=None):
+        """
+        CONSTRUCTOR
+        Call configure, then reset, before using the preview.
+        :param duplicate_callback: Called with (tile, duplicate) when a tile starts or stops sharing its ID with another
+        tile of the same type.
+        """
+        self.duplicate_callback = duplicate_callback
+        self.pool_lists = {}  # The ID list each pool was parsed from
+        self.parsed_pools = {'Block': IntervalSet(), 'BGO': IntervalSet()}
+        self.excluded = {'Block': set(), 'BGO': set()}  # The IDs used elsewhere in the episode
+        self.pools = {'Block': IntervalSet(), 'BGO': IntervalSet()}
+        self.free = {}  # The IDs in each pool that no tile has yet
+        self.holders = {'Block': {}, 'BGO': {}}  # ID -> the tiles that have it
+        self.waiting = {'Block': [], 'BGO': []}  # (order, tile) for each tile waiting for an ID, sorted
+        self.tiles = {}  # tile -> (tile_type, order, held_id)
+        self.duplicates = set()  # The tiles that share their ID with another tile
+        self.next_order = 0
+        self.start_high = False
+        self.allocation = 'In Order'
+        self.row_of = None
+        self.allocated = None  # tile -> ID, for the contiguous allocations. None when it has to be allocated again.
+
+
+def get_tileset_file(tiles, tile_type, settings):
+    """
+    Create a tileset file for PGE
+    :return: (file_name, contents), or None if there are no tiles to put in the file.
+    """
+    if len(tiles) == 0:
+        return None  # Don't create an empty tileset file.
+
+    grid_height = parse_grid_size(settings['grid_size'])[0] * int(settings['pixel_scale'])
+    # Tileset type field doesn't appear to matter for mixed tilesets.
+    tile_type_int = 1 if tile_type in {'BGO', 'Mixed'} else 0
+    mixed = tile_type == 'Mixed'
+    tiles = sorted(tiles)
+
+    tileset_layout = {}
+    max_col = 0
+    for t in tiles:
+        row = int(t.get_bbox()[1] // grid_height)
+        if row not in tileset_layout:
+            tileset_layout[row] = []
+        tileset_layout[row].append(t)
+        max_col = max(max_col, len(tileset_layout[row]))
+
+    tileset_name = f'{settings["tileset_name"]}'
+    if not mixed:
+        tileset_name += f' ({tile_type}s)'
+    row_lookahead = 0
+    lines = [f'[tileset]\n'
+             f'rows={len(tileset_layout)}\n'
+             f'cols={max_col}\n'
+             f'name={tileset_name}\n'  # Make this configurable?
+             f'type={tile_type_int}\n']
+    for row in range(len(tileset_layout)):
+        while row + row_lookahead not in tileset_layout:
+            row_lookahead += 1
+        for col in range(len(tileset_layout[row + row_lookahead])):
+            tile = tileset_layout[row + row_lookahead][col]
+            lines.append(f'\n'
+                         f'[item-{col}-{row}]\n'
+                         f'id={tile.data["assigned_id"]}\n')
+            if mixed:
+                lines.append(f'type={1 if tile.data["tile_type"] == "BGO" else 0}\n')
+
+    return f'{sanitize_filename(tileset_name)}.tileset.ini', ''.join(lines)
+
+
+def get_tileset_files(blocks, bgos, settings):
+    """
+    Create the PGE tileset files requested by the tileset settings.
+    :return: A list of (file_name, contents).
+    """
+    if not settings['create_pge_tileset']:
+        return []
+    if settings['mixed_pge_tileset']:
+        files = [get_tileset_file(list(blocks) + list(bgos), 'Mixed', settings)]
+    else:
+        files = [get_tileset_file(blocks, 'Block', settings), get_tileset_file(bgos, 'BGO', settings)]
+    return [f for f in files if f is not None]
+
+
+# The library that makes solid sizables work. Sizables are always semisolid in SMBX2, so players landing on top of them
+# are left to the engine, and the library only pushes players out of the sides and bottom. The ID tables are filled in
+# when the library is generated, so checking a block is a single table lookup.
+sizables_script_template = '''--[[
+    Solid sizables for {tileset_name}
+    Generated by SMBX2 Tileset Importer. Load it from your level or episode's luna.lua file:
+
+        require("{module_name}")
+
+    This file is overwritten each time the tileset is exported.
+]]
+
+local sizables = {{}}
+
+-- Every sizable block in the tileset.
+sizables.ids = {{
+{ids}}}
+
+-- The sizables that are solid on every side, instead of only on top.
+sizables.solid = {{
+{solid_ids}}}
+
+local solid = sizables.solid
+
+local function pushOut(p, b)
+    local left = p.x + p.width - b.x
+    local right = b.x + b.width - p.x
+    local top = p.y + p.height - b.y
+    local bottom = b.y + b.height - p.y
+    local smallest = math.min(left, right, top, bottom)
+    if smallest == top then
+        return  -- The engine already handles landing on top.
+    elseif smallest == bottom then
+        p.y = b.y + b.height
+        if p.speedY < 0 then
+            p.speedY = 0
+        end
+    elseif smallest == left then
+        p.x = b.x - p.width
+        if p.speedX > 0 then
+            p.speedX = 0
+        end
+    else
+        p.x = b.x + b.width
+        if p.speedX < 0 then
+            p.speedX = 0
+        end
+    end
+end
+
+function sizables.onInitAPI()
+    registerEvent(sizables, "onTickEnd")
+end
+
+function sizables.onTickEnd()
+    for _, p in ipairs(Player.get()) do
+        for _, b in Block.iterateIntersecting(p.x, p.y, p.x + p.width, p.y + p.height) do
+            if solid[b.id] and not b.isHidden then
+                pushOut(p, b)
+            end
+        end
+    end
+end
+
+return sizables
+'''
+
+
+def get_sizables_module_name(tileset_name):
+    """Get the name a tileset's sizables library is loaded with. Lua module names cannot contain dots or spaces."""
+    return (regex.sub(r'[^a-z0-9]+', '_', tileset_name.lower()).strip('_') or 'tileset') + '_sizables'
+
+
+def get_sizables_script(blocks, settings):
+    """
+    Create the Lua library that makes the tileset's solid sizables work, if the tileset settings ask for it.
+    :param blocks: The tileset's blocks. IDs must already be assigned.
+    :return: (file_name, contents), or None if there are no sizables or the library is not wanted.
+    """
+    if not settings['create_sizables_script']:
+        return None
+    sizables = sorted((t for t in blocks if t.data['sizable']), key=lambda t: int(t.data['assigned_id']))
+    if len(sizables) == 0:
+        return None
+
+    module_name = get_sizables_module_name(settings['tileset_name'])
+    ids = ''.join(f'    [{t.data["assigned_id"]}] = true,\n' for t in sizables)
+    solid_ids = ''.join(f'    [{t.data["assigned_id"]}] = true,\n' for t in sizables
+                        if t.data['collision_type'] == 'Solid ■')
+    return f'{module_name}.lua', sizables_script_template.format(tileset_name=settings['tileset_name'],
+                                                                 module_name=module_name, ids=ids,
+                                                                 solid_ids=solid_ids)
+
+
+# -------------------------------
+# Export Pipeline
+# -------------------------------
+# Tiles are exported in three stages: the tile images are cropped out of the tileset image on the calling thread, they
+# are encoded as PNGs (or legacy GIFs) in a pool of worker processes, and the encoded images and .txt files are written
+# to disk by a writer thread. Files that have not changed since the last export are skipped before they reach the pool.
+
+
+def format_size(size):
+    """Format a number of bytes for display (e.g. 1.5 MB)."""
+    for unit in ('bytes', 'KB', 'MB'):
+        if size < 1024 or unit == 'MB':
+            return f'{size} {unit}' if unit == 'bytes' else f'{size:.1f} {unit}'
+        size /= 1024
+
+
+class ExportReport:
+    """A summary of a finished export"""
+
+    def add_encoded(self, images, seconds):
+        """
+        Count encoded images.
+        :param images: The encoded images.
+        :param seconds: The time spent encoding them.
+        """
+        self.images_encoded += len(images)
+        self.png_bytes += sum(len(image) for image in images)
+        self.encode_time += seconds
+
+    def add_error(self, name, message):
+        """
+        Record a file that could not be exported.
+        :param name: The name of the file.
+        :param message: What went wrong.
+        """
+        self.errors.append((name, message))
+
+    def summary(self):
+        """Describe the export in a sentence or two that can be shown to the user."""
+        targets = f' for {" and ".join(self.targets)}' if len(self.targets) > 1 else ''
+        text = f'Successfully exported {self.block_count} blocks and {self.bgo_count} BGOs{targets}. ' \
+               f'{self.files_written} files written, {self.files_unchanged} unchanged, {self.files_removed} removed.'
+        if self.images_encoded > 0:
+            profile = f' with the {self.png_profile} profile' if self.png_profile is not None else ''
+            text += f' Encoded {self.images_encoded} images ({format_size(self.png_bytes)}) in ' \
+                    f'{self.encode_time:.2f} s{profile}.'
+        if len(self.errors) > 0:
+            text += f' {len(self.errors)} files could not be exported.'
+        if len(self.warnings) > 0:
+            text += f' {len(self.warnings)} warnings about IDs used elsewhere in the episode.'
+        return text
+
+    def __init__(self, block_count=0, bgo_count=0, png_profile='Balanced', targets=()):
+        self.block_count = block_count
+        self.bgo_count = bgo_count
+        self.png_profile = png_profile  # None if no PNGs were exported
+        self.targets = list(targets)  # The names of the export targets
+        self.files_written = 0
+        self.files_unchanged = 0
+        self.files_removed = 0
+        self.images_encoded = 0
+        self.png_bytes = 0
+        self.encode_time = 0.0  # Summed over all the worker processes
+        self.errors = []  # (file_name, message) for each file that could not be exported
+        # A message for each unreadable tileset in the episode, and each tile whose ID is used elsewhere in it
+        self.warnings = []
+
+
+def get_digest(contents):
+    """Hash the contents of a file. Text is hashed as UTF-8."""
+    if isinstance(contents, str):
+        contents = contents.encode()
+    return hashlib.blake2b(contents, digest_size=16).hexdigest()
+
+
+def get_image_digest(image, options=''):
+    """
+    Hash the pixels of an image. This is much faster than encoding the image, so it is used to tell whether a tile's
+    image needs to be encoded again.
+    :type image: PIL.Image.Image
+    :param options: Anything else that affects how the image will be exported, such as the scale it is exported at.
+    """
+    h = hashlib.blake2b(f'{image.mode} {image.width}x{image.height} {options}'.encode(), digest_size=16)
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+class ExportManifest:
+    """
+    Records a hash of every file written to an export directory. On the next export, files whose hash has not changed
+    are not written again, and files that are no longer produced (such as those of deleted tiles, or of tiles whose ID
+    changed) are deleted.
+    """
+    file_name = '.export-manifest.json'
+
+    def needs_update(self, name, digest):
+        """
+        Record that the file <name> is part of this export, and check whether it has to be written.
+        :param name: The name of the file, relative to the export directory.
+        :param digest: The hash of the file's contents, or of whatever the contents are made from.
+        :return: True if the file has changed since the last export or is missing, False otherwise.
+        """
+        self.files[name] = digest
+        if not self.full and self.old_files.get(name) == digest \
+                and os.path.exists(os.path.join(self.export_path, name)):
+            self.report.files_unchanged += 1
+            return False
+        self.report.files_written += 1
+        return True
+
+    def skip(self, name):
+        """
+        Record that the file <name> could not be exported. The file from the last export, if any, is left alone, and the
+        next export tries to write it again.
+        """
+        if self.files.pop(name, None) is not None:
+            self.report.files_written -= 1
+        if name in self.old_files:
+            self.files[name] = self.old_files[name]
+
+    def remove_orphans(self):
+        """Delete the files written by the last export that were not part of this one."""
+        if self.export_path is None:
+            return
+        for name in self.old_files:
+            if name not in self.files:
+                try:
+                    os.remove(os.path.join(self.export_path, name))
+                    self.report.files_removed += 1
+                except FileNotFoundError:
+                    pass
+
+    def save(self, written=None):
+        """
+        Save the manifest. This should only be done once all the files in it have been written.
+        :param written: If the export stopped early, the names of the files that were written before it stopped. The
+        manifest saved is the last one, updated with these files, so it still matches the export directory.
+        """
+        if self.export_path is None:
+            return
+        files = self.files
+        if written is not None:
+            files = dict(self.old_files)
+            files.update((name, self.files[name]) for name in written)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'files': files}, f)
+        os.replace(temp_path, self.path)
+
+    def __init__(self, export_path, report, full=False):
+        """
+        CONSTRUCTOR
+        :param export_path: The export directory, or None if the export does not go to a directory (i.e. a .zip
+        archive). Nothing is loaded or saved in that case, and every file is written.
+        :param report: The report of the current export. File counts are added to it.
+        :param full: If True, every file is written, even if it has not changed.
+        """
+        self.export_path = export_path
+        self.report = report
+        self.full = full or export_path is None
+        self.files = {}
+        self.old_files = {}
+        if export_path is None:
+            return
+
+        self.path = os.path.join(export_path, self.file_name)
+        self.old_files = self.load(export_path)
+
+    @classmethod
+    def load(cls, export_path):
+        """
+        Load the manifest saved in an export directory.
+        :return: The hash of each file written by the last export, by file name. Empty if there is no manifest.
+        """
+        path = os.path.join(export_path, cls.file_name)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    return json.load(f)['files']
+            except (ValueError, KeyError):
+                pass  # A damaged manifest just means everything is written again.
+        return {}
+
+
+def _epx_rules(n, E, A, B, C, D, F, G, H, I):
+    """
+    The Scale2x (EPX) and Scale3x rules. Each argument is a pixel, or every pixel at once, and its neighbors:
+        A B C
+        D E F
+        G H I
+    Works with NumPy arrays and with plain values, so the NumPy and pure Python versions cannot drift apart. The rules
+    only apply where B != H and D != F; everywhere else, every output pixel is E.
+    :return: (conditions, values) for the n * n output pixels of E, row by row. An output pixel is its value if its
+    condition is true, and E otherwise.
+    """
+    if n == 2:
+        return [(D == B), (B == F), (D == H), (H == F)], [D, F, D, F]
+    return [(D == B), (D == B) & (E != C) | (B == F) & (E != A), (B == F),
+            (D == B) & (E != G) | (D == H) & (E != A), False, (B == F) & (E != I) | (H == F) & (E != C),
+            (D == H), (D == H) & (E != I) | (H == F) & (E != G), (H == F)], [D, B, F, D, E, F, D, H, F]
+
+
+def _epx_pixels(image):
+    """
+    Get the pixels of an image as values that are equal only if the pixels are the same color: palette indices for
+    palette and grayscale images, and packed 32-bit RGBA otherwise.
+    :return: (image, pixels). The image is converted to RGBA if it was in any other mode.
+    """
+    if image.mode not in ('P', 'L', 'RGBA'):
+        image = image.convert('RGBA')
+    if numpy is None:
+        return image, list(image.tobytes()) if image.mode != 'RGBA' else array('I', image.tobytes())
+    pixels = numpy.asarray(image)
+    return image, pixels if image.mode != 'RGBA' else numpy.ascontiguousarray(pixels).view(numpy.uint32)[..., 0]
+
+
+def _scale_epx_python(pixels, w, h, n):
+    """Scale2x or Scale3x, one pixel at a time. Used when NumPy is not available. See scale_epx."""
+    out = [[None] * (w * n) for _ in range(h * n)]
+    for y in range(h):
+        row = pixels[y * w:(y + 1) * w]
+        above = pixels[max(y - 1, 0) * w:(max(y - 1, 0) + 1) * w]
+        below = pixels[min(y + 1, h - 1) * w:(min(y + 1, h - 1) + 1) * w]
+        for x in range(w):
+            (left, right) = (max(x - 1, 0), min(x + 1, w - 1))
+            E = row[x]
+            (conditions, values) = _epx_rules(n, E, above[left], above[x], above[right], row[left], row[right],
+                                              below[left], below[x], below[right])
+            if not (above[x] != below[x] and row[left] != row[right]):
+                conditions = [False] * (n * n)  # Flat areas and straight lines are left alone.
+            for (i, (condition, value)) in enumerate(zip(conditions, values)):
+                out[y * n + i // n][x * n + i % n] = value if condition else E
+    return [v for row in out for v in row]
+
+
+def scale_epx(image, n):
+    """
+    Scale an image up with Scale2x (also known as EPX) or Scale3x. These are made for pixel art: like nearest neighbor
+    scaling, they never add colors, but they round off the corners of diagonal edges instead of making them blocky.
+    With NumPy, each output pixel is picked for the whole image at once by comparing shifted copies of it.
+    :type image: PIL.Image.Image
+    :param n: 2 for Scale2x, 3 for Scale3x.
+    :return: The scaled image. Palette and grayscale images keep their mode and palette; others become RGBA.
+    """
+    (image, pixels) = _epx_pixels(image)
+    (w, h) = image.size
+    # Resizing gives an image of the right size, mode and palette to load the scaled pixels into.
+    scaled = image.resize((w * n, h * n), resample=Image.NEAREST)
+    if numpy is None:
+        out = _scale_epx_python(pixels, w, h, n)
+        scaled.frombytes(bytes(out) if image.mode != 'RGBA' else array('I', out).tobytes())
+        return scaled
+
+    # Each neighbor of every pixel at once. The image's edge pixels are their own neighbors beyond the edge.
+    padded = numpy.pad(pixels, 1, mode='edge')
+    (A, B, C) = (padded[:-2, :-2], padded[:-2, 1:-1], padded[:-2, 2:])
+    (D, E, F) = (padded[1:-1, :-2], pixels, padded[1:-1, 2:])
+    (G, H, I) = (padded[2:, :-2], padded[2:, 1:-1], padded[2:, 2:])
+    (conditions, values) = _epx_rules(n, E, A, B, C, D, F, G, H, I)
+    changed = (B != H) & (D != F)  # Flat areas and straight lines are left alone.
+    out = numpy.empty((h, n, w, n), dtype=pixels.dtype)
+    for (i, (condition, value)) in enumerate(zip(conditions, values)):
+        out[:, i // n, :, i % n] = numpy.where(changed & condition, value, E)
+    scaled.frombytes(out.tobytes())
+    return scaled
+
+
+def scale_image(image, scale, upscaler='Nearest'):
+    """
+    Scale an image up by an integer factor without smoothing.
+    :type image: PIL.Image.Image
+    :param upscaler: How to scale the image. One of upscalers. Scale2x is used for each factor of 2 in <scale>, and
+    Scale3x for each factor of 3; the rest of the scale, if any, is done with nearest neighbor scaling.
+    """
+    if upscaler != 'Nearest':
+        n = 2 if upscaler == 'Scale2x' else 3
+        while scale % n == 0:
+            image = scale_epx(image, n)
+            scale //= n
+    if scale == 1:
+        return image
+    return image.resize((image.width * scale, image.height * scale), resample=Image.NEAREST)
+
+
+def reduce_palette(image):
+    """
+    Convert an image to a palette image if that can be done without changing any pixels, i.e. if it has no more than 256
+    colors. Palette images store one byte per pixel instead of four, so their PNGs are much smaller.
+    :type image: PIL.Image.Image
+    :return: The palette image, or <image> if it has too many colors.
+    """
+    if image.mode not in ('RGB', 'RGBA'):
+        return image  # Already a palette or grayscale image
+    rgba = image.convert('RGBA')
+    colors = rgba.getcolors(256)
+    if colors is None:
+        return image
+
+    palette = [bytes(c) for (_, c) in colors]
+    data = rgba.tobytes()
+    if numpy is not None:
+        # Each pixel is read as one 32-bit number, and every pixel's palette index is found at once with a binary search
+        # of the sorted palette.
+        keys = numpy.frombuffer(b''.join(palette), dtype=numpy.uint32)
+        order = numpy.argsort(keys)
+        pixels = numpy.frombuffer(data, dtype=numpy.uint32)
+        indices = order[numpy.searchsorted(keys[order], pixels)].astype(numpy.uint8).tobytes()
+    else:
+        index = {c: i for (i, c) in enumerate(palette)}
+        indices = bytes(index[data[i:i + 4]] for i in range(0, len(data), 4))
+    reduced = Image.frombytes('P', rgba.size, indices)
+    # The palette is kept to the colors actually used, so the PNG encoder can pick the smallest bit depth for it.
+    reduced.putpalette(b''.join(c[:3] for c in palette), 'RGB')
+    if any(c[3] != 255 for c in palette):
+        reduced.info['transparency'] = bytes(c[3] for c in palette)  # Saved as the PNG's tRNS chunk
+    return reduced
+
+
+def encode_png(image, profile='Balanced'):
+    """
+    Encode an image as a PNG.
+    :type image: PIL.Image.Image
+    :param profile: The PNG profile to encode with. One of png_profiles.
+    :return: The encoded image.
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', **png_save_options[profile])
+    return buffer.getvalue()
+
+
+def encode_tile_image(image, scale, profile='Balanced', upscaler='Nearest'):
+    """
+    Scale up and encode a tile image as a PNG.
+    :param image: The tile image, as cut from the tileset image.
+    :type image: PIL.Image.Image
+    :param scale: The pixel scale to export at.
+    :param profile: The PNG profile to encode with. One of png_profiles.
+    :param upscaler: How to scale the image up. One of upscalers.
+    :return: The encoded image.
+    """
+    png = encode_png(scale_image(image, scale, upscaler), profile)
+    if profile == 'Smallest' and (reduced := reduce_palette(image)) is not image:
+        # Palette images are usually smaller, but not always: smooth gradients compress better with full color. Both
+        # are tried, and the smaller is kept. Reducing before scaling up means there are far fewer pixels to look at.
+        reduced_png = encode_png(scale_image(reduced, scale, upscaler), profile)
+        if len(reduced_png) < len(png):
+            return reduced_png
+    return png
+
+
+def split_mask(image):
+    """
+    Split an image into the color image and mask of a legacy (SMBX 1.3) sprite. The game draws the mask with AND, then
+    the color image with OR, so transparent pixels are white in the mask and black in the color image. Partly
+    transparent pixels are blended with the black matte, and get a gray mask. Each step works on a whole channel at
+    once, so this is about as fast as copying the image.
+    :type image: PIL.Image.Image
+    :return: (color, mask). color is an RGB image, and mask is a grayscale image.
+    """
+    rgba = image.convert('RGBA')
+    alpha = rgba.getchannel('A')
+    color = ImageChops.multiply(rgba.convert('RGB'), Image.merge('RGB', (alpha, alpha, alpha)))
+    return color, ImageChops.invert(alpha)
+
+
+def encode_gif(image):
+    """
+    Encode an image as a GIF.
+    :param image: A palette or grayscale image.
+    :type image: PIL.Image.Image
+    :return: The encoded image.
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, 'GIF')
+    return buffer.getvalue()
+
+
+def encode_gif_tile_image(image, scale, upscaler='Nearest'):
+    """
+    Scale up and encode a tile image as a legacy GIF sprite and its mask. Tiles with more than 256 colors are quantized,
+    since that is all a GIF can hold.
+    :param image: The tile image, as cut from the tileset image.
+    :type image: PIL.Image.Image
+    :param scale: The pixel scale to export at.
+    :param upscaler: How to scale the image up. One of upscalers.
+    :return: (gif, mask_gif), the encoded images.
+    """
+    if upscaler != 'Nearest':
+        # The color image and mask have to be scaled up together, or their edges could be rounded off differently.
+        (image, scale) = (scale_image(image, scale, upscaler), 1)
+    # Splitting and reducing before scaling up means there are far fewer pixels to work on.
+    (color, mask) = split_mask(image)
+    if (reduced := reduce_palette(color)) is color:
+        reduced = color.quantize(256)
+    return encode_gif(scale_image(reduced, scale)), encode_gif(scale_image(mask, scale))
+
+
+def encode_image_batch(jobs, profile='Balanced', upscaler='Nearest'):
+    """
+    Scale up and encode a batch of tile images. This runs in the export worker processes. The images are sent to the
+    workers unscaled, so there is less data to pass between processes.
+    :param jobs: (image, scale, gif, recolor_table) for each image to encode. If gif is True, the image is encoded as a
+    legacy GIF sprite and its mask, otherwise as a PNG. If recolor_table is not None, the image is recolored with it
+    first (see recolor_image).
+    :param profile: The PNG profile to encode with.
+    :param upscaler: How to scale the images up. One of upscalers.
+    :return: (encoded, errors, seconds). encoded has a list of the files made from each image: [png], or
+    [gif, mask_gif]. It has None in place of each image that could not be encoded, errors has an (index, message) for
+    each of them, and seconds is the time spent encoding the batch.
+    """
+    start = time.perf_counter()
+    encoded = []
+    errors = []
+    for (i, (image, scale, gif, recolor_table)) in enumerate(jobs):
+        try:
+            if recolor_table is not None:
+                image = recolor_image(image, recolor_table)
+            if gif:
+                encoded.append(list(encode_gif_tile_image(image, scale, upscaler)))
+            else:
+                encoded.append([encode_tile_image(image, scale, profile, upscaler)])
+        except (OSError, ValueError) as e:
+            encoded.append(None)
+            errors.append((i, str(e)))
+    return encoded, errors, time.perf_counter() - start
+
+
+class DirectorySink:
+    """Writes exported files into a directory. Exports to a directory are incremental."""
+    incremental = True
+
+    def write(self, name, contents):
+        """
+        Write a file.
+        :param name: The name of the file, relative to the export directory.
+        :param contents: bytes for binary files or str for text files.
+        """
+        with open(os.path.join(self.path, name), 'wb' if isinstance(contents, bytes) else 'w') as f:
+            f.write(contents)
+
+    def close(self):
+        pass
+
+    def discard(self):
+        """Called instead of close() if the export fails. Files that were already written are left alone."""
+        pass
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+
+class ZipSink:
+    """
+    Streams exported files into a single .zip archive, writing each entry as soon as it is produced. The archive is
+    built under a temporary name and only replaces <path> once it is complete.
+    """
+    incremental = False
+
+    def write(self, name, contents):
+        """
+        Add a file to the archive.
+        :param name: The name of the file inside the archive.
+        :param contents: bytes for binary files or str for text files.
+        """
+        if isinstance(contents, str):
+            contents = contents.encode()
+        info = zipfile.ZipInfo(name, self.date_time)
+        info.external_attr = 0o644 << 16
+        # PNGs and GIFs are already compressed, so compressing them again costs time for almost no gain.
+        if self.store_images and name.endswith(('.png', '.gif')):
+            info.compress_type = zipfile.ZIP_STORED
+        else:
+            info.compress_type = zipfile.ZIP_DEFLATED
+        self.zip.writestr(info, contents)
+
+    def close(self):
+        self.zip.close()
+        os.replace(self.temp_path, self.path)
+
+    def discard(self):
+        """Called instead of close() if the export fails. The existing archive, if any, is left alone."""
+        self.zip.close()
+        os.remove(self.temp_path)
+
+    def __init__(self, path, store_images=True):
+        """
+        CONSTRUCTOR
+        :param path: The path of the .zip file.
+        :param store_images: If True, PNGs are stored without compression.
+        """
+        self.path = path
+        self.temp_path = path + '.tmp'
+        self.store_images = store_images
+        self.date_time = datetime.now().timetuple()[:6]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.zip = zipfile.ZipFile(self.temp_path, 'w')
+
+
+class MemorySink:
+    """Keeps exported files in memory instead of writing them anywhere. Used for dry runs."""
+    incremental = False
+
+    def write(self, name, contents):
+        """
+        Keep a file.
+        :param name: The name of the file, relative to the export directory.
+        :param contents: bytes for binary files or str for text files.
+        """
+        self.files[name] = contents
+
+    def close(self):
+        pass
+
+    def discard(self):
+        pass
+
+    def __init__(self, path):
+        """
+        CONSTRUCTOR
+        :param path: The directory or .zip file the export would have been written to.
+        """
+        self.path = path
+        self.files = {}
+
+
+class FileWriter(threading.Thread):
+    """The last stage of the export pipeline. Writes files on its own thread, so slow disks do not hold up encoding."""
+
+    def write(self, name, contents):
+        """
+        Queue a file to be written.
+        :param name: The name of the file, relative to the export directory.
+        :param contents: bytes for binary files or str for text files.
+        """
+        self.queue.put((name, contents))
+
+    def run(self):
+        while (item := self.queue.get()) is not None:
+            if self.error is not None:
+                continue  # Keep emptying the queue so write() never blocks forever.
+            try:
+                self.sink.write(*item)
+                self.written.append(item[0])
+            except OSError as e:
+                self.error = e
+
+    def close(self):
+        """Wait for all queued files to be written. Raises the first error that occurred while writing, if any."""
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+    def __init__(self, sink, max_queued=64):
+        """
+        CONSTRUCTOR
+        :param sink: Where the files are written to.
+        :type sink: DirectorySink | ZipSink | MemorySink
+        :param max_queued: The number of files that can be waiting to be written before write() blocks.
+        """
+        super().__init__(daemon=True)
+        self.sink = sink
+        self.queue = queue.Queue(max_queued)
+        self.error = None
+        self.written = []  # The names of the files written so far
+        self.start()
+
+
+# -------------------------------
+# Palette Variants
+# -------------------------------
+# A palette variant is a recolored copy of a tileset, such as a night or snow version. Every variant has the same tiles
+# and IDs as the tileset; only the colors of the tile images are changed, using a table of the colors to replace.
+
+
+class PaletteVariant:
+    """A recolored copy of a tileset, exported next to it"""
+
+    def __init__(self, name, table):
+        """
+        CONSTRUCTOR
+        :param name: The name of the variant. It is added to the names of the export directories (e.g. tiles-night).
+        :param table: ((old_rgb, new_rgb), ...) for each color to replace, sorted by old_rgb.
+        """
+        self.name = name
+        self.table = tuple(sorted(table))
+        self.digest = get_digest(repr(self.table))
+
+
+def get_variants_path(sheet_path):
+    """Get the path of the .variants.json file that lists the palette variants of a tileset image."""
+    return sheet_path.replace('.png', '.variants.json')
+
+
+def load_palette_variants(sheet_path):
+    """
+    Load the palette variants of a tileset from its .variants.json file. The file maps the name of each variant to the
+    colors it replaces, e.g. {"night": {"#6b8cff": "#101840", "#ffffff": "#c0c8ff"}}.
+    :param sheet_path: The path of the tileset image.
+    :rtype: list[PaletteVariant]
+    :raises ExportError: If the file is missing or not valid.
+    """
+    path = get_variants_path(sheet_path)
+    try:
+        with open(path, 'r') as f:
+            file_data = json.load(f)
+    except FileNotFoundError:
+        raise ExportError(f'Palette variants are turned on, but {os.path.basename(path)} was not found.')
+    except ValueError as e:
+        raise ExportError(f'{os.path.basename(path)} is not a valid JSON file: {e}')
+    if not isinstance(file_data, dict):
+        raise ExportError(f'{os.path.basename(path)} must map each variant name to a table of colors.')
+
+    variants = []
+    for (name, colors) in file_data.items():
+        if name == '' or sanitize_filename(name) != name:
+            raise ExportError(f"'{name}' cannot be used as a variant name, since it is not a valid file name.")
+        if not isinstance(colors, dict):
+            raise ExportError(f"Variant '{name}' must map each color to replace to its new color.")
+        table = [(parse_color(old), parse_color(new)) for (old, new) in colors.items()]
+        if any(old is None or new is None for (old, new) in table):
+            raise ExportError(f"Variant '{name}' has a color that is not written as #rrggbb.")
+        variants.append(PaletteVariant(name, table))
+    return variants
+
+
+@lru_cache(maxsize=32)
+def _recolor_masks(table):
+    """Get the per-channel lookup tables that pick out each old color of a recolor table. Used without NumPy."""
+    return [[[255 if v == c else 0 for v in range(256)] for c in old] for (old, _) in table]
+
+
+def recolor_image(image, table):
+    """
+    Replace colors in an image with a lookup table. Every pixel is looked up at once; colors that are not in the table,
+    and the alpha channel, are left alone. Each color is only replaced once, so a table can swap two colors.
+    :type image: PIL.Image.Image
+    :param table: ((old_rgb, new_rgb), ...) for each color to replace, sorted by old_rgb.
+    :return: The recolored image, in RGBA mode.
+    """
+    rgba = image.convert('RGBA')
+    if len(table) == 0:
+        return rgba
+    if numpy is not None:
+        pixels = numpy.array(rgba)
+        rgb = pixels[..., :3].astype(numpy.uint32)
+        keys = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+        old = numpy.array([(r << 16) | (g << 8) | b for ((r, g, b), _) in table], dtype=numpy.uint32)
+        new = numpy.array([c for (_, c) in table], dtype=numpy.uint8)
+        index = numpy.minimum(numpy.searchsorted(old, keys), len(old) - 1)
+        found = old[index] == keys
+        pixels[..., :3][found] = new[index[found]]
+        return Image.fromarray(pixels, 'RGBA')
+
+    # Without NumPy, each old color is picked out with Pillow's channel operations. All the masks are made before any
+    # color is replaced, so a color that was just replaced is not replaced again.
+    channels = rgba.split()
+    masks = []
+    for luts in _recolor_masks(table):
+        (r, g, b) = (ch.point(lut) for (ch, lut) in zip(channels, luts))
+        masks.append(ImageChops.multiply(ImageChops.multiply(r, g), b))
+    recolored = rgba.convert('RGB')
+    for (mask, (_, new)) in zip(masks, table):
+        recolored.paste(new, mask=mask)
+    recolored.putalpha(channels[3])
+    return recolored
+
+
+class ExportTarget:
+    """
+    One place a tileset is exported to, and the rules for the files written there. A single export can write to several
+    targets; the tile images are cut out and encoded once, then written to each of them.
+    """
+
+    def get_export_name(self, tile):
+        """Get the name of a tile's exported files for this target, without the extension (e.g. block-1)."""
+        name_format = self.block_name if tile.data['tile_type'] == 'Block' else self.bgo_name
+        return name_format.format(tile.data['assigned_id'])
+
+    def get_image_names(self, export_name):
+        """Get the names of the image files exported for a tile: its PNG, or its GIF and mask for legacy exports."""
+        if self.gif:
+            return [export_name + '.gif', export_name + 'm.gif']
+        return [export_name + '.png']
+
+    def get_txt(self, tile, export_name):
+        """Get the contents of a tile's .txt file for this target."""
+        return tile.get_txt(self.txt_excluded, export_name, '.gif' if self.gif else '.png')
+
+    def get_tileset_files(self, blocks, bgos, settings):
+        """Create the PGE tileset files for this target. See get_tileset_files."""
+        return get_tileset_files(blocks, bgos, dict(settings, create_pge_tileset=self.create_pge_tileset))
+
+    def create_sink(self):
+        """
+        Create the sink the target's files are written to.
+        :rtype: DirectorySink | ZipSink | MemorySink
+        """
+        if self.dry_run:
+            return MemorySink(self.path)
+        if self.zip:
+            return ZipSink(self.path, self.zip_store_images)
+        return DirectorySink(self.path)
+
+    def __init__(self, name, path, scale, *, variant=None, zip=False, zip_store_images=True, gif=False,
+                 create_pge_tileset=True, txt_excluded=frozenset(), block_name='block-{}', bgo_name='background-{}',
+                 dry_run=False):
+        """
+        CONSTRUCTOR
+        :param name: The name of the target, such as the game it is for.
+        :param path: The directory or .zip file to export to.
+        :param scale: The pixel scale to export the tile images at.
+        :param variant: The palette variant to recolor the tile images with, if any.
+        :type variant: PaletteVariant | None
+        :param zip: If True, <path> is a .zip archive.
+        :param zip_store_images: If True, PNGs are stored in the .zip archive without compression.
+        :param gif: If True, tile images are exported as legacy GIF sprites with masks instead of PNGs.
+        :param create_pge_tileset: If True, PGE tileset files are created.
+        :param txt_excluded: Fields to leave out of the tiles' .txt files.
+        :param block_name: The name of blocks' files, without the extension. {} is replaced with the ID.
+        :param bgo_name: The name of BGOs' files, without the extension. {} is replaced with the ID.
+        :param dry_run: If True, files are kept in memory instead of being written.
+        """
+        self.name = name
+        self.path = path
+        self.scale = scale
+        self.variant = variant
+        self.zip = zip
+        self.zip_store_images = zip_store_images
+        self.gif = gif
+        self.create_pge_tileset = create_pge_tileset
+        self.txt_excluded = frozenset(txt_excluded)
+        self.block_name = block_name
+        self.bgo_name = bgo_name
+        self.dry_run = dry_run
+
+        # Set by write_tileset while exporting
+        self.sink = None
+        self.manifest = None
+        self.writer = None
+
+
+# The export targets that can be chosen, and how they differ from a plain SMBX2 export.
+export_target_presets = {
+    'SMBX2': {},
+    # TheXTech has no lighting engine, so the light settings would only be dead weight in its .txt files.
+    'TheXTech': {'txt_excluded': frozenset(light_settings + ['no_shadows'])},
+}
+
+
+def parse_export_targets(value):
+    """
+    Check the export targets configured in a tileset's .tileset.json file (its export_targets list), and fill in their
+    defaults. Each target is an object with these keys, of which only name is required:
+        name: The name of the target, used by --target and in export reports.
+        preset: The entry of export_target_presets it starts from. Defaults to <name> if that is a preset, else SMBX2.
+        path: The directory or .zip file to export to, relative to the tileset image. Defaults to the usual one, with
+            the target's name added for all but the first target.
+        block_name, bgo_name: The name of blocks' and BGOs' files, without the extension. {} is replaced with the ID.
+        txt_excluded: More fields to leave out of the tiles' .txt files, on top of the preset's.
+        create_pge_tileset: Whether to create PGE tileset files. Defaults to the tileset's setting.
+    :param value: The export_targets list, or None.
+    :return: A dict of the targets by name, in order. Each has every key above; path and create_pge_tileset are None
+    when they were not given.
+    :raises ExportError: If a target is not valid.
+    """
+    if value is None:
+        return {}
+    if not isinstance(value, list):
+        raise ExportError('export_targets must be a list.')
+    targets = {}
+    for (i, entry) in enumerate(value):
+        name = entry.get('name') if isinstance(entry, dict) else None
+        if not isinstance(name, str) or not name.strip():
+            raise ExportError(f'Export target {i + 1} has no name.')
+        if name in targets:
+            raise ExportError(f"There is more than one export target named '{name}'.")
+        unknown = set(entry) - {'name', 'preset', 'path', 'block_name', 'bgo_name', 'txt_excluded',
+                                'create_pge_tileset'}
+        if unknown:
+            raise ExportError(f"Export target '{name}' has unknown keys: {', '.join(sorted(unknown))}.")
+        preset = entry.get('preset', name if name in export_target_presets else 'SMBX2')
+        if preset not in export_target_presets:
+            raise ExportError(f"Export target '{name}' has an unknown preset '{preset}'.")
+        target = {'name': name, 'preset': preset, 'path': entry.get('path'), 'block_name': 'block-{}',
+                  'bgo_name': 'background-{}', 'create_pge_tileset': entry.get('create_pge_tileset')}
+        if target['path'] is not None and (not isinstance(target['path'], str) or not target['path'].strip()):
+            raise ExportError(f"Export target '{name}' has a bad path.")
+        for k in ('block_name', 'bgo_name'):
+            name_format = entry.get(k, target[k])
+            if not isinstance(name_format, str) or regex.fullmatch(r'[^{}/\\]*\{\}[^{}/\\]*', name_format) is None:
+                raise ExportError(f"Export target '{name}' has a bad {k}. It needs {{}} where the ID goes.")
+            target[k] = name_format
+        if target['create_pge_tileset'] is not None and not isinstance(target['create_pge_tileset'], bool):
+            raise ExportError(f"Export target '{name}' has a bad create_pge_tileset. It must be true or false.")
+        txt_excluded = entry.get('txt_excluded', [])
+        if not isinstance(txt_excluded, list) or not all(isinstance(k, str) for k in txt_excluded):
+            raise ExportError(f"Export target '{name}' has a bad txt_excluded. It must be a list of field names.")
+        target['txt_excluded'] = export_target_presets[preset].get('txt_excluded', frozenset()) | set(txt_excluded)
+        targets[name] = target
+    return targets
+
+
+def get_export_target(sheet_path, settings, export_path=None):
+    """
+    Get the directory or .zip file a tileset is exported to.
+    :param sheet_path: The path of the tileset image.
+    :param settings: The tileset settings. Determines whether to export to a directory or a .zip archive.
+    :param export_path: The directory or .zip file to export to, if not the default one named after the tileset image.
+    """
+    if export_path:
+        return export_path
+    return get_export_path(sheet_path) + ('.zip' if settings['export_zip'] else '')
+
+
+def get_export_scales(settings):
+    """Get the pixel scales a tileset is exported at. This is just the pixel scale, unless export scales are set."""
+    return list(parse_scale_list(settings['export_scales']) or [int(settings['pixel_scale'])])
+
+
+def get_export_targets(sheet_path, settings, export_path=None, target_names=None, dry_run=False):
+    """
+    Create the targets a tileset is exported to. There is one for each palette variant, game and export scale.
+    :param sheet_path: The path of the tileset image.
+    :param settings: The tileset settings. If export_targets is set, its targets are the ones that can be chosen (see
+    parse_export_targets); otherwise those in export_target_presets are.
+    :param export_path: The directory or .zip file to export the first target to. Defaults to its configured path, or
+    one named after the tileset image. Other targets without a configured path are exported next to it, with the
+    variant's and target's name added (e.g. tiles-night, tiles-thextech). When exporting at more than one scale, each
+    scale is exported into its own subdirectory (e.g. tiles/2x), or its own .zip archive (e.g. tiles-2x.zip).
+    :param target_names: The names of the targets to export to. Defaults to every configured target, or SMBX2, plus
+    TheXTech if the tileset is set to export for it.
+    :param dry_run: If True, the targets keep their files in memory.
+    :rtype: list[ExportTarget]
+    :raises ExportError: If a target name is unknown, a configured target is not valid, or the palette variants cannot
+    be loaded.
+    """
+    configured = parse_export_targets(settings.get('export_targets'))
+    if target_names is None:
+        if configured:
+            target_names = list(configured)
+        else:
+            target_names = ['SMBX2'] + (['TheXTech'] if settings['export_thextech'] else [])
+    path = get_export_target(sheet_path, settings, export_path)
+    (base, ext) = os.path.splitext(path) if settings['export_zip'] else (path, '')
+
+    definitions = []
+    for name in target_names:
+        if configured:
+            if name not in configured:
+                raise ExportError(f"Unknown export target '{name}'. This tileset's targets are: "
+                                  f"{', '.join(configured)}.")
+            definitions.append(configured[name])
+        elif name in export_target_presets:
+            definitions.append({'name': name, 'preset': name, 'path': None, 'create_pge_tileset': None,
+                                **export_target_presets[name]})
+        else:
+            raise ExportError(f"Unknown export target '{name}'.")
+
+    scales = get_export_scales(settings)
+    variants = [None] + (load_palette_variants(sheet_path) if settings['export_variants'] else [])
+    sheet_dir = os.path.dirname(os.path.abspath(sheet_path))
+    targets = []
+    for variant in variants:
+        variant_base = base if variant is None else f'{base}-{variant.name}'
+        for (i, definition) in enumerate(definitions):
+            name = definition['name']
+            if definition['path'] is not None and not (i == 0 and export_path):
+                target_path = os.path.join(sheet_dir, definition['path'])
+                zip = target_path.lower().endswith('.zip')
+                (target_base, target_ext) = os.path.splitext(target_path) if zip else (target_path, '')
+                if variant is not None:
+                    target_base += f'-{variant.name}'
+            else:
+                (zip, target_ext) = (settings['export_zip'], ext)
+                target_base = variant_base if i == 0 else f'{variant_base}-{name.lower()}'
+            create_pge_tileset = definition['create_pge_tileset']
+            if create_pge_tileset is None:
+                create_pge_tileset = settings['create_pge_tileset']
+            options = {k: definition[k] for k in ('txt_excluded', 'block_name', 'bgo_name') if k in definition}
+            for scale in scales:
+                target_name = name if variant is None else f'{name} {variant.name}'
+                target_path = target_base + target_ext
+                if len(scales) > 1:
+                    target_name += f' {scale}x'
+                    target_path = f'{target_base}-{scale}x{target_ext}' if target_ext \
+                        else os.path.join(target_base, f'{scale}x')
+                targets.append(ExportTarget(target_name, target_path, scale, variant=variant, zip=zip,
+                                            zip_store_images=settings['zip_store_images'], gif=settings['export_gif'],
+                                            create_pge_tileset=create_pge_tileset, dry_run=dry_run, **options))
+    return targets
+
+
+def _tile_images(sheet, tiles, profile, upscaler, targets, report, crop=None):
+    """
+    The crop stage of the export pipeline. Queues the .txt files of each tile that changed since the last export.
+    :param crop: Called with a tile to cut its image out of <sheet>. Defaults to the tile's get_source_image.
+    :return: A generator of (wanted, tile_image) for each tile. wanted is a list of (target, export_name) for each
+    target the tile's image has to be written to; it is empty if the image has not changed since the last export, or
+    could not be cut out. The tile images are not scaled yet.
+    """
+    for t in tiles:
+        names = []
+        for target in targets:
+            name = target.get_export_name(t)
+            txt = target.get_txt(t, name)
+            if target.manifest.needs_update(name + '.txt', get_digest(txt)):
+                target.writer.write(name + '.txt', txt)
+            names.append(name)
+        try:
+            tile_image = t.get_source_image(sheet) if crop is None else crop(t)
+        except (OSError, ValueError) as e:
+            report.add_error(targets[0].get_image_names(names[0])[0], str(e))
+            for (target, name) in zip(targets, names):
+                for image_name in target.get_image_names(name):
+                    target.manifest.skip(image_name)
+            yield [], None
+            continue
+
+        digests = {}  # The image only has to be hashed once for each way it is encoded, not for each target
+        wanted = []
+        for (target, name) in zip(targets, names):
+            if (key := (target.scale, target.gif, target.variant)) not in digests:
+                options = f'scale={target.scale} ' + ('format=gif' if target.gif else f'profile={profile}')
+                if upscaler != 'Nearest':
+                    options += f' upscaler={upscaler}'
+                if target.variant is not None:
+                    options += f' variant={target.variant.digest}'
+                digests[key] = get_image_digest(tile_image, options)
+            # A GIF and its mask are always written together. Every name is passed to the manifest, so no short-circuit.
+            if any([target.manifest.needs_update(n, digests[key]) for n in target.get_image_names(name)]):
+                wanted.append((target, name))
+        yield wanted, tile_image
+
+
+def export_tiles(sheet, tiles, profile, targets, report, workers=1, batch_size=16, progress=None, cancel=None,
+                 upscaler='Nearest', crop=None, pool=None):
+    """
+    Export the image and .txt file of each tile that changed since the last export. Each tile is cut out once, and its
+    image is encoded once for each scale, image format and palette variant it is exported in. Tiles whose image cannot
+    be cut out or encoded are added to the report's errors and skipped; the rest of the tiles are still exported.
+    :param sheet: The tileset image, as loaded by load_sheet.
+    :type sheet: PIL.Image.Image
+    :param tiles: The tiles to export. IDs must already be assigned.
+    :param profile: The PNG profile to encode images with.
+    :param targets: The targets to export to. Their sinks, manifests and writers must be set up.
+    :type targets: list[ExportTarget]
+    :param report: The report of the export.
+    :type report: ExportReport
+    :param workers: The number of processes to encode images with.
+    :param batch_size: The number of images sent to a worker at once. Small tiles encode so quickly that sending them
+    one at a time would cost more than encoding them.
+    :param progress: Called with (tiles_done, tile_count) as tiles are exported. It is called from the thread running
+    the export.
+    :param cancel: If this event is set, the export stops as soon as possible.
+    :type cancel: threading.Event
+    :param upscaler: How to scale the images up. One of upscalers.
+    :param crop: Called with a tile to cut its image out of <sheet>. Defaults to the tile's get_source_image. The export
+    daemon passes one that caches the tile images between exports.
+    :param pool: A process pool to encode images with, instead of starting one for this export. It is left running.
+    :type pool: concurrent.futures.ProcessPoolExecutor
+    :raises ExportCancelled: If <cancel> was set.
+    """
+    shared_pool = pool
+    pool = None
+    pending = deque()
+    batch = []
+    tiles_done = 0
+
+    def tiles_finished(count):
+        nonlocal tiles_done
+        tiles_done += count
+        if progress is not None:
+            progress(tiles_done, len(tiles))
+
+    def write_batch(tile_count, wanted, result):
+        (encoded, errors, seconds) = result
+        report.add_encoded([f for files in encoded if files is not None for f in files], seconds)
+        for (i, message) in errors:
+            (target, name) = wanted[i][0]
+            report.add_error(target.get_image_names(name)[0], message)
+            for (target, name) in wanted[i]:
+                for image_name in target.get_image_names(name):
+                    target.manifest.skip(image_name)
+        for (job_wanted, files) in zip(wanted, encoded):
+            if files is not None:
+                for (target, name) in job_wanted:
+                    for (image_name, contents) in zip(target.get_image_names(name), files):
+                        target.writer.write(image_name, contents)
+        tiles_finished(tile_count)
+
+    def submit_batch():
+        nonlocal pool
+        # One encoding job for each scale, format and palette variant each tile is wanted in. Targets that match share
+        # the files. Variants are recolored in the workers, from the tile image that was already cut out.
+        jobs = []
+        wanted = []
+        for (tile_wanted, tile_image) in batch:
+            by_format = {}
+            for (target, name) in tile_wanted:
+                by_format.setdefault((target.scale, target.gif, target.variant), []).append((target, name))
+            for ((scale, gif, variant), job_wanted) in by_format.items():
+                jobs.append((tile_image, scale, gif, variant.table if variant is not None else None))
+                wanted.append(job_wanted)
+
+        if pool is None and workers > 1 and len(batch) == batch_size:
+            # Only worth using the worker processes if there is more than a handful of images to encode.
+            pool = shared_pool if shared_pool is not None else ProcessPoolExecutor(workers)
+        if pool is None:
+            write_batch(len(batch), wanted, encode_image_batch(jobs, profile, upscaler))
+            return
+
+        pending.append((len(batch), wanted, pool.submit(encode_image_batch, jobs, profile, upscaler)))
+        # Only a few batches per worker are in flight at a time, so memory use stays flat on big tilesets.
+        if len(pending) >= workers * 2:
+            (tile_count, wanted, future) = pending.popleft()
+            write_batch(tile_count, wanted, future.result())
+
+    try:
+        for (tile_wanted, tile_image) in _tile_images(sheet, tiles, profile, upscaler, targets, report, crop):
+            if cancel is not None and cancel.is_set():
+                raise ExportCancelled('The export was cancelled.')
+            if len(tile_wanted) == 0:
+                tiles_finished(1)
+                continue
+            batch.append((tile_wanted, tile_image))
+            if len(batch) == batch_size:
+                submit_batch()
+                batch = []
+        if batch:
+            submit_batch()
+        while pending:
+            if cancel is not None and cancel.is_set():
+                raise ExportCancelled('The export was cancelled.')
+            (tile_count, wanted, future) = pending.popleft()
+            write_batch(tile_count, wanted, future.result())
+    finally:
+        if pool is not None and pool is not shared_pool:
+            pool.shutdown(cancel_futures=True)
+        else:
+            for (_, _, future) in pending:
+                future.cancel()
+
+
+def write_tileset(sheet_path, blocks, bgos, settings, export_path=None, workers=1, full=False, progress=None,
+                  cancel=None, targets=None, cache=None, pool=None):
+    """
+    Write the image and .txt file of every tile, plus the PGE tileset files, to each export target. IDs must already be
+    assigned. When exporting to a directory, only files that changed since the last export to it are written. If the
+    export stops early, each export directory is left with a manifest that matches the files in it, and existing .zip
+    archives are left unchanged.
+    :param sheet_path: The path of the tileset image.
+    :param blocks: The tileset's blocks.
+    :param bgos: The tileset's BGOs.
+    :param settings: The tileset settings.
+    :param export_path: The directory or .zip file to export to. Defaults to one named after the tileset image.
+    :param workers: The number of processes to encode images with.
+    :param full: If True, write every file, even those that have not changed.
+    :param progress: Called with (tiles_done, tile_count) as tiles are exported. See export_tiles.
+    :param cancel: If this event is set, the export stops as soon as possible.
+    :type cancel: threading.Event
+    :param targets: The targets to export to. Defaults to those get_export_targets() creates from the settings.
+    :type targets: list[ExportTarget]
+    :param cache: Keeps the tileset image and tile images between exports, instead of load_sheet's small cache.
+    :type cache: daemon.ExportCache
+    :param pool: A process pool to encode images with. See export_tiles.
+    :type pool: concurrent.futures.ProcessPoolExecutor
+    :return: A report of the export.
+    :rtype: ExportReport
+    :raises ExportCancelled: If <cancel> was set.
+    """
+    if targets is None:
+        targets = get_export_targets(sheet_path, settings, export_path)
+    # The PNG profile does not matter if only GIFs are exported.
+    png_profile = settings['png_profile'] if not all(t.gif for t in targets) else None
+    report = ExportReport(len(blocks), len(bgos), png_profile, [t.name for t in targets])
+
+    opened = []  # The targets whose sink was created. If one cannot be created, only these are cleaned up.
+    try:
+        try:
+            for target in targets:
+                target.sink = target.create_sink()
+                target.writer = None
+                opened.append(target)
+                target.manifest = ExportManifest(target.sink.path if target.sink.incremental else None, report, full)
+                target.writer = FileWriter(target.sink)
+
+            if cache is not None:
+                (sheet, crop) = cache.open_sheet(sheet_path, settings['color_key'])
+            else:
+                (sheet, crop) = (load_sheet(sheet_path, settings['color_key']), None)
+            export_tiles(sheet, list(blocks) + list(bgos), settings['png_profile'], targets, report, workers,
+                         progress=progress, cancel=cancel, upscaler=settings['upscaler'], crop=crop, pool=pool)
+
+            # Generate PGE tileset files and the sizables library
+            sizables_script = get_sizables_script(blocks, settings)
+            for target in targets:
+                files = target.get_tileset_files(blocks, bgos, settings)
+                for (name, contents) in files + ([sizables_script] if sizables_script is not None else []):
+                    if target.manifest.needs_update(name, get_digest(contents)):
+                        target.writer.write(name, contents)
+        finally:
+            # Every writer has to finish, even if one of them failed.
+            errors = []
+            for target in opened:
+                if target.writer is None:
+                    continue
+                try:
+                    target.writer.close()
+                except OSError as e:
+                    errors.append(e)
+            if errors:
+                raise errors[0]
+    except BaseException:
+        for target in opened:
+            target.sink.discard()
+            if target.writer is not None:
+                target.manifest.save(target.writer.written)
+        raise
+
+    for target in targets:
+        target.sink.close()
+        target.manifest.remove_orphans()
+        target.manifest.save()
+    return report
+
+
+def prepare_sheet(sheet_path, overrides=None):
+    """
+    Load a tileset, check it, and assign IDs to its tiles, as the first steps of an export.
+    :param sheet_path: The path of the tileset image.
+    :param overrides: Tileset settings to use instead of the saved ones.
+    :return: (settings, tiles, file_data, blocks, bgos, warnings). See load_tileset and assign_tileset_ids. warnings
+    describes each tileset in the episode that could not be read, and each tile whose ID is already used elsewhere in
+    the episode.
+    :raises ExportError: If the tileset has bad settings or not enough IDs.
+    """
+    settings, tiles, file_data = load_tileset(sheet_path)
+    settings.update(overrides or {})
+    check_tileset(settings, tiles)
+    episode_ids = get_episode_ids(sheet_path, settings)
+    warnings = []
+    if episode_ids is not None:
+        warnings = get_unread_tilesets(episode_ids) + find_episode_collisions(tiles, episode_ids)
+    blocks, bgos = assign_tileset_ids(tiles, settings, episode_ids)
+    return settings, tiles, file_data, blocks, bgos, warnings
+
+
+def export_sheet(sheet_path, export_path=None, workers=1, full=False, overrides=None, target_names=None, cache=None,
+                 pool=None):
+    """
+    Export a tileset using the settings saved in its .tileset.json file. IDs assigned during the export are saved back
+    to the .tileset.json file, just like an export from the editor.
+    :param sheet_path: The path of the tileset image.
+    :param export_path: The directory or .zip file to export to. Defaults to one named after the tileset image.
+    :param workers: The number of processes to encode images with.
+    :param full: If True, write every file, even those that have not changed since the last export.
+    :param overrides: Tileset settings to use instead of the saved ones. These are not saved.
+    :param target_names: The export targets to write. See get_export_targets.
+    :param cache: Keeps images between exports. See write_tileset.
+    :param pool: A process pool to encode images with. See export_tiles.
+    :return: A report of the export.
+    :rtype: ExportReport
+    :raises ExportError: If the tileset has bad settings or not enough IDs.
+    """
+    settings, tiles, file_data, blocks, bgos, warnings = prepare_sheet(sheet_path, overrides)
+    targets = get_export_targets(sheet_path, settings, export_path, target_names)
+    report = write_tileset(sheet_path, blocks, bgos, settings, workers=workers, full=full, targets=targets,
+                           cache=cache, pool=pool)
+    # Only saved once the tiles were written, so the IDs of tiles that were never exported can be assigned again.
+    save_assigned_ids(sheet_path, tiles, file_data)
+    report.warnings.extend(warnings)
+    return report
+
+
+# -------------------------------
+# Dry Runs
+# -------------------------------
+
+
+class DryRunReport:
+    """
+    What an export would write, and how that differs from what is already there. Nothing is written to make one, not
+    even the IDs assigned to the tiles.
+    """
+
+    def summary(self):
+        """Describe the dry run in a sentence or two."""
+        text = f'Would export {self.report.block_count} blocks and {self.report.bgo_count} BGOs ' \
+               f'({len(self.files)} files, {format_size(sum(self.files.values()))}). ' \
+               f'{len(self.added)} added, {len(self.changed)} changed, {len(self.unchanged)} unchanged, ' \
+               f'{len(self.removed)} removed.'
+        if len(self.new_ids) > 0:
+            text += f' {len(self.new_ids)} tiles would be assigned new IDs.'
+        if len(self.report.errors) > 0:
+            text += f' {len(self.report.errors)} files could not be exported.'
+        if len(self.report.warnings) > 0:
+            text += f' {len(self.report.warnings)} warnings about IDs used elsewhere in the episode.'
+        return text
+
+    def __init__(self, report):
+        """
+        CONSTRUCTOR
+        :param report: The report of the export, as if it had been written.
+        :type report: ExportReport
+        """
+        self.report = report
+        # The size of each file, by name. When there are several export targets, names start with the target's name
+        # (e.g. TheXTech/block-1.txt).
+        self.files = {}
+        self.ids = {}  # The ID of each tile, by the tile's export name (e.g. block-1)
+        self.new_ids = []  # The export names of the tiles that would be assigned an ID from the pools by this export
+        self.added = []
+        self.changed = []
+        self.unchanged = []
+        self.removed = []
+        self.diffs = {}  # A unified diff of each changed text file, by name
+
+
+def _read_existing_export(export_path):
+    """
+    Read what the last export left at <export_path>.
+    :return: (read, names), where read(name) returns the contents of an exported file as bytes (or None if it does not
+    exist), and names are the files the next export would replace or remove.
+    """
+    if export_path.endswith('.zip'):
+        existing = {}
+        if os.path.exists(export_path):
+            with zipfile.ZipFile(export_path) as z:
+                existing = {name: z.read(name) for name in z.namelist()}
+        return existing.get, set(existing)
+
+    def read(name):
+        try:
+            with open(os.path.join(export_path, name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    return read, set(ExportManifest.load(export_path))
+
+
+def compare_export(files, export_path, dry_run_report, prefix=''):
+    """
+    Compare the files of an export with those already at <export_path>, and add the differences to a dry run report.
+    :param files: The contents of each exported file, by name. bytes for binary files or str for text files.
+    :param export_path: The directory or .zip file the files would be written to.
+    :type dry_run_report: DryRunReport
+    :param prefix: Put in front of each file name in the report.
+    """
+    (read, old_names) = _read_existing_export(export_path)
+    for (name, contents) in files.items():
+        dry_run_report.files[prefix + name] = len(contents.encode() if isinstance(contents, str) else contents)
+        old = read(name)
+        if old is None:
+            dry_run_report.added.append(prefix + name)
+            continue
+        if isinstance(contents, str):
+            # Text files may have been written with Windows line endings.
+            old = old.decode(errors='replace').replace('\r\n', '\n')
+        if old == contents:
+            dry_run_report.unchanged.append(prefix + name)
+            continue
+        dry_run_report.changed.append(prefix + name)
+        if isinstance(contents, str):
+            dry_run_report.diffs[prefix + name] = list(difflib.unified_diff(old.splitlines(keepends=True),
+                                                                            contents.splitlines(keepends=True),
+                                                                            f'a/{prefix}{name}', f'b/{prefix}{name}'))
+    dry_run_report.removed += sorted(prefix + name for name in old_names
+                                    if name not in files and read(name) is not None)
+
+
+def dry_run_sheet(sheet_path, export_path=None, workers=1, overrides=None, target_names=None):
+    """
+    Export a tileset into memory, then compare the result with what is already at the export path. Everything is done
+    as in a real export, including encoding the tile images, but nothing is written to disk.
+    :param sheet_path: The path of the tileset image.
+    :param export_path: The directory or .zip file to compare with. Defaults to the one the tileset exports to.
+    :param workers: The number of processes to encode images with.
+    :param overrides: Tileset settings to use instead of the saved ones.
+    :param target_names: The export targets to write. See get_export_targets.
+    :rtype: DryRunReport
+    :raises ExportError: If the tileset has bad settings or not enough IDs.
+    """
+    settings, tiles, file_data, blocks, bgos, warnings = prepare_sheet(sheet_path, overrides)
+    targets = get_export_targets(sheet_path, settings, export_path, target_names, dry_run=True)
+    report = write_tileset(sheet_path, blocks, bgos, settings, workers=workers, targets=targets)
+    report.warnings.extend(warnings)
+
+    dry_run_report = DryRunReport(report)
+    for (td, t) in zip(file_data.get('tiles', []), tiles):
+        dry_run_report.ids[t.get_export_name()] = t.data['assigned_id']
+        if 'assigned_id' not in td and t.data['tile_id'] == '':  # Tiles with a Tile ID keep it, not a new ID
+            dry_run_report.new_ids.append(t.get_export_name())
+    for target in targets:
+        compare_export(target.sink.files, target.path, dry_run_report, f'{target.name}/' if len(targets) > 1 else '')
+    return dry_run_report
+
+
+def benchmark_profiles(sheet_path, workers=1, batch_size=16):
+    """
+    Encode every tile of a tileset with each PNG profile, without writing anything, to compare their speed and size.
+    :param sheet_path: The path of the tileset image.
+    :param workers: The number of processes to encode images with.
+    :param batch_size: The number of images sent to a worker at once.
+    :return: A report for each profile, in the order of png_profiles.
+    :rtype: list[ExportReport]
+    :raises ExportError: If the tileset has bad settings.
+    """
+    settings, tiles, _ = load_tileset(sheet_path)
+    check_tileset(settings, tiles)
+    scale = int(settings['pixel_scale'])
+    sheet = load_sheet(sheet_path, settings['color_key'])
+    images = [t.get_source_image(sheet) for t in tiles]
+    batches = [[(image, scale, False, None) for image in images[i:i + batch_size]]
+               for i in range(0, len(images), batch_size)]
+    block_count = sum(1 for t in tiles if t.data['tile_type'] == 'Block')
+
+    reports = []
+    pool = ProcessPoolExecutor(workers) if workers > 1 and len(batches) > 1 else None
+    try:
+        for profile in png_profiles:
+            report = ExportReport(block_count, len(tiles) - block_count, profile)
+            results = (pool.map if pool is not None else map)(encode_image_batch, batches, repeat(profile),
+                                                               repeat(settings['upscaler']))
+            for (encoded, _, seconds) in results:
+                report.add_encoded([files[0] for files in encoded if files is not None], seconds)
+            reports.append(report)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return reports
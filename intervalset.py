@@ -0,0 +1,154 @@
+"""
+Interval Set
+A set of integers stored as sorted, disjoint runs (e.g. 1-25 and 1001-1005), used for ID pools. Memory and the cost of
+every operation depend on the number of runs, not the number of IDs, so an ID list like '1-50000' is as cheap as '1'.
+"""
+import collections.abc
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+
+class IntervalSet(collections.abc.MutableSet):
+    """
+    A sorted set of integers. Runs are found with a binary search. IDs are iterated and popped in ascending order by
+    default, like the OrderedSet ID pools this replaces.
+
+    The runs are kept in two plain lists, so only lookups are O(log runs). Adding or removing an integer is O(log runs)
+    when it only moves the end of a run, but O(runs) when it adds, splits or removes a run, since the lists have to be
+    shifted; and the first select after any change is O(runs). ID pools have few runs, and the shifting is done by list
+    in C, so this is cheaper in practice than a balanced tree would be.
+    """
+
+    def add_range(self, lo, hi):
+        """Add every integer from <lo> to <hi>, inclusive. Runs that overlap or touch the new one are merged with it."""
+        if hi < lo:
+            return
+        starts = self._starts
+        ends = self._ends
+        # Runs i to j - 1 overlap or touch [lo, hi].
+        i = bisect_left(ends, lo - 1)
+        j = bisect_right(starts, hi + 1)
+        if i < j:
+            removed = sum(ends[k] - starts[k] + 1 for k in range(i, j))
+            lo = min(lo, starts[i])
+            hi = max(hi, ends[j - 1])
+        else:
+            removed = 0
+        starts[i:j] = [lo]
+        ends[i:j] = [hi]
+        self._len += hi - lo + 1 - removed
+        self._counts = None
+
+    def add(self, value):
+        self.add_range(value, value)
+
+    def discard(self, value):
+        """Remove an integer if it is in the set. O(runs) if that splits or removes a run, O(log runs) otherwise."""
+        i = bisect_right(self._starts, value) - 1
+        if i < 0 or value > self._ends[i]:
+            return
+        (lo, hi) = (self._starts[i], self._ends[i])
+        if lo == hi:
+            del self._starts[i]
+            del self._ends[i]
+        elif value == lo:
+            self._starts[i] = lo + 1
+        elif value == hi:
+            self._ends[i] = hi - 1
+        else:  # Split the run in two.
+            self._ends[i] = value - 1
+            self._starts.insert(i + 1, value + 1)
+            self._ends.insert(i + 1, hi)
+        self._len -= 1
+        self._counts = None
+
+    def pop(self, last=True):
+        """
+        Remove and return the highest integer in the set, or the lowest if <last> is False. O(log runs), except that
+        emptying the lowest run is O(runs).
+        :raises KeyError: If the set is empty.
+        """
+        if self._len == 0:
+            raise KeyError('set is empty')
+        value = self._ends[-1] if last else self._starts[0]
+        self.discard(value)
+        return value
+
+    def select(self, index, last=False):
+        """
+        Get the integer at <index> in the sorted set, counting from the lowest, or from the highest if <last> is True.
+        The run it is in is found with a binary search over the running totals of the run lengths, which are only
+        summed again after the set changes: O(runs) for the first select after a change, O(log runs) after that.
+        :raises IndexError: If the set has <index> or fewer integers.
+        """
+        if not 0 <= index < self._len:
+            raise IndexError('index out of range')
+        if last:
+            index = self._len - 1 - index
+        if self._counts is None:
+            self._counts = list(accumulate(hi - lo + 1 for (lo, hi) in zip(self._starts, self._ends)))
+        i = bisect_right(self._counts, index)
+        return self._starts[i] + index - (self._counts[i - 1] if i > 0 else 0)
+
+    def copy(self):
+        """Make a shallow copy of the set."""
+        other = IntervalSet()
+        other._starts = self._starts.copy()
+        other._ends = self._ends.copy()
+        other._len = self._len
+        return other
+
+    def end_range(self, last=True):
+        """
+        Get the highest run of the set, or the lowest if <last> is False, as (lo, hi).
+        :raises KeyError: If the set is empty.
+        """
+        if self._len == 0:
+            raise KeyError('set is empty')
+        i = -1 if last else 0
+        return self._starts[i], self._ends[i]
+
+    def ranges(self):
+        """Get the runs of the set, in ascending order, as a list of (lo, hi) with both ends included."""
+        return list(zip(self._starts, self._ends))
+
+    def __contains__(self, value):
+        i = bisect_right(self._starts, value) - 1
+        return i >= 0 and value <= self._ends[i]
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for (lo, hi) in zip(self._starts, self._ends):
+            yield from range(lo, hi + 1)
+
+    def __reversed__(self):
+        for (lo, hi) in zip(reversed(self._starts), reversed(self._ends)):
+            yield from range(hi, lo - 1, -1)
+
+    def __str__(self):
+        """Format the set as an ID list, such as '1-25;1001-1005'. parse_id_list reads it back."""
+        return ';'.join(str(lo) if lo == hi else f'{lo}-{hi}' for (lo, hi) in zip(self._starts, self._ends))
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.ranges()!r})'
+
+    def __eq__(self, other):
+        if isinstance(other, IntervalSet):
+            return self._starts == other._starts and self._ends == other._ends
+        return super().__eq__(other)
+
+    __hash__ = None  # Mutable, like set
+
+    def __init__(self, ranges=()):
+        """
+        CONSTRUCTOR
+        :param ranges: Runs to add, as (lo, hi) with both ends included. They do not have to be sorted.
+        """
+        self._starts = []
+        self._ends = []
+        self._len = 0
+        self._counts = None  # The running totals of the run lengths, for select. None until they are needed.
+        for (lo, hi) in ranges:
+            self.add_range(lo, hi)
@@ -40,15 +40,28 @@ Created by Sambo
 # - Added new non-special IDs to the default Avoid Special ID lists.
 # - Removed outdated information from the Sizable tooltip.
 
+import base64
+import io
+import multiprocessing
 import os
 import pathlib
+import queue
 import sys
+import threading
+
+if __name__ == '__main__':
+    # Needed for the export worker processes to start in frozen (PyInstaller) builds.
+    multiprocessing.freeze_support()
+
+if __name__ == '__main__' and len(sys.argv) > 1:
+    # Command line mode. This is dispatched before tkinter is imported, so it works on machines without a display.
+    from cli import main as cli_main
+    sys.exit(cli_main())
+
 import tkinter
 import traceback
 import webbrowser
-from functools import lru_cache
 
-from pathvalidate import sanitize_filename
 from datetime import datetime
 from tkinter import Tk, Menu, PhotoImage, Canvas, ttk, filedialog, messagebox, TclError, StringVar, BooleanVar
 from tkinter import NORMAL, DISABLED, NW, N, W, E, S, FALSE
@@ -56,55 +69,27 @@ from tkinter import NORMAL, DISABLED, NW, N, W, E, S, FALSE
 if sys.platform != "win32":
     from tkinter import tix
 from os import path
-from collections import deque
 import json
 
-import PIL.Image
 import regex as regex
 from PIL import Image, ImageTk
 
-from orderedset import OrderedSet
+from episode import describe_usage, get_level_usage, remap_levels
+from exporter import ExportError, ExportCancelled, IDPreview, assign_tileset_ids, write_tileset, resolve_worker_count, \
+    get_episode_ids, get_episode_path, find_episode_collisions, get_id_mapping, get_unread_tilesets, \
+    parse_export_targets
 from tooltip import CreateToolTip, MenuTooltip
 from widgets import ColorSelector, VerifiedWidget
 from tile import Tile
-
-MAX_BLOCK_ID = 1393
-MAX_BGO_ID = 377
-MAX_NPC_ID = 723
+from tiledata import MAX_BLOCK_ID, MAX_BGO_ID, MAX_NPC_ID, data_defaults, tileset_fields, png_profiles, upscalers, \
+    get_id_list_preset, parse_id_list, parse_scale_list, verify_grid_dimension, parse_grid_size, good_tile_id, \
+    good_content_id, good_color_key, load_sheet, id_allocations
 
 SELECTOR_BD = 3
 
 CANVAS_W = 400
 CANVAS_H = 300
 
-MIN_GRID_DIM = 8
-MAX_GRID_DIM = 128
-
-data_defaults = {
-
-    # View
-
-    'grid_size': '16',
-    'grid_offset_x': '0',
-    'grid_offset_y': '0',
-    'grid_padding': '0',
-    'show_grid': True,
-    'highlight_color': '#ff0080',
-
-    # Export
-
-    'pixel_scale': '2',
-    'tileset_name': 'Imported Tileset',
-    'block_ids': 'Avoid Special',
-    'bgo_ids': 'Avoid Special',
-    'start_high': False,
-    'create_pge_tileset': True,
-    'mixed_pge_tileset': False,
-}
-
-tileset_fields = ['grid_size', 'grid_offset_x', 'grid_offset_y', 'grid_padding', 'show_grid', 'highlight_color',
-                  'pixel_scale', 'tileset_name', 'block_ids', 'bgo_ids', 'start_high', 'create_pge_tileset',
-                  'mixed_pge_tileset']
 tile_fields = ['tile_type', 'tile_id', 'frames', 'framespeed', 'light_source', 'lightoffsetx', 'lightoffsety',
                'lightradius', 'lightbrightness', 'lightcolor', 'lightflicker', 'priority', 'content_type', 'content_id',
                'playerfilter', 'npcfilter', 'collision_type', 'sizable', 'pswitchable', 'slippery', 'lava', 'bumpable',
@@ -113,25 +98,13 @@ tile_fields = ['tile_type', 'tile_id', 'frames', 'framespeed', 'light_source', '
 preference_defaults = {
     'max_canvas_width': '400',
     'max_canvas_height': '300',
+    'export_workers': '0',
 }
-preferences = ['max_canvas_width', 'max_canvas_height']
-
-built_in_id_lists = {
-    'Block': {
-        'Avoid Special': '1;3;6-25;27-29;38-54;56-59;61-87;91-108;113-114;116-168;182-191;194-223;227-266;270-279;'
-                         '284-370;372-403;407-419;421-427;432-456;488-525;527-597;599-619;630;635-638;1001-1005;'
-                         '1008-1072;1076-1101;1106-1132;1138-1141;1156-1267;1269-1270;1296-1305;1328-1329;1376-1377;'
-                         '1386-1393',
-        'User Slots': '751-1000',
-    },
-    'BGO': {
-        'Avoid Special': '1-10;14-34;36-59;62-69;75-86;89-91;93-97;99;101-103;106;108-133;147-159;161-173;187-190;232'
-                         '-279;281-303;304-326;328-353;367-377',
-        'User Slots': '751-1000',
-    }
-}
+preferences = ['max_canvas_width', 'max_canvas_height', 'export_workers']
 
 export_error_title = 'Unable to Export'
+EXPORT_POLL_MS = 50  # How often the window checks on a running export
+EPISODE_PATH_DELAY_MS = 500  # How long typing in the Episode Folder has to pause before the folder is read
 
 # -----------------------------------
 # Layout aides
@@ -195,6 +168,10 @@ class Window(Tk):
     def close_window(self):
         """Add a save prompt if attempting to close the window with unsaved changes."""
         if not self.unsaved_changes or self.save_prompt('exiting'):
+            if self.export_thread is not None:
+                # Let the export stop cleanly, so the export directory is not left half-written.
+                self.cancel_export()
+                self.export_thread.join()
             self.destroy()
 
     @staticmethod
@@ -320,12 +297,23 @@ class Window(Tk):
         w.grid(column=1, row=next_row(), sticky='nw')
         self.preference_fields.append(w)
 
+        export_frame = ttk.LabelFrame(preferences_dialog, text='Export Settings', padding='3 3 12 8')
+        export_frame.grid(column=0, row=1, padx=5, pady=5, sticky='nw')
+
+        w = VerifiedWidget(ttk.Spinbox, {'width': 6}, export_frame, label_text='Export Workers:', min_val=0, max_val=64,
+                           variable=self.preferences['export_workers_raw'], label_width=120,
+                           last_good_variable=self.preferences['export_workers'],
+                           tooltip='The number of processes used to encode tile images during export. More workers '
+                                   'make large exports faster. 0 uses one per CPU core. Must be between 0 and 64.')
+        w.grid(column=1, row=next_row(1), sticky='nw')
+        self.preference_fields.append(w)
+
         # Makes the preference fields show the correct values
         for k in preferences:
             self.preferences[k + '_raw'].set(self.preferences[k].get())
 
         button_frame = ttk.Frame(preferences_dialog)
-        button_frame.grid(column=0, row=1, sticky='ew')
+        button_frame.grid(column=0, row=2, sticky='ew')
         button_frame.columnconfigure(1, weight=1)
 
         ttk.Button(button_frame, text='OK', command=self.close_file_config).grid(column=1, row=1, sticky=E, padx=2,
@@ -358,11 +346,11 @@ class Window(Tk):
             self.grid_offset_y = None
             self.grid_padding = None
             self.tiles = []
+            self.level_usage = None
+            self._forget_cleared_ids()
 
             data = self.data
 
-            self.tileset_image = PhotoImage(file=filename)
-
             # Tileset data is stored in a .json file, with the same name as the tileset image, in the same directory as
             # the image
             json_path = filename.replace('.png', '.tileset.json')
@@ -371,6 +359,8 @@ class Window(Tk):
                     file_data = json.load(f)
             else:
                 file_data = {}
+            self.pending_remap = file_data.get('pending_remap')
+            self.export_targets = file_data.get('export_targets')
 
             self.freeze_redraw_traces = True  # Prevent trying to redraw while in the middle of loading tileset data
 
@@ -382,12 +372,17 @@ class Window(Tk):
                 if k in self.tileset_fields:
                     self.tileset_fields[k].check_variable()
 
+            # The image is loaded after the settings, so its color key is applied.
+            self.tileset_image = self._load_tileset_image(filename)
+
             # Load the tiles
             canvas = self.tileset_canvas
             if 'tiles' in file_data:
                 for td in file_data['tiles']:
                     self.tiles.append(Tile(canvas, outline=self.highlight_color.get(),
                                            width=SELECTOR_BD, scale=int(data['pixel_scale'].get()), **td))
+            self.id_preview.configure(self._get_id_settings(), self._get_episode_ids(filename))
+            self.id_preview.reset(self.tiles)
 
             # Load each tile into the UI once so its fields are checked.
             for i in range(len(self.tiles)):
@@ -403,6 +398,8 @@ class Window(Tk):
             self.scroll_y.grid()
 
             self.set_state_all_descendants(self.config_frame, NORMAL)  # Unlock tileset-global controls
+            self.update_create_pge_tileset()
+            self.update_export_zip()
             self.set_state_file_options(NORMAL)
 
             self._update_opened_filename(filename)
@@ -415,6 +412,8 @@ class Window(Tk):
             data['grid_padding'].set(data['last_good_grid_padding'].get())
             # This sets the dirty flag, so we need to clear it
             self._clear_file_dirty()
+            self.scan_levels()
+            self.show_id_preview()
 
         elif filename != '':
             self.warning_prompt('Unable to Open', f"Could not open file '{filename}' because it is not a .png")
@@ -445,6 +444,10 @@ class Window(Tk):
         for x in self.tiles:
             tile_save_data.append(x.get_save_ready_data())
         save_data['tiles'] = tile_save_data
+        if self.pending_remap is not None:  # Levels "main.py remap" still has to update. See get_pending_remap.
+            save_data['pending_remap'] = self.pending_remap
+        if self.export_targets is not None:  # Only set by editing the file. See parse_export_targets.
+            save_data['export_targets'] = self.export_targets
 
         json_filename = self.loaded_file.replace('.png', '.tileset.json')
         with open(json_filename, 'w') as f:
@@ -452,166 +455,234 @@ class Window(Tk):
 
         self._clear_file_dirty()
 
-    def _assign_ids(self, tiles, ids):
-        """
-        Assign IDs from <ids> to each Tile in <tiles> that does not have an ID assigned.
-        :param tiles: The tiles to which IDs are to be assigned.
-        :type tiles: deque
-        :param ids: The ID pool to use.
-        :type ids: OrderedSet
-        :return: True if there were enough IDs for all tiles, False otherwise.
-        """
-        start_high = self.data['start_high'].get()
-
-        next_id = ids.pop(start_high)
-        for v in tiles:
-            # False if the Tile had an ID assigned manually by the user.
-            if (assigned_id := v.assign_id(next_id)) == next_id:
-                if len(ids) == 0:
-                    return False
-                next_id = ids.pop(start_high)
-            ids.discard(assigned_id)  # Has no effect if the assigned ID is not in the ID pool.
-
-        return True
-
-    def _create_tileset_file(self, tiles, tile_type, export_path):
-        """Create a tileset file for PGE"""
-        if len(tiles) == 0:
-            return  # Don't create an empty tileset file.
-
-        grid_height = self._parse_grid_size(self.data['last_good_grid_size'].get())[0] \
-                      * int(self.data['last_good_pixel_scale'].get())
-        # Tileset type field doesn't appear to matter for mixed tilesets.
-        tile_type_int = 1 if tile_type in {'BGO', 'Mixed'} else 0
-        mixed = tile_type == 'Mixed'
-        tiles = sorted(tiles)
-
-        tileset_layout = {}
-        max_col = 0
-        for t in tiles:
-            row = int(t.canvas.coords(t.bounding_box)[1] // grid_height)
-            if row not in tileset_layout:
-                tileset_layout[row] = []
-            tileset_layout[row].append(t)
-            max_col = max(max_col, len(tileset_layout[row]))
-
-        tileset_name = f'{self.data["tileset_name"].get()}'
-        if not mixed:
-            tileset_name += f' ({tile_type}s)'
-        row_lookahead = 0
-        with open(f'{export_path}/{sanitize_filename(tileset_name)}.tileset.ini', 'w') as f:
-            f.write(f'[tileset]\n'
-                    f'rows={len(tileset_layout)}\n'
-                    f'cols={max_col}\n'
-                    f'name={tileset_name}\n'  # Make this configurable?
-                    f'type={tile_type_int}\n')
-            for row in range(len(tileset_layout)):
-                while row + row_lookahead not in tileset_layout:
-                    row_lookahead += 1
-                for col in range(len(tileset_layout[row + row_lookahead])):
-                    tile = tileset_layout[row + row_lookahead][col]
-                    f.write(f'\n'
-                            f'[item-{col}-{row}]\n'
-                            f'id={tile.data["assigned_id"]}\n')
-                    if mixed:
-                        f.write(f'type={1 if tile.data["tile_type"] == "BGO" else 0}\n')
-
     def file_export(self, *args):
         """Export the tileset."""
+        if self.export_thread is not None:
+            return  # Already exporting
         self.save_current_tile()
         data = self.data
+        settings = {k: data[k].get() for k in data_defaults}
+        settings['export_targets'] = self.export_targets
 
         # Verify tileset fields
-        block_ids = None
-        bgo_ids = None
         bad_tileset_field_count = 0
         for k in self.tileset_fields:
             if k == 'block_ids':
-                (success, block_ids) = self._parse_id_list(data['block_ids'].get(), 'Block')
-                bad_tileset_field_count += 0 if success else 1
+                bad_tileset_field_count += 0 if self._parse_id_list(settings['block_ids'], 'Block', True)[0] else 1
             elif k == 'bgo_ids':
-                (success, bgo_ids) = self._parse_id_list(data['bgo_ids'].get(), 'BGO')
-                bad_tileset_field_count += 0 if success else 1
+                bad_tileset_field_count += 0 if self._parse_id_list(settings['bgo_ids'], 'BGO', True)[0] else 1
             else:
                 bad_tileset_field_count += 0 if self.tileset_fields[k].good_input else 1
 
         # Verify Tile fields
         bad_tile_count = 0
+        duplicate_count = 0
         for v in self.tiles:
             bad_tile_count += 0 if v.bad_field_count == 0 else 1
+            duplicate_count += 1 if v.duplicate_id else 0
 
-        if bad_tileset_field_count > 0 or bad_tile_count > 0:
+        if bad_tileset_field_count > 0 or bad_tile_count > 0 or duplicate_count > 0:
             # There are some fields with bad values preventing the export
             error_msg = "Cannot export this tileset due to the following error(s) (indicated by ⚠):\n"
             if bad_tileset_field_count > 0:
                 error_msg += f"\n- {bad_tileset_field_count} invalid tileset settings."
             if bad_tile_count > 0:
                 error_msg += f"\n- {bad_tile_count} tiles with invalid settings."
+            if duplicate_count > 0:
+                error_msg += f"\n- {duplicate_count} tiles with the same ID as another tile."
             error_msg += "\n\nPlease resolve these errors, then try again."
             self.warning_prompt(export_error_title, error_msg)
             return
 
-        # Sort by type
-        blocks = deque()
-        bgos = deque()
-        for v in self.tiles:
-            if v.data['tile_type'] == 'Block':
-                if v.data['tile_id'] != '':
-                    # Tiles with user-assigned IDs should be processed before those without. This ensures that, if a
-                    # user-assigned ID is also in the IDs pool, it is consumed before it is automatically assigned to
-                    # another tile.
-                    blocks.appendleft(v)
-                else:
-                    blocks.append(v)
-            else:
-                if v.data['tile_id'] != '':
-                    bgos.appendleft(v)
-                else:
-                    bgos.append(v)
+        # Check the configured export targets, and the IDs used elsewhere in the episode
+        try:
+            parse_export_targets(self.export_targets)
+            episode_ids = get_episode_ids(self.loaded_file, settings)
+        except ExportError as e:
+            self.warning_prompt(export_error_title, str(e))
+            return
+        if episode_ids is not None:
+            self._release_cleared_ids(episode_ids)
+            self.id_preview.configure(self._get_id_settings(), episode_ids)
+            unread = get_unread_tilesets(episode_ids)
+            collisions = find_episode_collisions(self.tiles, episode_ids)
+            if len(unread) > 0 or len(collisions) > 0:
+                problems = unread + collisions
+                lines = [f'- {message}' for message in problems[:10]]
+                if len(problems) > 10:
+                    lines.append(f'- ...and {len(problems) - 10} more.')
+                intro = []
+                if len(unread) > 0:
+                    intro.append(f'{len(unread)} tilesets in the episode folder could not be fully read.')
+                if len(collisions) > 0:
+                    intro.append(f'{len(collisions)} tiles have IDs that are already used in the episode folder.')
+                if not messagebox.askyesno('ID Collisions', ' '.join(intro) + '\n\n' + '\n'.join(lines) +
+                                                            '\n\nExport anyway?', icon=messagebox.WARNING):
+                    return
 
         # Assign IDs
-        if not self._assign_ids(blocks, block_ids):  # Insufficient ID pool
-            self.warning_prompt(export_error_title, 'Cannot export: Not enough IDs to assign to blocks. Please '
-                                                    'add more IDs to the Block IDs pool, then try again.')
-            return
-        if not self._assign_ids(bgos, bgo_ids):
-            self.warning_prompt(export_error_title, 'Cannot export: Not enough IDs to assign to BGOs. Please '
-                                                    'add more IDs to the BGO IDs pool, then try again.')
+        try:
+            (blocks, bgos) = assign_tileset_ids(self.tiles, settings, episode_ids)
+        except ExportError as e:  # Insufficient ID pool
+            self.warning_prompt(export_error_title, str(e))
             return
+        finally:
+            self.id_preview.reset(self.tiles)  # Assigned IDs are no longer free
+            self.show_id_preview()
+
+        # Offer to update the levels that place the IDs tiles had before Clear Auto-Assigned IDs. The old IDs are kept
+        # until the levels are updated, so they can still be updated if the export fails or is cancelled.
+        mapping = get_id_mapping((t, tile_type, old_id) for (t, (tile_type, old_id)) in self.cleared_ids.items())
+        remap = None
+        moved = sum(len(m) for m in mapping.values())
+        if moved == 0:
+            self._forget_cleared_ids()
+        elif episode_ids is not None:
+            if self.levels_to_remap is None:
+                question = f'{moved} tiles were given new IDs. Update the levels in the episode folder that place ' \
+                           f'their old IDs?'
+            else:
+                question = f'{len(self.levels_to_remap)} levels could not be updated with the new IDs of {moved} ' \
+                           f'tiles last time. Try again?'
+            if messagebox.askyesno('Update Levels', question + '\n\nOnly .lvlx levels can be updated.'):
+                remap = (get_episode_path(self.loaded_file, settings), mapping, self.levels_to_remap)
+            else:
+                self._forget_cleared_ids()
 
         # Save the changes this process made to the file
         self.file_save()
 
-        # Export Tiles
-
-        # This little bit of sorcery replaces the last instance of '.png' with ''.
-        # Source:
-        # https://stackoverflow.com/questions/2556108/rreplace-how-to-replace-the-last-occurrence-of-an-expression-in
-        # -a-string
-        export_path = ''.join(self.loaded_file.rsplit('.png', 1))
-
-        os.makedirs(export_path, exist_ok=True)
-        image = self.tileset_image
-        with Image.open(self.loaded_file) as img:
-            img = img.resize((image.width(), image.height()), resample=PIL.Image.NEAREST)
-            for v in self.tiles:
-                v.export(img, export_path)
-
-        # Generate PGE tileset file
-
-        block_count = len(blocks)
-        bgo_count = len(bgos)
-
-        if data['create_pge_tileset'].get():
-            if data['mixed_pge_tileset'].get():
-                while len(bgos) > 0:
-                    blocks.append(bgos.popleft())
-                self._create_tileset_file(blocks, 'Mixed', export_path)
+        # Export Tiles and generate PGE tileset files. This runs on its own thread, so the window does not freeze. The
+        # thread gets a snapshot of the tiles, since Tiles can only be used from this thread, and may be edited while
+        # the export runs.
+        blocks = [t.snapshot() for t in blocks]
+        bgos = [t.snapshot() for t in bgos]
+        workers = resolve_worker_count(self.preferences['export_workers'].get())
+        self.export_messages = queue.Queue()
+        self.export_cancel = threading.Event()
+        self.export_thread = threading.Thread(target=self._run_export, daemon=True,
+                                              args=(self.loaded_file, blocks, bgos, settings, workers, remap))
+        self._open_export_dialog(len(blocks) + len(bgos))
+        self.export_thread.start()
+        self.after(EXPORT_POLL_MS, self._poll_export)
+
+    def _run_export(self, sheet_path, blocks, bgos, settings, workers, remap=None):
+        """
+        Export a tileset. This runs on the export thread, so it must not touch the window; everything it has to report
+        is put in self.export_messages, which _poll_export checks.
+        :param remap: (folder, mapping, levels) to change the IDs placed in the levels of a folder once the tileset is
+        exported. See episode.remap_levels.
+        """
+        messages = self.export_messages
+        try:
+            report = write_tileset(sheet_path, blocks, bgos, settings, workers=workers,
+                                   progress=lambda done, total: messages.put(('progress', done, total)),
+                                   cancel=self.export_cancel)
+            remap_report = None
+            remap_error = None
+            if remap is not None:
+                messages.put(('remapping',))
+                try:
+                    remap_report = remap_levels(remap[0], remap[1], workers, levels=remap[2])
+                except OSError as e:  # The tileset was still exported.
+                    remap_error = str(e)
+            messages.put(('done', report, remap_report, remap_error))
+        except ExportCancelled:
+            messages.put(('cancelled',))
+        except (ExportError, OSError) as e:
+            messages.put(('error', str(e)))
+        except BaseException:
+            messages.put(('crash', sys.exc_info()))
+
+    def _open_export_dialog(self, tile_count):
+        """Open the window that shows the progress of an export."""
+        export_dialog = tkinter.Toplevel(self)
+        export_dialog.title('Exporting')
+        export_dialog.resizable(False, False)
+        export_dialog.transient(self)
+        frame = ttk.Frame(export_dialog, padding='12 12 12 8')
+        frame.grid(column=0, row=0, sticky='news')
+
+        self.export_progress_label = ttk.Label(frame, text=f'Exporting 0 of {tile_count} tiles...')
+        self.export_progress_label.grid(column=1, row=next_row(1), sticky=W)
+        self.export_progress_bar = ttk.Progressbar(frame, length=300, mode='determinate', maximum=max(tile_count, 1))
+        self.export_progress_bar.grid(column=1, row=next_row(), sticky='ew', pady=5)
+        self.export_cancel_button = ttk.Button(frame, text='Cancel', command=self.cancel_export)
+        self.export_cancel_button.grid(column=1, row=next_row(), sticky=E)
+
+        # Closing the window cancels the export
+        export_dialog.protocol('WM_DELETE_WINDOW', self.cancel_export)
+        export_dialog.grab_set()  # Keep the tileset from being edited until the export is done
+
+        self.export_dialog = export_dialog
+
+    def cancel_export(self):
+        """Ask the running export to stop. Files that were already written are kept."""
+        self.export_cancel.set()
+        if self.export_dialog is not None:
+            self.export_progress_label.configure(text='Cancelling...')
+            self.export_cancel_button.configure(state=DISABLED)
+
+    def _poll_export(self):
+        """Show the progress of the running export, and the result once it is done."""
+        try:
+            while True:
+                message = self.export_messages.get_nowait()
+                if message[0] == 'remapping':
+                    self.export_progress_label.configure(text='Updating levels...')
+                    self.export_cancel_button.configure(state=DISABLED)
+                    continue
+                if message[0] != 'progress':
+                    self._finish_export(message)
+                    return
+                (_, done, total) = message
+                self.export_progress_bar.configure(value=done)
+                if not self.export_cancel.is_set():
+                    self.export_progress_label.configure(text=f'Exporting {done} of {total} tiles...')
+        except queue.Empty:
+            pass
+        self.after(EXPORT_POLL_MS, self._poll_export)
+
+    def _finish_export(self, message):
+        """Close the export progress window, then tell the user how the export went."""
+        self.export_thread.join()
+        self.export_thread = None
+        self.export_dialog.grab_release()
+        self.export_dialog.destroy()
+        self.export_dialog = None
+
+        result = message[0]
+        if result == 'done':
+            (report, remap_report, remap_error) = message[1:]
+            summary = report.summary()
+            errors = [f'- {name}: {error}' for (name, error) in report.errors]
+            if remap_report is not None:
+                summary += ' ' + remap_report.summary()
+                errors += [f'- {name}: {error}' for (name, error) in remap_report.errors.items()]
+                errors += [f'- {name}: Uses the old IDs, but legacy .lvl levels cannot be updated.'
+                           for name in remap_report.skipped]
+                if len(remap_report.errors) > 0:  # The next export offers to update just these levels
+                    self.levels_to_remap = set(remap_report.errors)
+                else:
+                    self._forget_cleared_ids()
+                self.scan_levels()
+            elif remap_error is not None:
+                summary += ' The levels could not be updated.'
+                errors.append(f'- {remap_error}')
+            if len(errors) > 0:
+                error_lines = errors[:10]
+                if len(errors) > 10:
+                    error_lines.append(f'- ...and {len(errors) - 10} more.')
+                self.warning_prompt('Exported With Errors', summary + '\n\n' + '\n'.join(error_lines))
             else:
-                self._create_tileset_file(blocks, 'Block', export_path)
-                self._create_tileset_file(bgos, 'BGO', export_path)
-
-        messagebox.showinfo('Done!', f'Successfully exported {block_count} blocks and {bgo_count} BGOs.')
+                messagebox.showinfo('Done!', summary)
+        elif result == 'cancelled':
+            messagebox.showinfo('Export Cancelled', 'The export was cancelled before it finished. Export again to '
+                                                    'finish it.')
+        elif result == 'error':
+            self.warning_prompt(export_error_title, message[1])
+        else:
+            self.crash_prompt(*message[1])
 
     def file_close(self, *args):
         """Close the file that is currently open. If there is unsaved data, ask the user if they would like to save
@@ -637,10 +708,20 @@ class Window(Tk):
 
         self._clear_file_dirty()
         self._update_opened_filename('')
+        self.level_usage = None
+        self._forget_cleared_ids()
+        self.pending_remap = None
+        self.export_targets = None
 
     def file_clear_ids(self):
+        self.save_current_tile()  # So the preview is reset with the current tile's type and tile ID
         for v in self.tiles:
+            if 'assigned_id' in v.data:  # Kept so the next export can offer to update the levels that place it
+                self.cleared_ids.setdefault(v, (v.data['tile_type'], v.data['assigned_id']))
             v.clear_assigned_id()
+        self.id_preview.configure(self._get_id_settings(), self._get_episode_ids(self.loaded_file))
+        self.id_preview.reset(self.tiles)
+        self.show_id_preview()
 
     def update_create_pge_tileset(self, *_):
         if self.create_pge_tileset.get():
@@ -649,6 +730,172 @@ class Window(Tk):
             self.mixed_pge_tileset_box.configure(state=DISABLED)
             self.mixed_pge_tileset.set(False)
 
+    def update_export_zip(self, *_):
+        self.zip_store_images_box.configure(state=NORMAL if self.export_zip.get() else DISABLED)
+
+    # ---------------------------------
+    # ID Preview
+    # ---------------------------------
+
+    def _get_id_settings(self):
+        """Get the tileset settings that affect ID assignment. See IDPreview.configure."""
+        data = self.data
+        return {'block_ids': data['block_ids'].get(), 'bgo_ids': data['bgo_ids'].get(),
+                'start_high': data['start_high'].get(), 'id_allocation': data['id_allocation'].get(),
+                'grid_size': data['last_good_grid_size'].get(), 'pixel_scale': data['last_good_pixel_scale'].get()}
+
+    def _get_episode_ids(self, sheet_path):
+        """Get the IDs used in the episode folder, for the ID preview. None if there is no episode folder to read."""
+        try:
+            episode_ids = get_episode_ids(sheet_path, {'episode_path': self.data['episode_path'].get()})
+        except ExportError:
+            return None
+        if episode_ids is not None:
+            self._release_cleared_ids(episode_ids)
+        return episode_ids
+
+    def _forget_cleared_ids(self):
+        """Forget the IDs tiles had before Clear Auto-Assigned IDs, once the levels that placed them are updated."""
+        self.cleared_ids = {}
+        self.levels_to_remap = None
+
+    def _release_cleared_ids(self, episode_ids):
+        """The tile files for the IDs cleared by Clear Auto-Assigned IDs are this tileset's own, so they are free."""
+        for (tile_type, old_id) in self.cleared_ids.values():
+            episode_ids.release(tile_type, old_id)
+
+    def choose_episode_folder(self):
+        """Let the user choose the episode folder. It is saved relative to the tileset image, if it is on the same
+        drive."""
+        folder = filedialog.askdirectory(title='Choose Episode Folder', mustexist=True)
+        if not folder:
+            return
+        try:
+            folder = path.relpath(folder, path.dirname(path.abspath(self.loaded_file)))
+        except ValueError:  # On another drive
+            pass
+        self.data['episode_path'].set(folder)
+
+    def update_id_settings(self, *_):
+        """Called when a tileset setting that affects ID assignment changes."""
+        if self.freeze_redraw_traces or self.loaded_file == '':
+            return
+        self.id_preview.configure(self._get_id_settings(), self._get_episode_ids(self.loaded_file))
+        self.show_id_preview()
+
+    def update_episode_path(self, *_):
+        """Called when the Episode Folder changes. The folder is only read once typing pauses, so the folders passed
+        through on the way, such as C:\\ or .., are not listed and have their tilesets read on every keystroke."""
+        if self.episode_path_job is not None:
+            self.after_cancel(self.episode_path_job)
+            self.episode_path_job = None
+        if self.freeze_redraw_traces or self.loaded_file == '':
+            return  # A tileset is being opened, and reads its episode folder itself.
+        self.episode_path_job = self.after(EPISODE_PATH_DELAY_MS, self._apply_episode_path)
+
+    def _apply_episode_path(self):
+        """Update the ID preview and the level usage for the Episode Folder. See update_episode_path."""
+        self.episode_path_job = None
+        self.update_id_settings()
+        self.scan_levels()
+
+    def update_current_tile_id(self, *_):
+        """Called when the current tile's type or tile ID is changed. Only that tile is updated in the ID preview. The
+        tile's data is left alone until the tile is saved, since redraw_current_tile compares the tile type with it."""
+        if self.freeze_redraw_traces or self.current_tile_index == -1:
+            return
+        self.id_preview.update(self.tiles[self.current_tile_index], self.data['tile_type'].get(),
+                               self.data['tile_id'].get())
+        self.show_id_preview()
+
+    def show_id_preview(self):
+        """Show how many IDs are left in each pool, and the files the current tile would be exported as."""
+        if self.loaded_file == '':
+            return
+        lines = []
+        for tile_type in ('Block', 'BGO'):
+            remaining = self.id_preview.get_remaining(tile_type)
+            lines.append(f'{tile_type} IDs left: {remaining}' if remaining >= 0
+                         else f'{tile_type} IDs left: none ({-remaining} short)')
+        self.id_pool_text.set('\n'.join(lines))
+
+        text = ''
+        usage_text = ''
+        if self.current_tile_index != -1:
+            tile = self.tiles[self.current_tile_index]
+            tile_type = self.data['tile_type'].get()  # The tile's data is only updated when it is saved
+            new_id = self.id_preview.get_id(tile)
+            if new_id not in (None, ''):
+                if self.level_usage is not None:
+                    usage_text = describe_usage(self.level_usage[tile_type].get(new_id))
+                elif self.level_scan_thread is not None:
+                    usage_text = 'Scanning levels...'
+
+            if new_id is None:
+                text = f'Exported as: out of {tile_type} IDs'
+            elif new_id != '':
+                text = f'Exported as: {"block" if tile_type == "Block" else "background"}-{new_id}'
+                if tile.duplicate_id:
+                    text += ' (⚠ another tile has this ID)'
+        self.tile_id_preview_text.set(text)
+        self.tile_usage_text.set(usage_text)
+
+    # ---------------------------------
+    # Level Usage
+    # ---------------------------------
+
+    def scan_levels(self, *_):
+        """
+        Start reading the levels in the episode folder in the background, so the tile panel can show how many times
+        each tile is placed in them. Only the levels that changed since the last scan are read again.
+        """
+        if self.freeze_redraw_traces or self.loaded_file == '':
+            return
+        try:
+            folder = get_episode_path(self.loaded_file, {'episode_path': self.data['episode_path'].get()})
+        except ExportError:
+            folder = None
+        if folder is None:
+            self.level_usage = None
+            self.show_id_preview()
+            return
+        if self.level_scan_thread is not None:
+            self.level_scan_pending = True
+            return
+
+        self.level_scan_messages = queue.Queue()
+        workers = resolve_worker_count(self.preferences['export_workers'].get())
+        self.level_scan_thread = threading.Thread(target=self._run_level_scan, daemon=True, args=(folder, workers))
+        self.level_scan_thread.start()
+        self.after(EXPORT_POLL_MS, self._poll_level_scan)
+
+    def _run_level_scan(self, folder, workers):
+        """Read the levels in a folder. This runs on its own thread, so it must not touch the window."""
+        try:
+            self.level_scan_messages.put(('done', get_level_usage(folder, workers).usage))
+        except OSError:
+            self.level_scan_messages.put(('error',))
+        except BaseException:
+            self.level_scan_messages.put(('crash', sys.exc_info()))
+
+    def _poll_level_scan(self):
+        """Show the result of the running level scan once it is done."""
+        try:
+            message = self.level_scan_messages.get_nowait()
+        except queue.Empty:
+            self.after(EXPORT_POLL_MS, self._poll_level_scan)
+            return
+
+        self.level_scan_thread.join()
+        self.level_scan_thread = None
+        if message[0] == 'crash':
+            self.crash_prompt(*message[1])
+        self.level_usage = message[1] if message[0] == 'done' and self.loaded_file != '' else None
+        self.show_id_preview()
+        if self.level_scan_pending:
+            self.level_scan_pending = False
+            self.scan_levels()
+
     # ---------------------------------
     # Tile Management
     # ---------------------------------
@@ -724,6 +971,7 @@ class Window(Tk):
                         grid_padding=self.grid_padding * zoom)
 
         self.tiles.append(new_tile)
+        self.id_preview.update(new_tile)
 
         self._set_file_dirty()
 
@@ -737,6 +985,7 @@ class Window(Tk):
         if index is None:
             self.set_state_all_descendants(self.tile_frame, DISABLED)
             self.current_tile_index = -1
+            self.show_id_preview()
             return
 
         # If there was previously no index selected, we need to unlock all the tile settings fields
@@ -762,15 +1011,18 @@ class Window(Tk):
         self.freeze_redraw_traces = False
 
         self.update_content_type()
+        self.show_id_preview()
+        if load_preview:
+            self.scan_levels()  # Picks up levels edited since the last scan
 
     def delete_current_tile(self):
         """Delete the tile that is currently selected"""
         index = self.current_tile_index
         tiles = self.tiles
-        # Since the order of tiles doesn't matter, just fill the deleted tile's place with the last tile
-        if index != len(tiles) - 1:
-            tiles[index] = tiles[-1]
-        del tiles[-1]
+        # The other tiles keep their order, since it is the order IDs are assigned in.
+        self.id_preview.remove(tiles[index])
+        self.cleared_ids.pop(tiles[index], None)  # The Tile is only erased from the canvas once nothing refers to it.
+        del tiles[index]
         self.load_tile()
 
         self._set_file_dirty()
@@ -982,6 +1234,27 @@ class Window(Tk):
                     self._draw_grid_line(canvas, s, v[2])
                     s += v[3]
 
+    def _load_tileset_image(self, filename):
+        """Load the tileset image for display, unscaled, with the color key applied."""
+        color_key = self.data['color_key'].get()
+        if not good_color_key(color_key) or color_key == '':
+            return PhotoImage(file=filename)
+        # The keyed image comes from the same cache the export uses. Tk only takes it as image file data.
+        buffer = io.BytesIO()
+        load_sheet(filename, color_key).save(buffer, 'PNG', compress_level=0)
+        return PhotoImage(data=base64.b64encode(buffer.getvalue()))
+
+    def update_color_key(self, *_):
+        """Reload the tileset image when the color key is changed."""
+        if self.freeze_redraw_traces or self.loaded_file == '':
+            return
+        self.tileset_image = self._load_tileset_image(self.loaded_file)
+        self.tileset_image_zoom = None  # Forces the image to be redrawn at the pixel scale
+        self.redraw_canvas()
+        self.tileset_canvas.tag_lower('tileset_image')
+        if self.current_tile_index >= 0:
+            self.tiles[self.current_tile_index].load_preview(self)
+
     def _redraw_tileset_image(self, canvas):
         """Redraw the tileset image if the pixel scale has been changed."""
         zoom = int(self.data['last_good_pixel_scale'].get())
@@ -1039,41 +1312,11 @@ class Window(Tk):
     @staticmethod
     def _get_id_list_preset(value, tile_type):
         """Convert an ID preset name into an ID list."""
-        if value in built_in_id_lists[tile_type]:
-            return built_in_id_lists[tile_type][value]
-        return value
+        return get_id_list_preset(value, tile_type)
 
     @staticmethod
-    # @lru_cache(maxsize=5)  # Cache the 5 most recent return values
     def _parse_id_list(value, tile_type, check_valid_only=False):
-        value = window._get_id_list_preset(value, tile_type)
-        if value == '' or regex.match(r'^(\d+(?:-\d+)?;?)+$', value) is None:
-            return False, None
-        ids = OrderedSet()
-        last_id = 0
-        for x in value.split(';'):
-            x_split = x.split('-')
-            lo = x_split[0]
-            if not lo.isdigit():
-                return False, None
-            lo = int(lo)
-            if lo <= last_id:
-                return False, None
-            hi = None
-            if len(x_split) == 2:
-                hi = int(x_split[1])
-            if hi is not None:
-                if hi <= lo:
-                    return False, None
-                last_id = hi
-                if not check_valid_only:
-                    for v in range(lo, hi + 1):
-                        ids.add(v)
-            else:
-                last_id = lo
-                if not check_valid_only:
-                    ids.add(lo)
-        return True, ids
+        return parse_id_list(value, tile_type, check_valid_only)
 
     @staticmethod
     def _verify_id_list(value, tile_type):
@@ -1096,51 +1339,34 @@ class Window(Tk):
         return Window._parse_id_list(value, 'BGO', True)[0]
 
     def _good_tile_id(self, value):
-        if value == '':
-            return True
-        if value == '-':
-            return False
-
-        tile_type = self.data['tile_type'].get()
-        value = int(value)
-
-        return tile_type == 'Block' and 1 <= value <= MAX_BLOCK_ID \
-               or tile_type == 'BGO' and (1 <= value <= MAX_BGO_ID or 751 <= value <= 1000)
+        return good_tile_id(value, self.data['tile_type'].get())
 
     def good_content_id(self, value):
-        if value == '':
-            return False
+        return good_content_id(value, self.data['content_type'].get())
 
-        content_type = self.data['content_type'].get()
-        value = int(value)
+    @staticmethod
+    def _verify_grid_size(value):
+        return regex.match(r'^[0-9x]+$', value) is not None
 
-        if content_type == 'Empty':
-            return True  # Don't care what's in the box if it's locked.
+    @staticmethod
+    def _verify_color_key(value):
+        return regex.match(r'^#?[0-9a-fA-F]{0,6}$', value) is not None
 
-        return content_type == 'Coins' and 1 <= value <= 99 \
-               or content_type == 'NPC' and (1 <= value <= MAX_NPC_ID or 751 <= value <= 1000)
+    @staticmethod
+    def _verify_scale_list(value):
+        return regex.match(r'^[0-9;]*$', value) is not None
 
     @staticmethod
-    def _verify_grid_size(value):
-        return regex.match(r'^[0-9x]+$', value) is not None
+    def _good_scale_list(value):
+        return parse_scale_list(value) is not None
 
     @staticmethod
     def _verify_grid_dimension(value):
-        return MIN_GRID_DIM <= value <= MAX_GRID_DIM
+        return verify_grid_dimension(value)
 
     @staticmethod
-    @lru_cache(maxsize=5)
     def _parse_grid_size(value):
-        if (m := regex.match(r'^(\d+)(?:x(\d+))?$', value)) is not None:
-            dims = m.groups()
-            if dims[1] is None:
-                if Window._verify_grid_dimension(w := int(dims[0])):
-                    return w, w
-                return ()
-            if Window._verify_grid_dimension(w := int(dims[0])) and Window._verify_grid_dimension(h := int(dims[1])):
-                return w, h
-            return ()
-        return ()
+        return parse_grid_size(value)
 
     @staticmethod
     def _good_grid_size(value):
@@ -1218,10 +1444,23 @@ class Window(Tk):
             'block_ids': StringVar(),
             'bgo_ids': StringVar(),
             'start_high': BooleanVar(),
+            'id_allocation': StringVar(),
+            'episode_path': StringVar(),
             'create_pge_tileset': BooleanVar(),
             'mixed_pge_tileset': BooleanVar(),
+            'create_sizables_script': BooleanVar(),
+            'export_zip': BooleanVar(),
+            'zip_store_images': BooleanVar(),
+            'png_profile': StringVar(),
+            'export_thextech': BooleanVar(),
+            'export_scales': StringVar(),
+            'export_gif': BooleanVar(),
+            'export_variants': BooleanVar(),
+            'color_key': StringVar(),
+            'upscaler': StringVar(),
 
             'last_good_pixel_scale': StringVar(self, data_defaults['pixel_scale']),
+            'last_good_color_key': StringVar(self, data_defaults['color_key']),
 
             # Current Tile
 
@@ -1303,10 +1542,29 @@ class Window(Tk):
         self.data['last_good_pixel_scale'].trace_add('write', self.redraw_canvas)
         self.data['last_good_grid_padding'].trace_add('write', self.redraw_canvas)
         self.data['show_grid'].trace_add('write', self.redraw_canvas)
+        self.data['last_good_color_key'].trace_add('write', self.update_color_key)
         # These traces trigger a redraw of the current tile
         self.data['tile_type'].trace_add('write', self.redraw_current_tile)
         self.data['collision_type'].trace_add('write', self.redraw_current_tile)
 
+        # The IDs the next export would assign. See IDPreview.
+        self.id_preview = IDPreview(lambda tile, duplicate: tile.set_duplicate_id(duplicate))
+        self.id_pool_text = StringVar()
+        self.tile_id_preview_text = StringVar()
+
+        # Where the tiles are placed in the episode's levels. See scan_levels.
+        self.tile_usage_text = StringVar()
+        self.level_usage = None  # ID -> {level name: count}, for each tile type. None if there are no levels to scan.
+        self.level_scan_thread = None
+        self.level_scan_messages = None
+        self.level_scan_pending = False  # True if the levels have to be scanned again once the running scan is done
+        self.episode_path_job = None  # The after() job that applies the Episode Folder once typing pauses
+        # tile -> (tile_type, assigned_id) for each tile whose ID was cleared, until the levels placing it are updated
+        self.cleared_ids = {}
+        self.levels_to_remap = None  # The levels an earlier update failed on, or None for every level
+        self.pending_remap = None  # Kept as it is in the .tileset.json file, for "main.py remap"
+        self.export_targets = None  # Kept as it is in the .tileset.json file. The editor has no fields for it.
+
         self.label_width_tile_settings = 60
         self.label_width_appearance = 110
         self.label_width_behavior = 100
@@ -1416,6 +1674,18 @@ class Window(Tk):
         ttk.Checkbutton(self.view_box, text='Show Grid', variable=self.data['show_grid'], offvalue=False, onvalue=True) \
             .grid(column=1, row=next_row(), sticky=W)
 
+        # Color Key
+        w = VerifiedWidget(ttk.Entry, {'width': 9}, self.view_box, variable=self.data['color_key'],
+                           verify_function=self._verify_color_key, good_function=good_color_key,
+                           last_good_variable=self.data['last_good_color_key'], orientation='vertical',
+                           label_text='Color Key:',
+                           tooltip='A background color to make transparent, written as #rrggbb (e.g. #ff00ff for '
+                                   'magenta). Use this for tileset images that have a solid background instead of '
+                                   'transparency. It applies to the editor, the tile preview, and exported tiles. '
+                                   'Leave blank if the image already has transparency.')
+        w.grid(column=1, row=next_row(), sticky=W)
+        tileset_inputs['color_key'] = w
+
         # Export Settings Section
 
         label = ttk.Label(self, text='Export Settings')
@@ -1435,6 +1705,17 @@ class Window(Tk):
         self.pixel_scale_box = pixel_scale_box
         tileset_inputs['pixel_scale'] = pixel_scale_box
 
+        # Upscaler
+        ttk.Label(self.export_box, text='Upscaler:').grid(column=1, row=next_row(), sticky=W)
+        w = ttk.Combobox(self.export_box, state='readonly', textvariable=self.data['upscaler'], values=upscalers,
+                         width=10)
+        w.grid(column=1, row=next_row(), sticky=W)
+        self.readonly_widget_map[str(w)] = True
+        CreateToolTip(w, 'How tile images are scaled up to the pixel scale when exporting. Nearest makes each pixel a '
+                         'solid square. Scale2x and Scale3x are made for pixel art drawn at 1x: they round off the '
+                         'corners of diagonal edges, without adding any colors. Scale2x works on pixel scales 2, 4 and '
+                         '8, and Scale3x on 3 and 6; anything left over is scaled with Nearest.')
+
         # Tileset Name
         ttk.Label(self.export_box, text='Tileset Name:').grid(column=1, row=next_row(), sticky=W)
         w = ttk.Entry(self.export_box, width=16, textvariable=self.data['tileset_name'])
@@ -1471,6 +1752,11 @@ class Window(Tk):
         w.grid(column=1, row=next_row(), sticky=W)
         tileset_inputs['bgo_ids'] = w
 
+        w = ttk.Label(self.export_box, textvariable=self.id_pool_text)
+        w.grid(column=1, row=next_row(), sticky=W)
+        CreateToolTip(w, 'How many IDs would be left in each pool after an export, counting every tile that does not '
+                         'have an ID yet.')
+
         self.start_high = self.data['start_high']
         start_high_box = ttk.Checkbutton(self.export_box, text='IDs High to Low', variable=self.start_high,
                                          offvalue=False, onvalue=True)
@@ -1479,6 +1765,30 @@ class Window(Tk):
                                       'lowest and increasing. Useful if you don\'t want to overwrite episode graphics'
                                       ' in a level.')
 
+        # ID Allocation
+        ttk.Label(self.export_box, text='ID Allocation:').grid(column=1, row=next_row(), sticky=W)
+        w = ttk.Combobox(self.export_box, state='readonly', textvariable=self.data['id_allocation'],
+                         values=id_allocations, width=17)
+        w.grid(column=1, row=next_row(), sticky=W)
+        self.readonly_widget_map[str(w)] = True
+        CreateToolTip(w, 'How IDs are chosen for new tiles. In Order takes the next IDs in the pool. Contiguous Rows '
+                         'gives the new tiles in each row of the tileset image consecutive IDs, using the smallest gap '
+                         'in the pool they fit in, and Contiguous Tileset does the same for all new tiles at once. '
+                         'Tiles that already have an ID keep it.')
+
+        # Episode Folder
+        ttk.Label(self.export_box, text='Episode Folder:').grid(column=1, row=next_row(), sticky=W)
+        w = ttk.Frame(self.export_box)
+        w.grid(column=1, row=next_row(), sticky=W)
+        episode_entry = ttk.Entry(w, width=12, textvariable=self.data['episode_path'])
+        episode_entry.grid(column=1, row=1, sticky=W)
+        ttk.Button(w, text='...', width=3, command=self.choose_episode_folder).grid(column=2, row=1, sticky=W)
+        CreateToolTip(episode_entry, 'The episode or level folder the tileset is used in. IDs already used there, by '
+                                     'tile files such as block-12.png or by other tilesets, are not assigned to new '
+                                     'tiles, and you are warned before exporting tiles whose ID is already used. '
+                                     'Tilesets next to this tileset image are also checked.\n\n'
+                                     'Leave this empty to skip the check.')
+
         self.create_pge_tileset = self.data['create_pge_tileset']
         self.create_pge_tileset.trace_add('write', self.update_create_pge_tileset)
         pge_tileset_box = ttk.Checkbutton(self.export_box, text='Create PGE Tileset', variable=self.create_pge_tileset,
@@ -1495,6 +1805,74 @@ class Window(Tk):
                                                   'separate block and BGO tilesets. Mixed tilesets require the SMBX2 '
                                                   'b5 editor or later to function.')
 
+        w = ttk.Checkbutton(self.export_box, text='Create Sizables Library',
+                            variable=self.data['create_sizables_script'], offvalue=False, onvalue=True)
+        w.grid(column=1, row=next_row(), sticky=W)
+        CreateToolTip(w, 'Generate a Lua library that makes the sizable blocks whose collision is Solid ■ solid on '
+                         'every side, instead of only on top. Load it from your level or episode\'s luna.lua file '
+                         'with require. It is only created if the tileset has sizables.')
+
+        self.export_zip = self.data['export_zip']
+        self.export_zip.trace_add('write', self.update_export_zip)
+        w = ttk.Checkbutton(self.export_box, text='Export to .zip', variable=self.export_zip, offvalue=False,
+                            onvalue=True)
+        w.grid(column=1, row=next_row(), sticky=W)
+        CreateToolTip(w, 'Export all files into a single .zip archive, with the same name as the tileset image, '
+                         'instead of a directory. Writing one file is much faster than writing hundreds of small ones '
+                         'on network drives.')
+
+        self.zip_store_images_box = ttk.Checkbutton(self.export_box, text='Store Images Uncompressed',
+                                                    variable=self.data['zip_store_images'], offvalue=False,
+                                                    onvalue=True)
+        self.zip_store_images_box.grid(column=1, row=next_row(), sticky=W)
+        CreateToolTip(self.zip_store_images_box, 'If checked, .png files are stored in the .zip archive without '
+                                                 'compressing them again. PNGs are already compressed, so this makes '
+                                                 'exporting faster with almost no change in size.')
+
+        # PNG Profile
+        ttk.Label(self.export_box, text='PNG Profile:').grid(column=1, row=next_row(), sticky=W)
+        w = ttk.Combobox(self.export_box, state='readonly', textvariable=self.data['png_profile'], values=png_profiles,
+                         width=10)
+        w.grid(column=1, row=next_row(), sticky=W)
+        self.readonly_widget_map[str(w)] = True
+        CreateToolTip(w, 'How tile images are encoded. Fast encodes quickest, for testing changes. Smallest makes the '
+                         'smallest files, for releases, by taking longer to compress them and storing images with 256 '
+                         'colors or fewer as palette images. Balanced is in between. The images look the same with '
+                         'every profile.')
+
+        w = ttk.Checkbutton(self.export_box, text='Also Export for TheXTech', variable=self.data['export_thextech'],
+                            offvalue=False, onvalue=True)
+        w.grid(column=1, row=next_row(), sticky=W)
+        CreateToolTip(w, 'Also export the tileset for TheXTech, into a directory (or .zip archive) with -thextech '
+                         'added to its name. Tile images are only encoded once for both.')
+
+        # Export Scales
+        w = VerifiedWidget(ttk.Entry, {'width': 12}, self.export_box, variable=self.data['export_scales'],
+                           verify_function=self._verify_scale_list, good_function=self._good_scale_list,
+                           orientation='vertical', label_text='Export Scales:',
+                           tooltip='Pixel scales to export the tile images at, separated by semicolons (;). Each scale '
+                                   'is exported into its own subdirectory (or .zip archive), such as 2x. The tileset '
+                                   'image is only read and cut into tiles once for all of them.\n\n'
+                                   'Example Input: 1;2\n\n'
+                                   'Leave this empty to export only at the Pixel Scale.')
+        w.grid(column=1, row=next_row(), sticky=W)
+        tileset_inputs['export_scales'] = w
+
+        w = ttk.Checkbutton(self.export_box, text='Legacy GIF + Mask Images', variable=self.data['export_gif'],
+                            offvalue=False, onvalue=True)
+        w.grid(column=1, row=next_row(), sticky=W)
+        CreateToolTip(w, 'Export each tile image as a GIF with a separate mask (e.g. block-1.gif and block-1m.gif), as '
+                         'used by SMBX 1.3 and older TheXTech episodes, instead of a PNG. Partly transparent pixels '
+                         'are blended with black. GIFs hold at most 256 colors.')
+
+        w = ttk.Checkbutton(self.export_box, text='Export Palette Variants', variable=self.data['export_variants'],
+                            offvalue=False, onvalue=True)
+        w.grid(column=1, row=next_row(), sticky=W)
+        CreateToolTip(w, 'Also export a recolored copy of the tileset for each palette variant listed in the '
+                         '.variants.json file next to the tileset image, such as a night or snow version. Each variant '
+                         'is exported into a directory (or .zip archive) with its name added, and has the same IDs as '
+                         'the tileset.')
+
         self.tileset_fields = tileset_inputs
 
         # ------------------------------------------
@@ -1516,6 +1894,14 @@ class Window(Tk):
         self.loaded_file = ''  # Name of the loaded file
         self.tileset_image = None
 
+        # These traces keep the ID preview up to date
+        for k in ('block_ids', 'bgo_ids', 'start_high', 'id_allocation', 'last_good_grid_size',
+                  'last_good_pixel_scale'):
+            self.data[k].trace_add('write', self.update_id_settings)
+        self.data['episode_path'].trace_add('write', self.update_episode_path)
+        self.data['tile_type'].trace_add('write', self.update_current_tile_id)
+        self.data['tile_id'].trace_add('write', self.update_current_tile_id)
+
         # self.tile_selections = []
         # self.current_tile_selection = None
         # self.current_tile_selection_index = -1
@@ -1615,6 +2001,16 @@ class Window(Tk):
         self.tile_id_box.grid(column=1, row=next_row(), columnspan=2, sticky=W)
         tile_inputs['tile_id'] = self.tile_id_box
 
+        w = ttk.Label(self.tile_settings_frame, textvariable=self.tile_id_preview_text)
+        w.grid(column=1, row=next_row(), columnspan=2, sticky=W)
+        CreateToolTip(w, 'The files this tile would be exported as. Tiles without a Tile ID get the next free ID from '
+                         'the Block or BGO IDs pool, using the ID Allocation setting.')
+
+        w = ttk.Label(self.tile_settings_frame, textvariable=self.tile_usage_text)
+        w.grid(column=1, row=next_row(), columnspan=2, sticky=W)
+        CreateToolTip(w, 'How many times this tile\'s ID is placed in the levels (.lvlx and .lvl) in the Episode '
+                         'Folder. Check this before changing or deleting a tile that is already used.')
+
         # Tile Name
         ttk.Label(self.tile_settings_frame, text='Tile Name:').grid(column=3, row=1, sticky=W)
         w = ttk.Entry(self.tile_settings_frame, textvariable=self.data['tile_name'], width=30)
@@ -1794,7 +2190,8 @@ class Window(Tk):
         self.sizable_box = ttk.Checkbutton(self.tile_behavior_frame, text='Sizable', variable=self.sizable,
                                            offvalue=False, onvalue=True)
         self.sizable_box.grid(column=1, row=next_row(), sticky=W)
-        CreateToolTip(self.sizable_box, 'Sizable. Sizable blocks may be semisolid or passthrough, but cannot be solid.')
+        CreateToolTip(self.sizable_box, 'Sizable. Sizable blocks may be semisolid or passthrough. They can only be '
+                                        'solid with the library made by Create Sizables Library.')
 
         # Lava
         self.lava = self.data['lava']
@@ -1871,12 +2268,18 @@ class Window(Tk):
         # ----------------------------------------
 
         self.preferences_dialog = None
+        self.export_dialog = None
+        self.export_thread = None
+        self.export_messages = None
+        self.export_cancel = None
         self.preferences = {
             'max_canvas_width': StringVar(self, preference_defaults['max_canvas_width']),
             'max_canvas_height': StringVar(self, preference_defaults['max_canvas_height']),
+            'export_workers': StringVar(self, preference_defaults['export_workers']),
 
             'max_canvas_width_raw': StringVar(),
             'max_canvas_height_raw': StringVar(),
+            'export_workers_raw': StringVar(),
         }
         self.preference_fields = []
         self._load_preferences()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules are not a package, so make them importable the way main.py imports them.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,28 @@
+"""Helpers for comparing the NumPy versions of the image operations with the versions used without NumPy."""
+from PIL import Image
+
+import exporter
+import tiledata
+
+
+def random_image(rng, size, mode='RGBA', colors=4):
+    """An image with a few colors, so Scale2x and Scale3x find edges to round off."""
+    palette = [tuple(rng.randrange(256) for _ in range(4)) for _ in range(colors)]
+    image = Image.new('RGBA', size)
+    image.putdata([rng.choice(palette) for _ in range(size[0] * size[1])])
+    if mode == 'P':
+        return image.convert('RGB').quantize(colors)
+    return image.convert(mode)
+
+
+def without_numpy(monkeypatch, function, *args):
+    with monkeypatch.context() as m:
+        m.setattr(tiledata, 'numpy', None)
+        m.setattr(exporter, 'numpy', None)
+        return function(*args)
+
+
+def assert_same_image(a, b):
+    assert (a.mode, a.size) == (b.mode, b.size)
+    assert a.tobytes() == b.tobytes()
+    assert a.getpalette() == b.getpalette()
@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+
+from PIL import Image
+
+import cli
+from tilesets import load_tileset, make_tileset
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_export(tmp_path, capsys):
+    sheet = make_tileset(tmp_path)
+    assert cli.main(['export', sheet, '-j', '1']) == 0
+    assert 'Successfully exported 3 blocks and 1 BGOs' in capsys.readouterr().out
+
+    ids = [t['assigned_id'] for t in load_tileset(sheet)['tiles']]
+    files = os.listdir(tmp_path / 'tiles')
+    for (t, i) in zip(load_tileset(sheet)['tiles'], ids):
+        name = f'block-{i}' if t.get('tile_type', 'Block') == 'Block' else f'background-{i}'
+        assert f'{name}.png' in files and f'{name}.txt' in files
+    assert 'Imported Tileset (Blocks).tileset.ini' in files
+
+    # The IDs are saved, so exporting again gives the same ones.
+    assert cli.main(['export', sheet, '-j', '1']) == 0
+    assert [t['assigned_id'] for t in load_tileset(sheet)['tiles']] == ids
+
+
+def test_export_directory(tmp_path, capsys):
+    make_tileset(tmp_path, 'a')
+    make_tileset(tmp_path, 'b')
+    Image.new('RGBA', (16, 16)).save(tmp_path / 'not-a-tileset.png')  # No .tileset.json, so it is left alone
+    assert cli.main(['export', str(tmp_path), '-j', '1']) == 0
+    out = capsys.readouterr().out.splitlines()
+    assert [line.split(':')[0] for line in out] == [str(tmp_path / 'a.png'), str(tmp_path / 'b.png')]
+    assert os.path.isdir(tmp_path / 'a') and os.path.isdir(tmp_path / 'b')
+    assert not os.path.exists(tmp_path / 'not-a-tileset')
+
+
+def test_a_failed_tileset_does_not_stop_the_others(tmp_path, capsys):
+    Image.new('RGBA', (16, 16)).save(tmp_path / 'unsaved.png')
+    sheet = make_tileset(tmp_path)
+    assert cli.main(['export', str(tmp_path / 'unsaved.png'), sheet, '-j', '1']) == 1
+    (out, err) = capsys.readouterr()
+    assert 'No tileset data found' in err
+    assert 'Successfully exported' in out
+    assert os.path.isdir(tmp_path / 'tiles')
+
+
+def test_no_tilesets_found(tmp_path, capsys):
+    assert cli.main(['export', str(tmp_path)]) == 1
+    assert 'No tilesets found.' in capsys.readouterr().err
+
+
+def test_command_line_does_not_import_tkinter(tmp_path):
+    sheet = make_tileset(tmp_path)
+    script = 'import runpy, sys\n' \
+             f'sys.argv = ["main.py", "export", {sheet!r}, "-j", "1"]\n' \
+             'try:\n' \
+             f'    runpy.run_path({os.path.join(REPO, "main.py")!r}, run_name="__main__")\n' \
+             'except SystemExit as e:\n' \
+             '    assert e.code == 0, e.code\n' \
+             'assert "tkinter" not in sys.modules\n'
+    subprocess.run([sys.executable, '-c', script], check=True, capture_output=True)
+    assert os.path.isdir(tmp_path / 'tiles')
@@ -0,0 +1,41 @@
+import os
+
+from exporter import dry_run_sheet, export_sheet
+from tilesets import load_tileset, make_tileset, save_tileset, tile
+
+
+def test_nothing_is_written(tmp_path):
+    sheet = make_tileset(tmp_path, tiles=[tile(0, 0), tile(1, 0, tile_id='50'), tile(2, 0, tile_type='BGO')])
+    before = load_tileset(sheet)
+    dry_run = dry_run_sheet(sheet)
+    assert sorted(os.listdir(tmp_path)) == ['tiles.png', 'tiles.tileset.json']
+    assert load_tileset(sheet) == before  # No IDs are saved.
+
+    assert len(dry_run.added) == 8 and dry_run.changed == dry_run.removed == dry_run.unchanged == []
+    assert set(dry_run.files) == set(dry_run.added)
+    assert dry_run.ids['block-50'] == 50
+    assert len(dry_run.new_ids) == 2 and 'block-50' not in dry_run.new_ids  # The Tile ID is not a new ID.
+
+
+def test_diff_against_the_last_export(tmp_path):
+    sheet = make_tileset(tmp_path)
+    export_sheet(sheet)
+    dry_run = dry_run_sheet(sheet)
+    assert len(dry_run.unchanged) == 10 and dry_run.added == dry_run.changed == dry_run.removed == []
+    assert dry_run.new_ids == []
+
+    file_data = load_tileset(sheet)
+    (first, _, _, bgo) = file_data['tiles']
+    first['collision_type'] = 'Semisolid ■'
+    file_data['tiles'].remove(bgo)
+    save_tileset(sheet, file_data)
+    dry_run = dry_run_sheet(sheet)
+
+    name = f"block-{first['assigned_id']}.txt"
+    assert name in dry_run.changed
+    removed = f"background-{bgo['assigned_id']}"
+    assert dry_run.removed == sorted([f'{removed}.png', f'{removed}.txt', 'Imported Tileset (BGOs).tileset.ini'])
+    diff = dry_run.diffs[name]
+    assert diff[:2] == [f'--- a/{name}\n', f'+++ b/{name}\n']
+    assert '-semisolid = false\n' in diff and '+semisolid = true\n' in diff
+    assert os.path.exists(tmp_path / 'tiles' / f'{removed}.png')
@@ -0,0 +1,76 @@
+import json
+import os
+
+import episode
+from episode import EpisodeIDs, FolderIndex
+
+
+def touch_later(path):
+    """Move a file's modification time forward, as if it was changed a second later."""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def write_tileset(path, tiles):
+    with open(path, 'w') as f:
+        json.dump({'tiles': tiles}, f)
+
+
+def count_reads(monkeypatch):
+    reads = []
+    read_tileset_ids = episode.read_tileset_ids
+    monkeypatch.setattr(episode, 'read_tileset_ids', lambda path: reads.append(os.path.basename(path))
+                        or read_tileset_ids(path))
+    return reads
+
+
+def test_only_what_changed_is_scanned_again(tmp_path, monkeypatch):
+    reads = count_reads(monkeypatch)
+    (tmp_path / 'block-3.png').write_bytes(b'')
+    (tmp_path / 'background-7m.gif').write_bytes(b'')
+    (tmp_path / 'notes.txt').write_bytes(b'')
+    write_tileset(tmp_path / 'a.tileset.json', [{'assigned_id': 5}, {'tile_type': 'BGO', 'tile_id': '2'}])
+    index = FolderIndex(str(tmp_path))
+    index.refresh()
+    assert index.files == {'Block': {3: 'block-3.png'}, 'BGO': {7: 'background-7m.gif'}}
+    assert index.tilesets['a.tileset.json'][1] == {'Block': {5}, 'BGO': {2}}
+    assert reads == ['a.tileset.json']
+
+    index.refresh()
+    assert reads == ['a.tileset.json']  # Nothing changed.
+
+    # Saving a tileset does not change the folder's modification time, but the tileset is still read again.
+    write_tileset(tmp_path / 'a.tileset.json', [{'assigned_id': 6}])
+    touch_later(tmp_path / 'a.tileset.json')
+    index.refresh()
+    assert index.tilesets['a.tileset.json'][1] == {'Block': {6}, 'BGO': set()}
+    assert reads == ['a.tileset.json'] * 2
+
+    # Adding a file changes the folder's modification time, so the files are listed again. Only the new tileset is read.
+    (tmp_path / 'block-4.txt').write_bytes(b'')
+    write_tileset(tmp_path / 'b.tileset.json', [{'assigned_id': 9}])
+    touch_later(tmp_path)
+    index.refresh()
+    assert index.files['Block'] == {3: 'block-3.png', 4: 'block-4.txt'}
+    assert reads == ['a.tileset.json'] * 2 + ['b.tileset.json']
+
+    os.remove(tmp_path / 'b.tileset.json')
+    os.remove(tmp_path / 'block-3.png')
+    touch_later(tmp_path)
+    index.refresh()
+    assert list(index.tilesets) == ['a.tileset.json'] and index.files['Block'] == {4: 'block-4.txt'}
+
+
+def test_episode_ids(tmp_path):
+    (tmp_path / 'block-3.png').write_bytes(b'')
+    write_tileset(tmp_path / 'a.tileset.json', [{'assigned_id': 3}, {'tile_type': 'BGO', 'assigned_id': 1}])
+    write_tileset(tmp_path / 'b.tileset.json', [{'assigned_id': 'x'}, {'assigned_id': 8}])
+    (tmp_path / 'bad.tileset.json').write_text('{')
+    episode_ids = EpisodeIDs([tmp_path, tmp_path / 'missing'], exclude=[tmp_path / 'b.tileset.json'])
+
+    assert episode_ids.get_ids('Block') == {3} and episode_ids.get_ids('BGO') == {1}
+    assert episode_ids.get_users('Block', 3) == ['block-3.png', 'a.tileset.json']
+    assert episode_ids.get_users('Block', 3, files=False) == ['a.tileset.json']
+    assert list(episode_ids.errors) == ['bad.tileset.json']  # b.tileset.json is left out, so its bad tile is too.
+    episode_ids.release('Block', 3)
+    assert episode_ids.get_users('Block', 3) == ['a.tileset.json']
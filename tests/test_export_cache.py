@@ -0,0 +1,43 @@
+import os
+
+from daemon import ExportCache
+from tiledata import TileData
+from tilesets import make_tileset
+
+
+def test_least_recently_used_are_evicted_first():
+    cache = ExportCache(100)
+    cache.put('a', 'A', 40)
+    cache.put('b', 'B', 40)
+    assert cache.get('a') == 'A'  # Now b is the least recently used.
+    cache.put('c', 'C', 40)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == ('A', 'C')
+    assert cache.stats() == {'entries': 2, 'bytes': 80, 'max_bytes': 100, 'hits': 3, 'misses': 1, 'evictions': 1}
+
+
+def test_replacing_and_oversized_values():
+    cache = ExportCache(100)
+    cache.put('a', 'A', 40)
+    cache.put('a', 'A2', 90)  # Replacing a value does not count it twice.
+    assert (cache.size, cache.evictions) == (90, 0)
+    cache.put('b', 'B', 60)
+    assert list(cache.entries) == ['b'] and cache.size == 60
+    cache.put('huge', 'H', 101)  # Too big to cache at all, so nothing is evicted for it.
+    assert list(cache.entries) == ['b'] and cache.get('huge') is None
+
+
+def test_editing_the_tileset_image_makes_its_images_stale(tmp_path):
+    sheet = make_tileset(tmp_path)
+    cache = ExportCache(1 << 20)
+    tile = TileData(0, 0, 16, 16)
+
+    (first, crop) = cache.open_sheet(sheet)
+    image = crop(tile)
+    (again, crop) = cache.open_sheet(sheet)
+    assert again is first and crop(tile) is image
+
+    stat = os.stat(sheet)
+    os.utime(sheet, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    (reloaded, crop) = cache.open_sheet(sheet)
+    assert reloaded is not first and crop(tile) is not image
@@ -0,0 +1,73 @@
+import os
+import zipfile
+
+import pytest
+
+from exporter import ExportError, export_sheet, get_export_targets, parse_export_targets
+from tiledata import data_defaults
+from tilesets import load_tileset, make_tileset
+
+
+def test_default_targets(tmp_path):
+    sheet = make_tileset(tmp_path, export_thextech=True)
+    report = export_sheet(sheet)
+    assert report.targets == ['SMBX2', 'TheXTech']
+    block = f"block-{load_tileset(sheet)['tiles'][0]['assigned_id']}.txt"
+    smbx2 = (tmp_path / 'tiles' / block).read_text()
+    thextech = (tmp_path / 'tiles-thextech' / block).read_text()
+    assert 'noshadows' in smbx2 and 'noshadows' not in thextech
+
+
+def test_configured_targets(tmp_path):
+    sheet = make_tileset(tmp_path, export_targets=[
+        {'name': 'Editor'},
+        {'name': 'Release', 'preset': 'TheXTech', 'path': 'release/pack.zip', 'block_name': 'tile-{}',
+         'bgo_name': 'scenery-{}', 'txt_excluded': ['framespeed'], 'create_pge_tileset': False}])
+    report = export_sheet(sheet)
+    assert report.targets == ['Editor', 'Release']
+    assert os.path.isdir(tmp_path / 'tiles')  # The first target without a path goes to the usual place.
+    with zipfile.ZipFile(tmp_path / 'release' / 'pack.zip') as z:
+        names = z.namelist()
+        txt = z.read(next(n for n in names if n.startswith('tile-') and n.endswith('.txt'))).decode()
+    assert len(names) == 8 and not any(n.endswith('.ini') for n in names)
+    assert sum(n.startswith('scenery-') for n in names) == 2
+    assert 'framespeed' not in txt and 'noshadows' not in txt  # The preset's fields are left out too.
+
+    # --target picks from the configured targets only.
+    export_sheet(sheet, target_names=['Release'])
+    with pytest.raises(ExportError, match="Unknown export target 'SMBX2'"):
+        export_sheet(sheet, target_names=['SMBX2'])
+
+
+def test_configured_paths_with_variants_and_scales(tmp_path):
+    settings = dict(data_defaults, export_scales='1;2',
+                    export_targets=[{'name': 'SMBX2'}, {'name': 'Other'}, {'name': 'Pack', 'path': 'out/pack.zip'}])
+    targets = get_export_targets(str(tmp_path / 'tiles.png'), settings)
+    paths = [os.path.relpath(t.path, tmp_path) for t in targets]
+    assert paths == [os.path.join('tiles', '1x'), os.path.join('tiles', '2x'),
+                     os.path.join('tiles-other', '1x'), os.path.join('tiles-other', '2x'),
+                     os.path.join('out', 'pack-1x.zip'), os.path.join('out', 'pack-2x.zip')]
+    assert [t.zip for t in targets] == [False] * 4 + [True] * 2
+
+
+@pytest.mark.parametrize('value, message', [
+    ('SMBX2', 'must be a list'),
+    ([{'preset': 'SMBX2'}], 'has no name'),
+    ([{'name': 'A'}, {'name': 'A'}], 'more than one'),
+    ([{'name': 'A', 'preset': 'SMBX3'}], 'unknown preset'),
+    ([{'name': 'A', 'block_name': 'block'}], 'bad block_name'),
+    ([{'name': 'A', 'bgo_name': 'sub/bgo-{}'}], 'bad bgo_name'),
+    ([{'name': 'A', 'txt_excluded': 'frames'}], 'bad txt_excluded'),
+    ([{'name': 'A', 'create_pge_tileset': 'yes'}], 'bad create_pge_tileset'),
+    ([{'name': 'A', 'zip': True}], 'unknown keys: zip'),
+])
+def test_bad_targets(value, message):
+    with pytest.raises(ExportError, match=message):
+        parse_export_targets(value)
+
+
+def test_presets_are_filled_in():
+    targets = parse_export_targets([{'name': 'TheXTech'}, {'name': 'Mine', 'txt_excluded': ['frames']}])
+    assert targets['TheXTech']['preset'] == 'TheXTech' and 'lightradius' in targets['TheXTech']['txt_excluded']
+    assert targets['Mine']['preset'] == 'SMBX2' and targets['Mine']['txt_excluded'] == {'frames'}
+    assert (targets['Mine']['path'], targets['Mine']['create_pge_tileset']) == (None, None)
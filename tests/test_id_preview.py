@@ -0,0 +1,141 @@
+import random
+
+import pytest
+
+from episode import EpisodeIDs
+from exporter import ExportError, IDPreview, assign_tileset_ids
+from tiledata import TileData, data_defaults, id_allocations
+
+
+def make_settings(**kwargs):
+    settings = dict(data_defaults, grid_size='16', pixel_scale='1', block_ids='1-10;20-25;40', bgo_ids='5-12')
+    settings.update(kwargs)
+    return settings
+
+
+def make_tile(x, y, **kwargs):
+    return TileData(x * 16, y * 16, x * 16 + 16, y * 16 + 16, scale=1, **kwargs)
+
+
+def make_random_tiles(rng, count):
+    """Tiles on a 6-wide grid. Some have a Tile ID or an assigned ID, but no two share one."""
+    tiles = []
+    taken = {'Block': set(), 'BGO': set()}
+    for i in range(count):
+        tile_type = rng.choice(['Block', 'Block', 'BGO'])
+        kwargs = {'tile_type': tile_type}
+        roll = rng.random()
+        if roll < 0.2:
+            held = rng.randint(1, 50)
+            if held not in taken[tile_type]:
+                taken[tile_type].add(held)
+                kwargs['tile_id' if roll < 0.1 else 'assigned_id'] = str(held) if roll < 0.1 else held
+        tiles.append(make_tile(i % 6, i // 6, **kwargs))
+    return tiles
+
+
+def preview_ids(tiles, settings, episode_ids=None):
+    preview = IDPreview()
+    preview.configure(settings, episode_ids)
+    preview.reset(tiles)
+    return [preview.get_id(t) for t in tiles]
+
+
+def assigned_ids(tiles, settings, episode_ids=None):
+    assign_tileset_ids(tiles, settings, episode_ids)
+    return [t.data['assigned_id'] for t in tiles]
+
+
+@pytest.mark.parametrize('allocation', id_allocations)
+@pytest.mark.parametrize('start_high', [False, True])
+def test_preview_matches_assignment(allocation, start_high):
+    rng = random.Random(f'{allocation}{start_high}')
+    settings = make_settings(id_allocation=allocation, start_high=start_high)
+    for _ in range(50):
+        tiles = make_random_tiles(rng, rng.randint(0, 14))
+        expected = preview_ids(tiles, settings)
+        if None in expected:  # The preview says a pool runs out, so the export must fail.
+            with pytest.raises(ExportError):
+                assign_tileset_ids(tiles, settings)
+        else:
+            assert assigned_ids(tiles, settings) == expected
+
+
+@pytest.mark.parametrize('allocation', id_allocations)
+def test_preview_matches_assignment_with_episode_ids(tmp_path, allocation):
+    for name in ('block-2.png', 'block-21.txt', 'background-6.png'):
+        (tmp_path / name).write_bytes(b'')
+    episode_ids = EpisodeIDs([tmp_path])
+    settings = make_settings(id_allocation=allocation)
+    tiles = [make_tile(x, y, tile_type='BGO' if x == 3 else 'Block') for y in range(2) for x in range(4)]
+
+    expected = preview_ids(tiles, settings, episode_ids)
+    assert assigned_ids(tiles, settings, episode_ids) == expected
+    assert not {2, 21} & set(t.data['assigned_id'] for t in tiles if t.data['tile_type'] == 'Block')
+    assert 6 not in set(t.data['assigned_id'] for t in tiles if t.data['tile_type'] == 'BGO')
+
+
+def test_updating_a_tile_matches_a_fresh_preview():
+    rng = random.Random(1)
+    settings = make_settings()
+    tiles = make_random_tiles(rng, 12)
+    preview = IDPreview()
+    preview.configure(settings)
+    preview.reset(tiles)
+    for _ in range(100):
+        t = rng.choice(tiles)
+        t.data['tile_type'] = rng.choice(['Block', 'BGO'])
+        t.data['tile_id'] = rng.choice(['', '', '7', '30', '9999', 'abc'])
+        preview.update(t)
+        assert [preview.get_id(t) for t in tiles] == preview_ids(tiles, settings)
+
+
+def test_update_with_values_still_being_edited():
+    settings = make_settings()
+    tiles = [make_tile(x, 0, tile_type='Block') for x in range(3)]
+    preview = IDPreview()
+    preview.configure(settings)
+    preview.reset(tiles)
+
+    preview.update(tiles[0], 'Block', '20')
+    assert tiles[0].data['tile_id'] == ''  # The tile's data is left alone.
+    assert [preview.get_id(t) for t in tiles] == [20, 1, 2]
+    preview.update(tiles[0], 'BGO', '')
+    assert [preview.get_id(t) for t in tiles] == [5, 1, 2]
+
+
+def test_pool_running_out():
+    settings = make_settings(block_ids='1-2')
+    tiles = [make_tile(x, 0, tile_type='Block') for x in range(3)]
+    preview = IDPreview()
+    preview.configure(settings)
+    preview.reset(tiles)
+    assert [preview.get_id(t) for t in tiles] == [1, 2, None]
+    assert preview.get_remaining('Block') == -1
+
+
+def test_duplicate_ids_are_reported():
+    events = []
+    settings = make_settings()
+    tiles = [make_tile(x, 0, tile_type='Block') for x in range(3)]
+    preview = IDPreview(lambda tile, duplicate: events.append((tiles.index(tile), duplicate)))
+    preview.configure(settings)
+    preview.reset(tiles)
+
+    tiles[0].data['tile_id'] = '7'
+    preview.update(tiles[0])
+    tiles[2].data['tile_id'] = '7'
+    preview.update(tiles[2])
+    assert sorted(events) == [(0, True), (2, True)]
+    assert preview.duplicates == {tiles[0], tiles[2]}
+
+    events.clear()
+    tiles[2].data['tile_type'] = 'BGO'  # Blocks and BGOs do not share IDs.
+    preview.update(tiles[2])
+    assert sorted(events) == [(0, False), (2, False)]
+
+    events.clear()
+    tiles[1].data['tile_id'] = '7'
+    preview.update(tiles[1])
+    preview.remove(tiles[0])
+    assert sorted(events) == [(0, False), (0, True), (1, False), (1, True)]
@@ -0,0 +1,66 @@
+import io
+
+import pytest
+
+from episode import LevelFormatError, LevelUsage, describe_usage, scan_lvl, scan_lvlx
+from test_remap import LEVEL
+
+
+def make_lvl(version, blocks, bgos):
+    """A legacy SMBX level with the given (x, y, ID) blocks and BGOs, and every other field set to 0."""
+    section_length = 9 + (version >= 1) + (version >= 30) + (version >= 2)
+    lines = [str(version)] + ['0'] * ((version >= 17) + (version >= 60) + (21 if version >= 8 else 6) * section_length
+                                      + 2 * 4)
+    block_length = 7 + (version >= 61) + (version >= 10) + 3 * (version >= 14)
+    for (x, y, tile_id) in blocks:
+        lines += [str(x), str(y), '32', '32', str(tile_id)] + ['0'] * (block_length - 5)
+    lines.append('"next"')
+    for (x, y, tile_id) in bgos:
+        lines += [str(x), str(y), str(tile_id)] + ['"Default"'] * (version >= 10)
+    lines.append('"next"')
+    lines.append('"next"')  # The NPCs, which are not counted
+    return ('\r\n'.join(lines) + '\r\n').encode()
+
+
+def test_scan_lvlx():
+    counts = scan_lvlx(io.BytesIO(LEVEL))
+    assert counts == {'Block': {1: 2, 2: 1, 3: 1}, 'BGO': {1: 1, 2: 1}}  # The NPC and the title are not counted.
+
+
+@pytest.mark.parametrize('version', [64, 58, 20, 8, 1])
+def test_scan_lvl(version):
+    level = make_lvl(version, [(0, 0, 5), (32, 0, 5), (64, 0, 12)], [(0, 32, 3)])
+    assert scan_lvl(io.BytesIO(level)) == {'Block': {5: 2, 12: 1}, 'BGO': {3: 1}}
+    assert scan_lvl(io.BytesIO(make_lvl(version, [], []))) == {'Block': {}, 'BGO': {}}
+
+
+def test_scan_lvl_rejects_bad_levels():
+    with pytest.raises(LevelFormatError):
+        scan_lvl(io.BytesIO(b'not a level\r\n'))
+    with pytest.raises(LevelFormatError):
+        scan_lvl(io.BytesIO(make_lvl(64, [(0, 0, 5)], [])[:-40]))  # Ends too early
+    with pytest.raises(LevelFormatError):
+        scan_lvl(io.BytesIO(make_lvl(64, [(0, 0, 5)], []).replace(b'32\r\n32\r\n5', b'32\r\n"x"\r\n5')))
+
+
+def test_level_usage(tmp_path):
+    (tmp_path / 'a.lvlx').write_bytes(LEVEL)
+    (tmp_path / 'b.lvl').write_bytes(make_lvl(64, [(0, 0, 1)], [(0, 0, 9)]))
+    (tmp_path / 'broken.lvl').write_bytes(b'?')
+    (tmp_path / 'notes.txt').write_bytes(LEVEL)
+    usage = LevelUsage(str(tmp_path))
+    usage.refresh()
+    assert usage.scanned == 3
+    assert usage.usage['Block'][1] == {'a.lvlx': 2, 'b.lvl': 1}
+    assert usage.usage['BGO'] == {1: {'a.lvlx': 1}, 2: {'a.lvlx': 1}, 9: {'b.lvl': 1}}
+    assert list(usage.errors) == ['broken.lvl']
+    assert describe_usage(usage.usage['Block'][1]) == 'Placed 3 times in 2 levels'
+    assert describe_usage(usage.usage['Block'].get(99)) == 'Not placed in any level'
+
+    usage.refresh()
+    assert usage.scanned == 0
+    (tmp_path / 'broken.lvl').unlink()
+    (tmp_path / 'b.lvl').write_bytes(make_lvl(64, [(0, 0, 1), (0, 32, 1)], []))
+    usage.refresh()
+    assert usage.scanned == 1 and usage.errors == {}
+    assert usage.usage['Block'][1] == {'a.lvlx': 2, 'b.lvl': 2} and 9 not in usage.usage['BGO']
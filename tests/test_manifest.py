@@ -0,0 +1,76 @@
+import os
+
+from PIL import Image
+
+from exporter import ExportManifest, ExportReport, export_sheet
+from tilesets import load_tileset, make_tileset, save_tileset, tile
+
+
+def test_unchanged_files_are_not_written_again(tmp_path):
+    sheet = make_tileset(tmp_path)
+    report = export_sheet(sheet)
+    assert (report.files_written, report.files_unchanged, report.images_encoded) == (10, 0, 4)
+    mtimes = {name: os.stat(tmp_path / 'tiles' / name).st_mtime_ns for name in os.listdir(tmp_path / 'tiles')}
+
+    report = export_sheet(sheet)
+    assert (report.files_written, report.files_unchanged, report.files_removed) == (0, 10, 0)
+    assert report.images_encoded == 0
+    del mtimes[ExportManifest.file_name]
+    assert all(os.stat(tmp_path / 'tiles' / name).st_mtime_ns == t for (name, t) in mtimes.items())
+
+    report = export_sheet(sheet, full=True)
+    assert (report.files_written, report.files_unchanged) == (10, 0)
+
+
+def test_changed_and_missing_files_are_written(tmp_path):
+    sheet = make_tileset(tmp_path)
+    export_sheet(sheet)
+    block = f"block-{load_tileset(sheet)['tiles'][0]['assigned_id']}"
+    os.remove(tmp_path / 'tiles' / f'{block}.txt')
+    image = Image.open(sheet)
+    image.paste((0, 0, 0, 255), (0, 0, 4, 4))  # Only the first tile's image changes.
+    image.save(sheet)
+
+    report = export_sheet(sheet)
+    assert (report.files_written, report.files_unchanged, report.images_encoded) == (2, 8, 1)
+    assert os.path.exists(tmp_path / 'tiles' / f'{block}.txt')
+
+
+def test_files_of_removed_tiles_are_deleted(tmp_path):
+    sheet = make_tileset(tmp_path)
+    export_sheet(sheet)
+    file_data = load_tileset(sheet)
+    removed = f"background-{file_data['tiles'][3]['assigned_id']}"
+    (tmp_path / 'tiles' / 'notes.txt').write_text('Not written by the export')
+    file_data['tiles'] = file_data['tiles'][:3] + [tile(0, 1, assigned_id=file_data['tiles'][0]['assigned_id'] + 100)]
+    save_tileset(sheet, file_data)
+
+    report = export_sheet(sheet)
+    assert report.files_removed == 3
+    files = os.listdir(tmp_path / 'tiles')
+    assert f'{removed}.png' not in files and f'{removed}.txt' not in files
+    assert 'Imported Tileset (BGOs).tileset.ini' not in files  # There are no BGOs left.
+    assert 'notes.txt' in files  # Files the export never wrote are left alone.
+
+
+def test_skipped_files_keep_their_last_export(tmp_path):
+    (tmp_path / 'block-1.png').write_bytes(b'old')
+    manifest = ExportManifest(str(tmp_path), ExportReport())
+    manifest.needs_update('block-1.png', 'a')
+    manifest.needs_update('block-2.png', 'b')
+    manifest.save()
+
+    report = ExportReport()
+    manifest = ExportManifest(str(tmp_path), report)
+    assert manifest.needs_update('block-1.png', 'changed')
+    assert manifest.needs_update('block-2.png', 'b')  # Unchanged, but missing from the directory
+    manifest.skip('block-1.png')
+    manifest.skip('block-2.png')
+    assert report.files_written == 0
+    manifest.remove_orphans()
+    manifest.save()
+
+    # The old file is still there, and the next export tries again.
+    assert (tmp_path / 'block-1.png').read_bytes() == b'old'
+    assert ExportManifest.load(str(tmp_path)) == {'block-1.png': 'a', 'block-2.png': 'b'}
+    assert ExportManifest(str(tmp_path), ExportReport()).needs_update('block-1.png', 'changed')
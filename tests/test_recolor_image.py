@@ -0,0 +1,20 @@
+"""The NumPy version of recolor_image must give exactly the same pixels as the version used without NumPy."""
+import random
+
+import pytest
+
+import exporter
+from images import assert_same_image, random_image, without_numpy
+
+pytest.importorskip('numpy')
+
+
+def test_recolor_image(monkeypatch):
+    rng = random.Random(0)
+    image = random_image(rng, (20, 20), colors=6)
+    colors = sorted({c[:3] for (_, c) in image.getcolors()})
+    # Swap two colors, replace a third, and replace one that is not in the image.
+    table = tuple(sorted([(colors[0], colors[1]), (colors[1], colors[0]), (colors[2], colors[3]),
+                          ((1, 2, 3), colors[4])]))
+    expected = without_numpy(monkeypatch, exporter.recolor_image, image, table)
+    assert_same_image(exporter.recolor_image(image, table), expected)
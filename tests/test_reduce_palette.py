@@ -0,0 +1,21 @@
+"""The NumPy version of reduce_palette must give exactly the same image as the version used without NumPy."""
+import random
+
+import pytest
+
+import exporter
+from images import assert_same_image, random_image, without_numpy
+
+pytest.importorskip('numpy')
+
+
+@pytest.mark.parametrize('mode', ['RGBA', 'RGB'])
+def test_reduce_palette(monkeypatch, mode):
+    rng = random.Random(mode)
+    for colors in (1, 2, 100, 256, 300):
+        image = random_image(rng, (24, 17), mode, colors)
+        expected = without_numpy(monkeypatch, exporter.reduce_palette, image)
+        reduced = exporter.reduce_palette(image)
+        assert_same_image(reduced, expected)
+        assert reduced.info == expected.info
+        assert reduced.convert('RGBA').tobytes() == image.convert('RGBA').tobytes()
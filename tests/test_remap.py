@@ -0,0 +1,150 @@
+import io
+import json
+import os
+import stat
+
+import cli
+from episode import remap_level, remap_levels, remap_lvlx, scan_lvlx
+from exporter import get_pending_remap, set_pending_remap
+from tilesets import load_tileset, make_tileset, tile
+
+LEVEL = (b'HEAD\r\n'
+         b'TL:"ID:1; in the title";\r\n'
+         b'HEAD_END\r\n'
+         b'BLOCK\r\n'
+         b'ID:1;X:0;Y:0;W:32;H:32;\r\n'
+         b'ID:2;X:32;Y:0;W:32;H:32;LR:"ID:2;";\r\n'
+         b'X:64;ID:3;Y:0;W:32;H:32;\r\n'
+         b'ID:1;X:96;Y:0;W:32;H:32;\r\n'
+         b'BLOCK_END\r\n'
+         b'BGO\r\n'
+         b'ID:1;X:0;Y:32;\r\n'
+         b'ID:2;X:32;Y:32;\r\n'
+         b'BGO_END\r\n'
+         b'NPC\r\n'
+         b'ID:1;X:0;Y:64;\r\n'
+         b'NPC_END\r\n')
+
+
+def remap(level, mapping, diff=None):
+    dst = io.BytesIO()
+    changed = remap_lvlx(io.BytesIO(level), dst, {'Block': {}, 'BGO': {}, **mapping}, diff)
+    return changed, dst.getvalue()
+
+
+def placed_ids(level):
+    counts = scan_lvlx(io.BytesIO(level))
+    return {tile_type: dict(c) for (tile_type, c) in counts.items()}
+
+
+def test_swap():
+    (changed, level) = remap(LEVEL, {'Block': {1: 2, 2: 1}})
+    assert changed == 3
+    assert placed_ids(level)['Block'] == {2: 2, 1: 1, 3: 1}
+    assert placed_ids(level)['BGO'] == {1: 1, 2: 1}
+    # Swapping back gives the level that was started with.
+    assert remap(level, {'Block': {1: 2, 2: 1}})[1] == LEVEL
+
+
+def test_chain():
+    (changed, level) = remap(LEVEL, {'Block': {1: 2, 2: 3, 3: 4}})
+    assert changed == 4
+    assert placed_ids(level)['Block'] == {2: 2, 3: 1, 4: 1}
+
+
+def test_only_ids_change():
+    (_, level) = remap(LEVEL, {'Block': {1: 1000, 3: 5}, 'BGO': {2: 9}})
+    assert level == LEVEL.replace(b'ID:1;X:0;Y:0;', b'ID:1000;X:0;Y:0;') \
+        .replace(b'ID:1;X:96', b'ID:1000;X:96') \
+        .replace(b'X:64;ID:3;', b'X:64;ID:5;') \
+        .replace(b'ID:2;X:32;Y:32;', b'ID:9;X:32;Y:32;')
+
+
+def test_other_sections_and_strings_are_left_alone():
+    (changed, level) = remap(LEVEL, {'Block': {2: 7}})
+    assert changed == 1
+    assert b'LR:"ID:2;"' in level  # Inside a string
+    assert b'ID:2;X:32;Y:32;' in level  # A BGO
+    (changed, level) = remap(LEVEL, {'BGO': {1: 7}})
+    assert changed == 1
+    assert b'TL:"ID:1; in the title"' in level and b'ID:1;X:0;Y:64;' in level  # The header and an NPC
+
+
+def test_diff():
+    diff = []
+    remap(LEVEL, {'Block': {3: 5}}, diff)
+    assert diff == ['@@ -7 +7 @@\n', '-X:64;ID:3;Y:0;W:32;H:32;\n', '+X:64;ID:5;Y:0;W:32;H:32;\n']
+
+
+def test_remap_level(tmp_path):
+    path = tmp_path / 'level.lvlx'
+    path.write_bytes(LEVEL)
+    os.chmod(path, 0o640)
+    mapping = {'Block': {1: 2, 2: 1}, 'BGO': {}}
+
+    (changed, diff, error) = remap_level(str(path), mapping, dry_run=True)
+    assert (changed, error) == (3, None)
+    assert diff[:2] == ['--- level.lvlx\n', '+++ level.lvlx\n'] and len(diff) == 2 + 3 * 3
+    assert path.read_bytes() == LEVEL
+    assert os.listdir(tmp_path) == ['level.lvlx']
+
+    assert remap_level(str(path), mapping) == (3, [], None)
+    assert path.read_bytes() == remap(LEVEL, mapping)[1]
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert os.listdir(tmp_path) == ['level.lvlx']
+
+
+def test_remap_levels_only_changes_the_given_levels(tmp_path):
+    for name in ('a.lvlx', 'b.lvlx'):
+        (tmp_path / name).write_bytes(LEVEL)
+    mapping = {'Block': {1: 2, 2: 1}, 'BGO': {}}
+
+    report = remap_levels(str(tmp_path), mapping, levels={'b.lvlx'})
+    assert report.levels == {'b.lvlx': 3} and report.errors == {}
+    assert (tmp_path / 'a.lvlx').read_bytes() == LEVEL
+
+    report = remap_levels(str(tmp_path), mapping, levels={'a.lvlx'})
+    assert report.levels == {'a.lvlx': 3}
+    assert (tmp_path / 'a.lvlx').read_bytes() == (tmp_path / 'b.lvlx').read_bytes()
+
+
+def test_pending_remap_is_saved_and_cleared():
+    file_data = {}
+    mapping = {'Block': {1: 2, 2: 1}, 'BGO': {5: 6}}
+    assert not set_pending_remap(file_data, mapping, {})
+    assert file_data == {}
+    assert set_pending_remap(file_data, mapping, {'b.lvlx': 'Permission denied', 'a.lvlx': 'Permission denied'})
+    assert file_data['pending_remap']['levels'] == ['a.lvlx', 'b.lvlx']
+    file_data = json.loads(json.dumps(file_data))  # As if saved and loaded again
+    assert get_pending_remap(file_data) == (mapping, {'a.lvlx', 'b.lvlx'})
+    assert not set_pending_remap(file_data, mapping, ['a.lvlx', 'b.lvlx'])
+    assert set_pending_remap(file_data, mapping, [])
+    assert file_data == {} and get_pending_remap(file_data) is None
+    assert get_pending_remap({'pending_remap': {'Block': [[1, 'x']], 'levels': []}}) is None
+
+
+def test_remap_command_retries_the_levels_it_could_not_change(tmp_path, capsys):
+    sheet = make_tileset(tmp_path, episode_path='.', start_high=True, block_ids='1-3;100-102', bgo_ids='1-2',
+                         tiles=[tile(0, 0, assigned_id=1), tile(1, 0, assigned_id=2), tile(2, 0, assigned_id=3),
+                                tile(3, 0, tile_type='BGO', assigned_id=1)])
+    for name in ('a.lvlx', 'b.lvlx'):
+        (tmp_path / name).write_bytes(LEVEL)
+    (tmp_path / 'b.lvlx.tmp').mkdir()  # So b.lvlx cannot be written
+
+    assert cli.main(['remap', sheet, '-j', '1']) == 1
+    (out, err) = capsys.readouterr()
+    assert 'Run this again' in err
+    file_data = load_tileset(sheet)
+    ids = [t['assigned_id'] for t in file_data['tiles']]
+    assert ids == [102, 101, 100, 2]
+    assert file_data['pending_remap']['levels'] == ['b.lvlx']
+    assert placed_ids((tmp_path / 'a.lvlx').read_bytes())['Block'] == {102: 2, 101: 1, 100: 1}
+    assert (tmp_path / 'b.lvlx').read_bytes() == LEVEL
+
+    # Only the level that failed is changed, with the same mapping, and the tiles keep their IDs.
+    (tmp_path / 'b.lvlx.tmp').rmdir()
+    assert cli.main(['remap', sheet, '-j', '1']) == 0
+    assert 'Retried the 1 levels' in capsys.readouterr().out
+    file_data = load_tileset(sheet)
+    assert [t['assigned_id'] for t in file_data['tiles']] == ids and 'pending_remap' not in file_data
+    assert (tmp_path / 'b.lvlx').read_bytes() == (tmp_path / 'a.lvlx').read_bytes()
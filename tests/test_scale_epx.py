@@ -0,0 +1,19 @@
+"""The NumPy version of scale_epx must give exactly the same pixels as the version used without NumPy."""
+import random
+
+import pytest
+
+import exporter
+from images import assert_same_image, random_image, without_numpy
+
+pytest.importorskip('numpy')
+
+
+@pytest.mark.parametrize('mode', ['RGBA', 'RGB', 'P', 'L'])
+@pytest.mark.parametrize('n', [2, 3])
+def test_scale_epx(monkeypatch, mode, n):
+    rng = random.Random(f'{mode}{n}')
+    for size in ((1, 1), (1, 5), (7, 3), (16, 16)):
+        image = random_image(rng, size, mode, colors=rng.choice([2, 3, 5]))
+        expected = without_numpy(monkeypatch, exporter.scale_epx, image, n)
+        assert_same_image(exporter.scale_epx(image, n), expected)
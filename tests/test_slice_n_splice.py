@@ -0,0 +1,23 @@
+"""The NumPy version of _slice_n_splice must give exactly the same pixels as the version used without NumPy."""
+import random
+
+import pytest
+
+from images import assert_same_image, random_image, without_numpy
+from tiledata import TileData
+
+pytest.importorskip('numpy')
+
+
+@pytest.mark.parametrize('grid_size, grid_padding', [((16, 16), 1), ((16, 16), 4), ((8, 16), 2), ((32, 8), 3)])
+def test_slice_n_splice(monkeypatch, grid_size, grid_padding):
+    rng = random.Random(f'{grid_size}{grid_padding}')
+    (grid_w, grid_h) = grid_size
+    for (cols, rows) in ((1, 1), (3, 2), (4, 5)):
+        w = cols * (grid_w + grid_padding)
+        h = rows * (grid_h + grid_padding)
+        # Tiles at the edge of the tileset image may be missing their last padding, or have a partial cell after it.
+        for (dw, dh) in ((0, 0), (-grid_padding, -grid_padding), (-grid_padding, 0), (grid_w // 2, 1)):
+            image = random_image(rng, (w + dw, h + dh), colors=256)
+            expected = without_numpy(monkeypatch, TileData._slice_n_splice, image, grid_size, grid_padding)
+            assert_same_image(TileData._slice_n_splice(image, grid_size, grid_padding), expected)
@@ -0,0 +1,57 @@
+import os
+import zipfile
+
+import pytest
+
+from exporter import ZipSink, export_sheet
+from tilesets import make_tileset
+
+
+def test_export_to_zip(tmp_path):
+    sheet = make_tileset(tmp_path, export_zip=True)
+    report = export_sheet(sheet)
+    assert report.files_written == 10
+    assert sorted(os.listdir(tmp_path)) == ['tiles.png', 'tiles.tileset.json', 'tiles.zip']
+    with zipfile.ZipFile(tmp_path / 'tiles.zip') as z:
+        infos = {i.filename: i for i in z.infolist()}
+    assert len(infos) == 10 and '.export-manifest.json' not in infos
+    for (name, info) in infos.items():
+        assert info.compress_type == (zipfile.ZIP_STORED if name.endswith('.png') else zipfile.ZIP_DEFLATED)
+
+
+def test_archive_is_replaced_only_when_complete(tmp_path):
+    path = str(tmp_path / 'tiles.zip')
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('old.txt', 'old')
+
+    sink = ZipSink(path)
+    sink.write('new.txt', 'new')
+    assert os.path.exists(path + '.tmp')
+    with zipfile.ZipFile(path) as z:
+        assert z.namelist() == ['old.txt']  # Still the old archive while the new one is being written
+    sink.discard()
+    assert os.listdir(tmp_path) == ['tiles.zip']
+    with zipfile.ZipFile(path) as z:
+        assert z.namelist() == ['old.txt']
+
+    sink = ZipSink(path)
+    sink.write('new.txt', 'new')
+    sink.close()
+    assert os.listdir(tmp_path) == ['tiles.zip']
+    with zipfile.ZipFile(path) as z:
+        assert z.read('new.txt') == b'new' and z.namelist() == ['new.txt']
+
+
+def test_failed_export_keeps_the_old_archive(tmp_path):
+    # The second target cannot be created, since its directory would be inside a file.
+    (tmp_path / 'blocked').write_text('')
+    sheet = make_tileset(tmp_path, export_zip=True,
+                         export_targets=[{'name': 'SMBX2'}, {'name': 'Other', 'path': 'blocked/other.zip'}])
+    with zipfile.ZipFile(tmp_path / 'tiles.zip', 'w') as z:
+        z.writestr('old.txt', 'old')
+
+    with pytest.raises(OSError):
+        export_sheet(sheet)
+    assert sorted(os.listdir(tmp_path)) == ['blocked', 'tiles.png', 'tiles.tileset.json', 'tiles.zip']
+    with zipfile.ZipFile(tmp_path / 'tiles.zip') as z:
+        assert z.namelist() == ['old.txt']
@@ -0,0 +1,44 @@
+"""Small tilesets written to a temporary directory, for tests that export them."""
+import json
+
+from PIL import Image
+
+# A distinct color for each 16x16 cell of the tileset image
+COLORS = [(200, 40, 40, 255), (40, 200, 40, 255), (40, 40, 200, 255), (200, 200, 40, 255),
+          (40, 200, 200, 255), (200, 40, 200, 255), (120, 120, 120, 255), (250, 250, 250, 128)]
+
+
+def make_tileset(directory, name='tiles', tiles=None, **settings):
+    """
+    Write a tileset image of 4x2 16x16 cells and its .tileset.json file.
+    :param directory: The directory to write them to.
+    :param tiles: The tiles' saved data. Defaults to three blocks and a BGO in the top row.
+    :param settings: Tileset settings to save. The pixel scale is 1 unless one is given.
+    :return: The path of the tileset image.
+    """
+    image = Image.new('RGBA', (64, 32))
+    for (i, color) in enumerate(COLORS):
+        image.paste(color, ((i % 4) * 16, (i // 4) * 16, (i % 4) * 16 + 16, (i // 4) * 16 + 16))
+    sheet = directory / f'{name}.png'
+    image.save(sheet)
+    if tiles is None:
+        tiles = [tile(0, 0), tile(1, 0), tile(2, 0), tile(3, 0, tile_type='BGO')]
+    save_tileset(sheet, dict({'pixel_scale': '1', 'tiles': tiles}, **settings))
+    return str(sheet)
+
+
+def tile(x, y, **data):
+    """The saved data of a tile covering the 16x16 cell at column <x>, row <y>."""
+    return {'x1': x * 16, 'y1': y * 16, 'x2': x * 16 + 16, 'y2': y * 16 + 16, **data}
+
+
+def load_tileset(sheet):
+    """Read the .tileset.json file of a tileset image."""
+    with open(str(sheet).replace('.png', '.tileset.json')) as f:
+        return json.load(f)
+
+
+def save_tileset(sheet, file_data):
+    """Write the .tileset.json file of a tileset image."""
+    with open(str(sheet).replace('.png', '.tileset.json'), 'w') as f:
+        json.dump(file_data, f)
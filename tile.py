@@ -11,6 +11,8 @@ from typing import Union
 
 from PIL import Image, ImageTk
 
+from tiledata import TileData, defaults
+
 
 def resource_path(relative_path):
     if hasattr(sys, '_MEIPASS'):
@@ -82,121 +84,8 @@ tile_draw_functions = {
     'Passthrough': draw_passthrough,
 }
 
-# -------------------------------
-# Defaults
-# -------------------------------
-
-defaults = {
-    # General information
-    'tile_type': 'Block',
-    'tile_id': '',
-    'tile_name': '',
-    'tile_description': '',
-    'grid_size': (32, 32),    # The grid size as the tile was created (only used if grid_padding is nonzero)
-    'grid_padding': 0,  # The grid padding as the tile was created (used w/grid_size in _slice_n_splice)
-
-    # Animation
-    'frames': '1',
-    'framespeed': '8',
-
-    # Light
-    'no_shadows': False,
-    'light_source': False,
-    'lightoffsetx': '0',
-    'lightoffsety': '0',
-    'lightradius': '128',
-    'lightbrightness': '1',
-    'lightcolor': '#ffffff',
-    'lightflicker': False,
-
-    # BGO Exclusive
-    'priority': '-85',
-
-    # Behavior (Block Exclusive)
-    'collision_type': 'Solid ■',
-    'content_type': 'Empty',
-    'content_id': '1',
-    'smashable': '0',
-    'playerfilter': '0',
-    'npcfilter': '0',
-
-    'sizable': False,
-    'pswitchable': False,
-    'slippery': False,
-    'lava': False,
-    'bumpable': False,
-    'customhurt': False,
-    'ediblebyvine': False,
-    'walkpaststair': False,
-}
-
-# Settings to be checked for all tiles
-unconditional_settings = ['tile_type', 'tile_id', 'tile_name', 'tile_description', 'frames', 'framespeed', 'no_shadows',
-                          'light_source', 'grid_size', 'grid_padding']
-# Settings for light sources only
-light_settings = ['lightoffsetx', 'lightoffsety', 'lightradius', 'lightbrightness', 'lightcolor', 'lightflicker']
-# Settings for BGOs only
-bgo_settings = ['priority']
-# Settings for Blocks only
-block_settings = ['collision_type', 'content_type', 'smashable', 'playerfilter', 'npcfilter', 'sizable', 'pswitchable',
-                  'slippery', 'lava', 'bumpable', 'customhurt', 'ediblebyvine', 'walkpaststair']
-content_settings = ['content_id']
-# All settings (for load) -- currently unused
-# all_settings = ['tile_type', 'tile_id', 'frames', 'framespeed', 'no_shadows', 'light_source', 'lightoffsetx',
-#                 'lightoffsety', 'lightradius', 'lightbrightness', 'lightcolor', 'lightflicker', 'priority',
-#                 'collision_type', 'content_type', 'smashable', 'playerfilter', 'npcfilter', 'sizable', 'pswitchable',
-#                 'slippery', 'lava', 'bumpable', 'customhurt', 'ediblebyvine', 'content_id']
-
-# -------------------------------
-# Tile Export Rules
-# -------------------------------
-
-
-def export_rule_default(key, value):
-    if type(value) == bool:
-        value = str(value).lower()
-    return f'{key} = {value}'
-
-
-def export_rule_non_empty(key, value):
-    if value == '':
-        return ''
-    return export_rule_default(key, value) + '\n'
-
-
-legacy_to_new_collision_type = {
-    "Solid": "Solid ■",
-    "Slope ◢": "Solid ◢",
-    "Slope ◣": "Solid ◣",
-    "Slope ◥": "Solid ◥",
-    "Slope ◤": "Solid ◤",
-    "Semisolid": "Semisolid ■"
-}
-export_rules_collision_type = {
-    # Need to cover all these fields to override any default behavior
-    "Solid ■": 'semisolid = false\npassthrough = false\nfloorslope = 0\nceilingslope = 0\n',
-    "Solid ◢": 'semisolid = false\npassthrough = false\nfloorslope = -1\nceilingslope = 0\n',
-    "Solid ◣": 'semisolid = false\npassthrough = false\nfloorslope = 1\nceilingslope = 0\n',
-    "Solid ◥": 'semisolid = false\npassthrough = false\nfloorslope = 0\nceilingslope = 1\n',
-    "Solid ◤": 'semisolid = false\npassthrough = false\nfloorslope = 0\nceilingslope = -1\n',
-    "Semisolid ■": 'semisolid = true\npassthrough = false\nfloorslope = 0\nceilingslope = 0\n',
-    "Semisolid ◢": 'semisolid = true\npassthrough = false\nfloorslope = -1\nceilingslope = 0\n',
-    "Semisolid ◣": 'semisolid = true\npassthrough = false\nfloorslope = 1\nceilingslope = 0\n',
-    "Passthrough": 'semisolid = false\npassthrough = true\nfloorslope = 0\nceilingslope = 0\n',
-}
-export_rules = {  # Fields without rules here will just use the default
-    'no_shadows': lambda value: export_rule_default('noshadows', value) + '\n',
-    'collision_type': lambda value: export_rules_collision_type[value],
-    'content_id_npc': lambda value: f'default-npc-content = {int(value) + 1000}\n',
-    'slippery': lambda value: f'default-slippery = {1 if value else 0}\n',
-    'tile_name': lambda value: export_rule_non_empty('name', value),
-    'tile_description': lambda value: export_rule_non_empty('description', value),
-}
-# These properties do not need to be written to the .txt file
-export_excluded = {'tile_type', 'tile_id', 'content_type', 'light_source', 'grid_size', 'grid_padding'}
-
 
-class Tile:
+class Tile(TileData):
 
     def apply_tile_settings(self, tile_data):
         """
@@ -256,6 +145,12 @@ class Tile:
         if self.bad_field_count == 0:
             self.redraw()
 
+    def set_duplicate_id(self, duplicate):
+        """Show or hide the error indicator for sharing an ID with another tile."""
+        if duplicate != self.duplicate_id:
+            self.duplicate_id = duplicate
+            self.redraw()
+
     def draw_type(self, tile_type=None, collision_type=None, **kwargs):
         """Draw a little picture showing the Tile's type"""
         tile_data = self.data
@@ -323,7 +218,7 @@ class Tile:
             self.color = color
 
         self.error_indicator = self.draw_error_indicator()
-        if self.bad_field_count > 0:
+        if self.bad_field_count > 0 or self.duplicate_id:
             self.canvas.itemconfigure(self.error_indicator, state=NORMAL)
         else:
             self.canvas.itemconfigure(self.error_indicator, state=HIDDEN)
@@ -351,19 +246,6 @@ class Tile:
         (ox1, oy1, ox2, oy2) = self.canvas.coords(bbox)
         return sx2 > ox1 and sx1 < ox2 and sy2 > oy1 and sy1 < oy2
 
-    @staticmethod
-    def _collect_non_default_data(keys, data, save_data):
-        """
-        Collect the non-default data values stored at <data>[<keys>] into <save_data>
-        :param keys: The keys to check and possibly copy over
-        :param data: All the Tile's data
-        :param save_data: The data that will be encoded to .json and written to the save file
-        :return:
-        """
-        for k in keys:
-            if data[k] != defaults[k]:
-                save_data[k] = data[k]
-
     def load_to_ui(self, ui_data, ui_inputs):
         """Load the Tile's data to the UI"""
         data = self.data
@@ -373,96 +255,13 @@ class Tile:
                 if k in ui_inputs:
                     ui_inputs[k].check_variable()
 
-    def get_save_ready_data(self):
-        """
-        Convert the tile's data into a dict object that is ready to be written to a .json file
-        :return: A dict containing all non-default configurations.
-        """
-        data = self.data
-        save_data = {}
-
-        (x1, y1, x2, y2) = self.canvas.coords(self.bounding_box)
-        save_data['x1'] = int(x1)
-        save_data['y1'] = int(y1)
-        save_data['x2'] = int(x2)
-        save_data['y2'] = int(y2)
-
-        self._collect_non_default_data(unconditional_settings, data, save_data)
-        if data['light_source']:
-            self._collect_non_default_data(light_settings, data, save_data)
-        if data['tile_type'] == 'Block':
-            self._collect_non_default_data(block_settings, data, save_data)
-            if data['content_type'] != 'Empty':
-                self._collect_non_default_data(content_settings, data, save_data)
-        else:
-            self._collect_non_default_data(bgo_settings, data, save_data)
-
-        if 'assigned_id' in data:
-            save_data['assigned_id'] = data['assigned_id']
-
-        return save_data
-
-    def assign_id(self, generated_id):
-        """
-        Assigns an ID to the Tile.
-        :param generated_id: The ID that will be assigned to the tile if the user did not provide one.
-        :return: The ID assigned.
-        """
-        data = self.data
-        if 'assigned_id' not in data:
-            data['assigned_id'] = int(data['tile_id']) if data['tile_id'] != '' else generated_id
-        return data['assigned_id']
-
-    def clear_assigned_id(self):
-        """Clear the tile's assigned ID field. Has no effect if this field is not set."""
-        self.data.pop('assigned_id', None)
-
-    @staticmethod
-    def _export_txt_property(key, value):
-        if key in export_excluded:
-            return ''
-
-        if key in export_rules:
-            return export_rules[key](value)
-        return export_rule_default(key, value) + '\n'
+    def get_bbox(self):
+        return tuple(self.canvas.coords(self.bounding_box))
 
-    @staticmethod
-    def _slice_n_splice(image, grid_size, grid_padding):
-        """
-        Cuts out the padded areas out of the image
-        :param image: The image to slice 'n' splice
-        :type image: PIL.Image.Image
-        """
-        w = image.width
-        h = image.height
-        grid_w = grid_size[0]
-        grid_h = grid_size[1]
-
-        new_img = Image.new('RGBA', ((w + grid_padding) // (grid_w + grid_padding) * grid_w,
-                                     (h + grid_padding) // (grid_h + grid_padding) * grid_h))
-
-        y = 0
-        pad_y = 0
-        while y + pad_y < h:
-            x = 0
-            pad_x = 0
-            while x + pad_x < w:
-                chunk = image.crop((x + pad_x, y + pad_y, x + grid_w + pad_x, y + grid_h + pad_y))
-                new_img.paste(chunk, (x, y, x + grid_w, y + grid_h))
-                x += grid_w
-                pad_x += grid_padding
-            y += grid_h
-            pad_y += grid_padding
-
-        return new_img
-
-    def _get_tile_image(self, image: Union[PhotoImage, Image.Image]):
+    def get_tile_image(self, image: Union[PhotoImage, Image.Image]):
         if isinstance(image, PhotoImage):
             image = ImageTk.getimage(image)
-        image = image.crop(self.canvas.coords(self.bounding_box))
-        if int(self.data['grid_padding']) > 0:
-            image = self._slice_n_splice(image, self.data['grid_size'], int(self.data['grid_padding']))
-        return image
+        return super().get_tile_image(image)
 
     def load_preview(self, window):
         """
@@ -470,7 +269,7 @@ class Tile:
         :param window: Tileset Importer window instance.
         :return: None
         """
-        image = self._get_tile_image(window.tileset_image)
+        image = self.get_tile_image(window.tileset_image)
         w = image.width
         h = image.height
         window.tile_preview_full_size = (w, h)
@@ -486,55 +285,6 @@ class Tile:
         window.tile_preview_size = (w, h)
         window.tile_animation_frame = -1
 
-    def export(self, image, path):
-        """
-        Export the tile to png and txt files for use in SMBX2.
-        :param image: The image containing the entire tileset
-        :type image: PIL.Image
-        :param path: The export path
-        """
-        data = self.data
-
-        tile_type = data['tile_type']
-        export_name = path + ('/block-' if tile_type == 'Block' else '/background-') \
-            + str(tile_id := data['assigned_id'])
-
-        # Export the image
-        # Easier than I thought it would be
-        image = self._get_tile_image(image)
-        image.save(export_name + '.png')
-
-        # Export the .txt file
-        with open(export_name + '.txt', 'w') as f:
-            if 751 <= tile_id <= 1000:
-                type_name = 'background' if data['tile_type'] == 'BGO' else 'block'
-                f.write(f'image = {type_name}-{tile_id}.png\n')
-            for k in unconditional_settings:
-                f.write(self._export_txt_property(k, data[k]))
-            tile_type_settings = bgo_settings if tile_type == 'BGO' else block_settings
-            if data['light_source']:
-                for k in light_settings:
-                    f.write(self._export_txt_property(k, data[k]))
-            for k in tile_type_settings:
-                f.write(self._export_txt_property(k, data[k]))
-            if tile_type == 'Block':
-                if (content_type := data['content_type']) == 'NPC':
-                    f.write(self._export_txt_property('content_id_npc', data['content_id']))
-                elif content_type == 'Coins':
-                    f.write(self._export_txt_property('content_id', data['content_id']))
-                else:  # To override blocks that originally had contents
-                    f.write(self._export_txt_property('content_id', 0))
-
-    def __getitem__(self, item):
-        return self.data[item]
-
-    def __setitem__(self, key, value):
-        self.data[key] = value
-
-    def __lt__(self, other):
-        """Used during .tileset.ini file creation. Compares Tiles based on their x-position in the canvas."""
-        return self.canvas.coords(self.bounding_box)[0] < other.canvas.coords(other.bounding_box)[0]
-
     def __init__(self, canvas, x1, y1, x2, y2, *, outline=None, width=None, scale=1, **kwargs):
         """
         CONSTRUCTOR
@@ -549,26 +299,7 @@ class Tile:
         """
         self.error_image = PhotoImage(file=resource_path('data/tile_error.png'))
 
-        # For backward compatibility with .tileset.json files created before v0.2.
-        if 'grid_size' in kwargs and type(old_val := kwargs['grid_size']) == int:
-            kwargs['grid_size'] = (old_val, old_val)
-
-        data = {}
-        for k in defaults.keys():
-            if k in kwargs:
-
-                # For backward compatibility with .tileset.json files created before v0.3.
-                if k == "collision_type" and kwargs[k] in legacy_to_new_collision_type:
-                    kwargs[k] = legacy_to_new_collision_type[kwargs[k]]
-
-                data[k] = kwargs[k]
-                del kwargs[k]  # Remove the key, so it won't be passed on to the Canvas items and cause an error
-            else:
-                data[k] = defaults[k]
-        if 'assigned_id' in kwargs:
-            data['assigned_id'] = kwargs['assigned_id']
-            del kwargs['assigned_id']
-        self.data = data
+        self.data = self.pop_tile_data(kwargs)
 
         self.color = outline or 'black'
         self.border_width = width or 3
@@ -582,6 +313,7 @@ class Tile:
         self.type_poly = self.draw_type(outline=self.color, width=self.border_width, **kwargs)
 
         self.bad_field_count = 0
+        self.duplicate_id = False  # True if another tile of the same type has the same ID
         self.error_indicator = None
         self.error_indicator = self.draw_error_indicator()
 
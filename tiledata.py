@@ -0,0 +1,770 @@
+"""
+Tile Data
+Contains the tileset and tile settings, and the parts of a Tile that do not need a window. Everything here can be used
+without importing tkinter, which lets tilesets be exported from the command line.
+"""
+import copy
+import os
+from functools import lru_cache
+
+import regex
+from PIL import Image, ImageChops
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional. Slower fallbacks are used without it.
+    numpy = None
+
+from intervalset import IntervalSet
+
+MAX_BLOCK_ID = 1393
+MAX_BGO_ID = 377
+MAX_NPC_ID = 723
+
+MIN_GRID_DIM = 8
+MAX_GRID_DIM = 128
+
+# -------------------------------
+# Tileset Defaults
+# -------------------------------
+
+data_defaults = {
+
+    # View
+
+    'grid_size': '16',
+    'grid_offset_x': '0',
+    'grid_offset_y': '0',
+    'grid_padding': '0',
+    'show_grid': True,
+    'highlight_color': '#ff0080',
+
+    # Export
+
+    'pixel_scale': '2',
+    'tileset_name': 'Imported Tileset',
+    'block_ids': 'Avoid Special',
+    'bgo_ids': 'Avoid Special',
+    'start_high': False,
+    'id_allocation': 'In Order',
+    'episode_path': '',  # The episode folder the tileset is used in, relative to the tileset image. Blank for none.
+    'create_pge_tileset': True,
+    'mixed_pge_tileset': False,
+    'create_sizables_script': False,
+    'export_zip': False,
+    'zip_store_images': True,
+    'png_profile': 'Balanced',
+    'export_thextech': False,
+    'export_scales': '',
+    'export_gif': False,
+    'export_variants': False,
+    'color_key': '',
+    'upscaler': 'Nearest',
+}
+
+tileset_fields = ['grid_size', 'grid_offset_x', 'grid_offset_y', 'grid_padding', 'show_grid', 'highlight_color',
+                  'pixel_scale', 'tileset_name', 'block_ids', 'bgo_ids', 'start_high', 'create_pge_tileset',
+                  'mixed_pge_tileset', 'create_sizables_script', 'export_zip', 'zip_store_images', 'png_profile',
+                  'export_thextech', 'export_scales', 'export_gif', 'export_variants', 'color_key', 'upscaler',
+                  'id_allocation', 'episode_path']
+
+# The ways tile images can be encoded, from the fastest to encode to the smallest files
+png_profiles = ('Fast', 'Balanced', 'Smallest')
+
+# The ways tile images can be scaled up to the pixel scale
+upscalers = ('Nearest', 'Scale2x', 'Scale3x')
+
+# The ways IDs can be chosen from the ID pools. See exporter.assign_ids.
+id_allocations = ('In Order', 'Contiguous Rows', 'Contiguous Tileset')
+
+built_in_id_lists = {
+    'Block': {
+        'Avoid Special': '1;3;6-25;27-29;38-54;56-59;61-87;91-108;113-114;116-168;182-191;194-223;227-266;270-279;'
+                         '284-370;372-403;407-419;421-427;432-456;488-525;527-597;599-619;630;635-638;1001-1005;'
+                         '1008-1072;1076-1101;1106-1132;1138-1141;1156-1267;1269-1270;1296-1305;1328-1329;1376-1377;'
+                         '1386-1393',
+        'User Slots': '751-1000',
+    },
+    'BGO': {
+        'Avoid Special': '1-10;14-34;36-59;62-69;75-86;89-91;93-97;99;101-103;106;108-133;147-159;161-173;187-190;232'
+                         '-279;281-303;304-326;328-353;367-377',
+        'User Slots': '751-1000',
+    }
+}
+
+# Ranges accepted for the numeric tileset settings. These match the limits of the inputs in the Export Settings panel.
+tileset_field_ranges = {
+    'grid_offset_x': (-128, 128),
+    'grid_offset_y': (-128, 128),
+    'grid_padding': (0, 8),
+    'pixel_scale': (1, 8),
+}
+
+# -------------------------------
+# Tile Defaults
+# -------------------------------
+
+defaults = {
+    # General information
+    'tile_type': 'Block',
+    'tile_id': '',
+    'tile_name': '',
+    'tile_description': '',
+    'grid_size': (32, 32),    # The grid size as the tile was created (only used if grid_padding is nonzero)
+    'grid_padding': 0,  # The grid padding as the tile was created (used w/grid_size in _slice_n_splice)
+
+    # Animation
+    'frames': '1',
+    'framespeed': '8',
+
+    # Light
+    'no_shadows': False,
+    'light_source': False,
+    'lightoffsetx': '0',
+    'lightoffsety': '0',
+    'lightradius': '128',
+    'lightbrightness': '1',
+    'lightcolor': '#ffffff',
+    'lightflicker': False,
+
+    # BGO Exclusive
+    'priority': '-85',
+
+    # Behavior (Block Exclusive)
+    'collision_type': 'Solid ■',
+    'content_type': 'Empty',
+    'content_id': '1',
+    'smashable': '0',
+    'playerfilter': '0',
+    'npcfilter': '0',
+
+    'sizable': False,
+    'pswitchable': False,
+    'slippery': False,
+    'lava': False,
+    'bumpable': False,
+    'customhurt': False,
+    'ediblebyvine': False,
+    'walkpaststair': False,
+}
+
+# Settings to be checked for all tiles
+unconditional_settings = ['tile_type', 'tile_id', 'tile_name', 'tile_description', 'frames', 'framespeed', 'no_shadows',
+                          'light_source', 'grid_size', 'grid_padding']
+# Settings for light sources only
+light_settings = ['lightoffsetx', 'lightoffsety', 'lightradius', 'lightbrightness', 'lightcolor', 'lightflicker']
+# Settings for BGOs only
+bgo_settings = ['priority']
+# Settings for Blocks only
+block_settings = ['collision_type', 'content_type', 'smashable', 'playerfilter', 'npcfilter', 'sizable', 'pswitchable',
+                  'slippery', 'lava', 'bumpable', 'customhurt', 'ediblebyvine', 'walkpaststair']
+content_settings = ['content_id']
+# All settings (for load) -- currently unused
+# all_settings = ['tile_type', 'tile_id', 'frames', 'framespeed', 'no_shadows', 'light_source', 'lightoffsetx',
+#                 'lightoffsety', 'lightradius', 'lightbrightness', 'lightcolor', 'lightflicker', 'priority',
+#                 'collision_type', 'content_type', 'smashable', 'playerfilter', 'npcfilter', 'sizable', 'pswitchable',
+#                 'slippery', 'lava', 'bumpable', 'customhurt', 'ediblebyvine', 'content_id']
+
+# Ranges accepted for the numeric tile fields. These match the limits of the inputs in the Tile Settings panel. None
+# means the field only has to be an integer.
+tile_field_ranges = {
+    'frames': (1, 1000),
+    'framespeed': (1, 100),
+    'lightoffsetx': (None, None),
+    'lightoffsety': (None, None),
+    'lightradius': (None, None),
+    'lightbrightness': (None, None),
+    'priority': (-100, 10),
+    'smashable': (0, 3),
+    'playerfilter': (-1, 16),
+    'npcfilter': (-1, 16),
+}
+
+# -------------------------------
+# Tile Export Rules
+# -------------------------------
+
+
+def export_bool(value):
+    """Format a value for a .txt file. Booleans are written in lowercase; anything else is written as is."""
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return value
+
+
+def export_non_empty(key):
+    """Make a rule that writes '<key> = <value>' only if the value is not empty."""
+    return lambda value: f'{key} = {value}\n' if value != '' else ''
+
+
+legacy_to_new_collision_type = {
+    "Solid": "Solid ■",
+    "Slope ◢": "Solid ◢",
+    "Slope ◣": "Solid ◣",
+    "Slope ◥": "Solid ◥",
+    "Slope ◤": "Solid ◤",
+    "Semisolid": "Semisolid ■"
+}
+export_rules_collision_type = {
+    # Need to cover all these fields to override any default behavior
+    "Solid ■": 'semisolid = false\npassthrough = false\nfloorslope = 0\nceilingslope = 0\n',
+    "Solid ◢": 'semisolid = false\npassthrough = false\nfloorslope = -1\nceilingslope = 0\n',
+    "Solid ◣": 'semisolid = false\npassthrough = false\nfloorslope = 1\nceilingslope = 0\n',
+    "Solid ◥": 'semisolid = false\npassthrough = false\nfloorslope = 0\nceilingslope = 1\n',
+    "Solid ◤": 'semisolid = false\npassthrough = false\nfloorslope = 0\nceilingslope = -1\n',
+    "Semisolid ■": 'semisolid = true\npassthrough = false\nfloorslope = 0\nceilingslope = 0\n',
+    "Semisolid ◢": 'semisolid = true\npassthrough = false\nfloorslope = -1\nceilingslope = 0\n',
+    "Semisolid ◣": 'semisolid = true\npassthrough = false\nfloorslope = 1\nceilingslope = 0\n',
+    "Passthrough": 'semisolid = false\npassthrough = true\nfloorslope = 0\nceilingslope = 0\n',
+}
+# Fields without rules here are written as '<field> = <value>'. Each rule is (data_key, template, convert): the value of
+# the tile's <data_key> setting is passed through <convert>, then put in place of the {} in <template>.
+export_rules = {
+    'no_shadows': ('no_shadows', 'noshadows = {}\n', export_bool),
+    'collision_type': ('collision_type', '{}', export_rules_collision_type.__getitem__),
+    'content_id_npc': ('content_id', 'default-npc-content = {}\n', lambda value: int(value) + 1000),
+    'content_id_none': (None, 'content_id = 0\n', None),  # To override blocks that originally had contents
+    'slippery': ('slippery', 'default-slippery = {}\n', lambda value: 1 if value else 0),
+    'tile_name': ('tile_name', '{}', export_non_empty('name')),
+    'tile_description': ('tile_description', '{}', export_non_empty('description')),
+}
+# These properties do not need to be written to the .txt file
+export_excluded = {'tile_type', 'tile_id', 'content_type', 'light_source', 'grid_size', 'grid_padding'}
+
+
+def get_export_rule(key):
+    """Get the export rule of a field. See export_rules."""
+    if key in export_rules:
+        return export_rules[key]
+    return key, f'{key} = {{}}\n', export_bool if type(defaults[key]) == bool else str
+
+
+class TxtSerializer:
+    """
+    Renders tiles' .txt files. The export rules of the fields are compiled into a single template when the serializer is
+    created, so rendering a file is a single str.format() call instead of a rule lookup for every field.
+    """
+
+    def render(self, data):
+        """
+        Render a tile's .txt file.
+        :param data: The tile's data
+        :return: The contents of the file, as a string.
+        """
+        return self.template.format(*[convert(data[key]) for (key, convert) in self.fields])
+
+    def __init__(self, keys, excluded=frozenset()):
+        """
+        CONSTRUCTOR
+        :param keys: The fields to write, in order. Fields in export_excluded are skipped.
+        :param excluded: More fields to skip, for export targets that do not use them.
+        """
+        template = []
+        fields = []
+        for k in keys:
+            if k in export_excluded or k in excluded:
+                continue
+            (data_key, piece, convert) = get_export_rule(k)
+            template.append(piece)
+            if data_key is not None:
+                fields.append((data_key, convert))
+        self.template = ''.join(template)
+        self.fields = tuple(fields)
+
+
+@lru_cache(maxsize=None)
+def get_txt_serializer(tile_type, light_source, content_type, excluded=frozenset()):
+    """
+    Get the serializer for tiles with the given settings. Each serializer is only compiled once.
+    :param excluded: Fields to leave out of the file, on top of those in export_excluded.
+    :type excluded: frozenset
+    :rtype: TxtSerializer
+    """
+    keys = list(unconditional_settings)
+    if light_source:
+        keys += light_settings
+    if tile_type == 'BGO':
+        keys += bgo_settings
+    else:
+        keys += block_settings
+        keys.append({'NPC': 'content_id_npc', 'Coins': 'content_id'}.get(content_type, 'content_id_none'))
+    return TxtSerializer(keys, excluded)
+
+
+# -------------------------------
+# Setting Parsers
+# -------------------------------
+
+
+def get_id_list_preset(value, tile_type):
+    """Convert an ID preset name into an ID list."""
+    if value in built_in_id_lists[tile_type]:
+        return built_in_id_lists[tile_type][value]
+    return value
+
+
+def parse_id_list(value, tile_type, check_valid_only=False):
+    """
+    Parse an ID list such as '1-3;37;48-50' (or the name of a preset) into an ID pool.
+    :param value: The ID list or preset name.
+    :param tile_type: 'Block' or 'BGO'. Used to look up presets.
+    :param check_valid_only: If True, only validate the list and do not build the pool.
+    :return: (True, pool) if the list is valid, (False, None) otherwise. The pool is an IntervalSet, so it takes up the
+    same memory however many IDs a range holds.
+    """
+    value = get_id_list_preset(value, tile_type)
+    if value == '' or regex.match(r'^(\d+(?:-\d+)?;?)+$', value) is None:
+        return False, None
+    ids = IntervalSet()
+    last_id = 0
+    for x in value.split(';'):
+        x_split = x.split('-')
+        lo = x_split[0]
+        if not lo.isdigit():
+            return False, None
+        lo = int(lo)
+        if lo <= last_id:
+            return False, None
+        hi = None
+        if len(x_split) == 2:
+            hi = int(x_split[1])
+        if hi is not None:
+            if hi <= lo:
+                return False, None
+            last_id = hi
+            if not check_valid_only:
+                ids.add_range(lo, hi)
+        else:
+            last_id = lo
+            if not check_valid_only:
+                ids.add(lo)
+    return True, ids
+
+
+def verify_grid_dimension(value):
+    return MIN_GRID_DIM <= value <= MAX_GRID_DIM
+
+
+@lru_cache(maxsize=5)
+def parse_grid_size(value):
+    """Parse a grid size such as '16' or '32x16'. Returns (w, h), or () if the value is not a valid grid size."""
+    if (m := regex.match(r'^(\d+)(?:x(\d+))?$', value)) is not None:
+        dims = m.groups()
+        if dims[1] is None:
+            if verify_grid_dimension(w := int(dims[0])):
+                return w, w
+            return ()
+        if verify_grid_dimension(w := int(dims[0])) and verify_grid_dimension(h := int(dims[1])):
+            return w, h
+        return ()
+    return ()
+
+
+def parse_color(value):
+    """
+    Parse a color written as #rrggbb.
+    :return: (r, g, b), or None if <value> is not a color.
+    """
+    if not isinstance(value, str) or regex.match(r'^#[0-9a-fA-F]{6}$', value) is None:
+        return None
+    return tuple(int(value[i:i + 2], 16) for i in (1, 3, 5))
+
+
+def good_color_key(value):
+    """Check whether <value> is a valid color key: a color written as #rrggbb, or blank for none."""
+    return value == '' or parse_color(value) is not None
+
+
+def parse_scale_list(value):
+    """
+    Parse a list of pixel scales to export at, such as '1;2;4'.
+    :return: The scales, in ascending order, or None if the list is not valid. An empty list gives (), which means the
+    tileset is only exported at its pixel scale.
+    """
+    if value == '':
+        return ()
+    if regex.match(r'^\d+(?:;\d+)*;?$', value) is None:
+        return None
+    (lo, hi) = tileset_field_ranges['pixel_scale']
+    scales = sorted({int(x) for x in value.split(';') if x != ''})
+    if not all(lo <= x <= hi for x in scales):
+        return None
+    return tuple(scales)
+
+
+_int_pattern = regex.compile(r'^-?\d+$')  # Compiled once; every field of every tile is checked before each export
+
+
+def _good_int(value, lo=None, hi=None):
+    """Check that <value> is an integer (int or numeric string) within [<lo>, <hi>]"""
+    if isinstance(value, str):
+        if _int_pattern.match(value) is None:
+            return False
+        value = int(value)
+    return (lo is None or value >= lo) and (hi is None or value <= hi)
+
+
+def good_tile_id(value, tile_type):
+    """Check whether <value> is a valid manually-assigned ID for a tile of type <tile_type>. Blank is valid."""
+    if value == '':
+        return True
+    if not _good_int(value):
+        return False
+
+    value = int(value)
+    return tile_type == 'Block' and 1 <= value <= MAX_BLOCK_ID \
+        or tile_type == 'BGO' and (1 <= value <= MAX_BGO_ID or 751 <= value <= 1000)
+
+
+def good_content_id(value, content_type):
+    """Check whether <value> is a valid content ID for a block with contents of type <content_type>"""
+    if value == '' or not _good_int(value):
+        return False
+
+    value = int(value)
+
+    if content_type == 'Empty':
+        return True  # Don't care what's in the box if it's locked.
+
+    return content_type == 'Coins' and 1 <= value <= 99 \
+        or content_type == 'NPC' and (1 <= value <= MAX_NPC_ID or 751 <= value <= 1000)
+
+
+def find_bad_tileset_fields(settings):
+    """
+    Find the tileset settings with bad values.
+    :param settings: The tileset settings, as they would be saved to the .tileset.json file.
+    :return: A list containing the name of each bad setting.
+    """
+    bad = [k for k, (lo, hi) in tileset_field_ranges.items() if not _good_int(settings[k], lo, hi)]
+    if parse_grid_size(settings['grid_size']) == ():
+        bad.append('grid_size')
+    if not parse_id_list(settings['block_ids'], 'Block', True)[0]:
+        bad.append('block_ids')
+    if not parse_id_list(settings['bgo_ids'], 'BGO', True)[0]:
+        bad.append('bgo_ids')
+    if settings['png_profile'] not in png_profiles:
+        bad.append('png_profile')
+    if settings['upscaler'] not in upscalers:
+        bad.append('upscaler')
+    if settings['id_allocation'] not in id_allocations:
+        bad.append('id_allocation')
+    if parse_scale_list(settings['export_scales']) is None:
+        bad.append('export_scales')
+    if not good_color_key(settings['color_key']):
+        bad.append('color_key')
+    return bad
+
+
+def find_bad_tile_fields(data):
+    """
+    Find the fields of a tile that have bad values. Only fields that would be exported are checked.
+    :param data: The tile's data
+    :return: A list containing the name of each bad field.
+    """
+    keys = ['frames', 'framespeed']
+    if data['light_source']:
+        keys += ['lightoffsetx', 'lightoffsety', 'lightradius', 'lightbrightness']
+    if data['tile_type'] == 'Block':
+        keys += ['smashable', 'playerfilter', 'npcfilter']
+    else:
+        keys += ['priority']
+
+    bad = [k for k in keys if not _good_int(data[k], *tile_field_ranges[k])]
+    if not good_tile_id(data['tile_id'], data['tile_type']):
+        bad.append('tile_id')
+    if data['tile_type'] == 'Block' and not good_content_id(data['content_id'], data['content_type']):
+        bad.append('content_id')
+    return bad
+
+
+# -------------------------------
+# Tileset Image
+# -------------------------------
+
+
+def apply_color_key(image, color):
+    """
+    Make every pixel of the color key transparent. Many tileset images use a solid background color, such as magenta,
+    instead of transparency. The whole image is masked at once, not one pixel at a time.
+    :type image: PIL.Image.Image
+    :param color: The color key, as (r, g, b).
+    :return: The image in RGBA mode, with the color key made transparent.
+    """
+    rgba = image.convert('RGBA')
+    if numpy is not None:
+        pixels = numpy.array(rgba)
+        pixels[(pixels[..., :3] == color).all(axis=-1), 3] = 0
+        return Image.fromarray(pixels, 'RGBA')
+
+    # Without NumPy, each channel is mapped to 255 where it matches the color key, and the three are multiplied.
+    (r, g, b, a) = rgba.split()
+    (r, g, b) = (ch.point([255 if v == c else 0 for v in range(256)]) for (ch, c) in zip((r, g, b), color))
+    key_mask = ImageChops.multiply(ImageChops.multiply(r, g), b)
+    rgba.putalpha(ImageChops.subtract(a, key_mask))
+    return rgba
+
+
+def read_sheet(path, color_key=''):
+    """
+    Load a tileset image and apply its color key, without caching it. See load_sheet.
+    :param path: The path of the tileset image.
+    :param color_key: The color to make transparent, as #rrggbb. Blank for none.
+    :rtype: PIL.Image.Image
+    :raises OSError: If the image cannot be read.
+    """
+    image = Image.open(path)
+    image.load()
+    if (color := parse_color(color_key)) is not None:
+        image = apply_color_key(image, color)
+    return image
+
+
+@lru_cache(maxsize=4)
+def _load_sheet(path, mtime, size, color_key):
+    """Load a tileset image. The modification time and size are only part of the cache key. See load_sheet."""
+    return read_sheet(path, color_key)
+
+
+def load_sheet(path, color_key=''):
+    """
+    Load a tileset image and apply its color key. The result is cached until the file or the color key changes, so
+    opening, previewing and exporting a tileset only decode and mask the image once. It must not be modified.
+    :param path: The path of the tileset image.
+    :param color_key: The color to make transparent, as #rrggbb. Blank for none.
+    :rtype: PIL.Image.Image
+    :raises OSError: If the image cannot be read.
+    """
+    stat = os.stat(path)
+    return _load_sheet(path, stat.st_mtime_ns, stat.st_size, color_key)
+
+
+class TileData:
+    """
+    The settings and bounds of a single tile. Tile extends this with everything needed to draw the tile on a canvas.
+    """
+
+    def get_bbox(self):
+        """
+        Get the bounds of the tile.
+        :return: (x1, y1, x2, y2), in pixels of the tileset image scaled by <self.scale>
+        """
+        return self.bbox
+
+    def snapshot(self):
+        """
+        Copy the tile's bounds and settings into a new TileData. The copy does not change when the tile is edited, and,
+        unlike a Tile, it can be used from threads other than the one running the window.
+        :rtype: TileData
+        """
+        return TileData(*self.get_bbox(), scale=self.scale, **copy.deepcopy(self.data))
+
+    @staticmethod
+    def _collect_non_default_data(keys, data, save_data):
+        """
+        Collect the non-default data values stored at <data>[<keys>] into <save_data>
+        :param keys: The keys to check and possibly copy over
+        :param data: All the Tile's data
+        :param save_data: The data that will be encoded to .json and written to the save file
+        :return:
+        """
+        for k in keys:
+            if data[k] != defaults[k]:
+                save_data[k] = data[k]
+
+    def get_save_ready_data(self):
+        """
+        Convert the tile's data into a dict object that is ready to be written to a .json file
+        :return: A dict containing all non-default configurations.
+        """
+        data = self.data
+        save_data = {}
+
+        (x1, y1, x2, y2) = self.get_bbox()
+        save_data['x1'] = int(x1)
+        save_data['y1'] = int(y1)
+        save_data['x2'] = int(x2)
+        save_data['y2'] = int(y2)
+
+        self._collect_non_default_data(unconditional_settings, data, save_data)
+        if data['light_source']:
+            self._collect_non_default_data(light_settings, data, save_data)
+        if data['tile_type'] == 'Block':
+            self._collect_non_default_data(block_settings, data, save_data)
+            if data['content_type'] != 'Empty':
+                self._collect_non_default_data(content_settings, data, save_data)
+        else:
+            self._collect_non_default_data(bgo_settings, data, save_data)
+
+        if 'assigned_id' in data:
+            save_data['assigned_id'] = data['assigned_id']
+
+        return save_data
+
+    def assign_id(self, generated_id):
+        """
+        Assigns an ID to the Tile.
+        :param generated_id: The ID that will be assigned to the tile if the user did not provide one.
+        :return: The ID assigned.
+        """
+        data = self.data
+        if 'assigned_id' not in data:
+            data['assigned_id'] = int(data['tile_id']) if data['tile_id'] != '' else generated_id
+        return data['assigned_id']
+
+    def clear_assigned_id(self):
+        """Clear the tile's assigned ID field. Has no effect if this field is not set."""
+        self.data.pop('assigned_id', None)
+
+    @staticmethod
+    def _slice_n_splice_pillow(image, grid_size, grid_padding):
+        """
+        Cuts out the padded areas out of the image, one grid cell at a time. Used when NumPy is not available.
+        :param image: The image to slice 'n' splice
+        :type image: PIL.Image.Image
+        """
+        w = image.width
+        h = image.height
+        grid_w = grid_size[0]
+        grid_h = grid_size[1]
+
+        new_img = Image.new('RGBA', ((w + grid_padding) // (grid_w + grid_padding) * grid_w,
+                                     (h + grid_padding) // (grid_h + grid_padding) * grid_h))
+
+        y = 0
+        pad_y = 0
+        while y + pad_y < h:
+            x = 0
+            pad_x = 0
+            while x + pad_x < w:
+                chunk = image.crop((x + pad_x, y + pad_y, x + grid_w + pad_x, y + grid_h + pad_y))
+                new_img.paste(chunk, (x, y, x + grid_w, y + grid_h))
+                x += grid_w
+                pad_x += grid_padding
+            y += grid_h
+            pad_y += grid_padding
+
+        return new_img
+
+    @staticmethod
+    def _slice_n_splice(image, grid_size, grid_padding):
+        """
+        Cuts out the padded areas out of the image
+        :param image: The image to slice 'n' splice
+        :type image: PIL.Image.Image
+        """
+        if numpy is None:
+            return TileData._slice_n_splice_pillow(image, grid_size, grid_padding)
+
+        (grid_w, grid_h) = grid_size
+        cell_w = grid_w + grid_padding
+        cell_h = grid_h + grid_padding
+        cols = (image.width + grid_padding) // cell_w
+        rows = (image.height + grid_padding) // cell_h
+
+        # View the image as a grid of padded cells, then drop the padding rows and columns of every cell at once. The
+        # last row and column of cells may be missing their padding, so it is added back first.
+        pixels = numpy.asarray(image.convert('RGBA'))[:rows * cell_h, :cols * cell_w]
+        pixels = numpy.pad(pixels, ((0, rows * cell_h - pixels.shape[0]), (0, cols * cell_w - pixels.shape[1]), (0, 0)))
+        pixels = pixels.reshape(rows, cell_h, cols, cell_w, 4)[:, :grid_h, :, :grid_w]
+
+        return Image.fromarray(numpy.ascontiguousarray(pixels).reshape(rows * grid_h, cols * grid_w, 4), 'RGBA')
+
+    def get_tile_image(self, image):
+        """
+        Cut the tile's image out of the tileset image
+        :param image: The tileset image, scaled by <self.scale>
+        :type image: PIL.Image.Image
+        """
+        image = image.crop(self.get_bbox())
+        if int(self.data['grid_padding']) > 0:
+            image = self._slice_n_splice(image, self.data['grid_size'], int(self.data['grid_padding']))
+        return image
+
+    def get_source_image(self, sheet):
+        """
+        Cut the tile's image out of the unscaled tileset image. This is what gets exported, scaled up to the pixel
+        scale. Cropping before scaling means only the tile, not the whole tileset image, is ever held in memory at full
+        scale.
+        :param sheet: The tileset image, as loaded by load_sheet
+        :type sheet: PIL.Image.Image
+        """
+        scale = self.scale
+        image = sheet.crop(tuple(int(v) // scale for v in self.get_bbox()))
+        if (grid_padding := int(self.data['grid_padding']) // scale) > 0:
+            image = self._slice_n_splice(image, [int(v) // scale for v in self.data['grid_size']], grid_padding)
+        return image
+
+    def get_export_name(self):
+        """Get the name of the tile's exported files, without the extension (e.g. block-1). An ID must be assigned."""
+        return ('block-' if self.data['tile_type'] == 'Block' else 'background-') + str(self.data['assigned_id'])
+
+    def get_txt(self, excluded=frozenset(), export_name=None, image_ext='.png'):
+        """
+        Get the contents of the tile's .txt file for SMBX2. An ID must be assigned.
+        :param excluded: Fields to leave out of the file.
+        :type excluded: frozenset
+        :param export_name: The name the tile's image is exported under, without the extension, if not the usual one.
+        :param image_ext: The extension of the tile's image.
+        :return: The contents of the file, as a string.
+        """
+        data = self.data
+        txt = get_txt_serializer(data['tile_type'], data['light_source'], data['content_type'], excluded).render(data)
+        if 751 <= data['assigned_id'] <= 1000:
+            txt = f'image = {export_name or self.get_export_name()}{image_ext}\n' + txt
+        return txt
+
+    def __getitem__(self, item):
+        return self.data[item]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+
+    def __lt__(self, other):
+        """Used during .tileset.ini file creation. Compares Tiles based on their x-position in the tileset image."""
+        return self.get_bbox()[0] < other.get_bbox()[0]
+
+    @staticmethod
+    def pop_tile_data(kwargs):
+        """
+        Remove the tile settings from <kwargs> and return them with defaults filled in for missing settings.
+        :param kwargs: Keyword arguments, such as those loaded from a .tileset.json file.
+        :type kwargs: dict
+        :return: The tile's data
+        """
+        # For backward compatibility with .tileset.json files created before v0.2.
+        if 'grid_size' in kwargs and type(old_val := kwargs['grid_size']) == int:
+            kwargs['grid_size'] = (old_val, old_val)
+
+        data = {}
+        for k in defaults.keys():
+            if k in kwargs:
+
+                # For backward compatibility with .tileset.json files created before v0.3.
+                if k == "collision_type" and kwargs[k] in legacy_to_new_collision_type:
+                    kwargs[k] = legacy_to_new_collision_type[kwargs[k]]
+
+                data[k] = kwargs[k]
+                del kwargs[k]  # Remove the key, so it won't be passed on to the Canvas items and cause an error
+            else:
+                data[k] = defaults[k]
+        if 'assigned_id' in kwargs:
+            data['assigned_id'] = kwargs['assigned_id']
+            del kwargs['assigned_id']
+        return data
+
+    def __init__(self, x1, y1, x2, y2, *, scale=1, **kwargs):
+        """
+        CONSTRUCTOR
+        :param x1: The left boundary of the tile
+        :param y1: The top boundary of the tile
+        :param x2: The right boundary of the tile
+        :param y2: The bottom boundary of the tile
+        :param scale: The scale of the tileset image the bounds refer to
+        :param kwargs: The tile's settings. Missing settings will use their defaults.
+        """
+        self.data = self.pop_tile_data(kwargs)
+        self.bbox = (x1, y1, x2, y2)
+        self.scale = scale